@@ -0,0 +1,173 @@
+"""Measure the per-call overhead SimpleORM adds on top of the database driver.
+
+Runs ``insert``, ``find_one_by``, ``count`` and ``update_by_id`` against an
+in-memory SQLite stand-in for MySQL (no server needed), at several table
+sizes, with the compiled statement cache on and off. For each operation it
+reports the time per ORM call, the time to execute the same statements
+directly on the stand-in, and the difference, which is the ORM overhead.
+
+    python -m benchmarks.orm_bench --rows 1000,10000,100000 --calls 5000
+
+The stand-in replaces PyMySQL's connection, so numbers exclude network
+round trips and connection setup; they only track the Python-side cost.
+"""
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Generator
+
+from src.orm import SimpleORM
+
+
+TABLE = "bench_orm"
+
+
+class _StandInCursor:
+    """Just enough of the PyMySQL ``DictCursor`` API for SimpleORM, backed by SQLite."""
+
+    def __init__(self, db: sqlite3.Connection) -> None:
+        self._db = db
+        self._cursor: sqlite3.Cursor | None = None
+        self.rowcount = -1
+        self.lastrowid: int | None = None
+
+    def __enter__(self) -> "_StandInCursor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._cursor = None
+
+    def execute(self, sql: str, params: list[Any] | None = None) -> int:
+        self._cursor = self._db.execute(sql.replace("%s", "?"), params or [])
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+        return self.rowcount
+
+    def _as_dict(self, row: tuple | None) -> dict[str, Any] | None:
+        if row is None:
+            return None
+        return {description[0]: value for description, value in zip(self._cursor.description, row)}
+
+    def fetchone(self) -> dict[str, Any] | None:
+        return self._as_dict(self._cursor.fetchone())
+
+    def fetchall(self) -> list[dict[str, Any]]:
+        return [self._as_dict(row) for row in self._cursor.fetchall()]
+
+
+class _StandInConnection:
+    def __init__(self, db: sqlite3.Connection) -> None:
+        self._db = db
+
+    def cursor(self) -> _StandInCursor:
+        return _StandInCursor(self._db)
+
+    def commit(self) -> None:
+        self._db.commit()
+
+
+def _stand_in_orm(db: sqlite3.Connection, statement_cache: bool) -> SimpleORM:
+    orm = SimpleORM("stand-in", 0, "bench", "", "bench")
+    if not statement_cache:
+        orm.statement_cache_size = 0
+
+    @contextmanager
+    def connect(cursorclass=None) -> Generator[_StandInConnection, None, None]:
+        yield _StandInConnection(db)
+
+    orm._connect = connect
+    return orm
+
+
+def _fresh_db(rows: int) -> sqlite3.Connection:
+    db = sqlite3.connect(":memory:", isolation_level=None)
+    db.execute(
+        f"CREATE TABLE `{TABLE}` ("
+        "`id` INTEGER PRIMARY KEY AUTOINCREMENT, `setting_key` TEXT, `setting_value` TEXT, `updated_at` TEXT)"
+    )
+    db.execute(f"CREATE INDEX `idx_key` ON `{TABLE}` (`setting_key`)")
+    db.executemany(
+        f"INSERT INTO `{TABLE}` (`setting_key`, `setting_value`, `updated_at`) VALUES (?, ?, ?)",
+        ((f"key_{index}", str(index), "2025-01-01T00:00:00") for index in range(rows)),
+    )
+    return db
+
+
+def _per_call_us(calls: int, action: Callable[[int], Any]) -> float:
+    started = time.perf_counter()
+    for index in range(calls):
+        action(index)
+    return (time.perf_counter() - started) / calls * 1_000_000
+
+
+def _bench(rows: int, calls: int, statement_cache: bool) -> dict[str, tuple[float, float]]:
+    db = _fresh_db(rows)
+    orm = _stand_in_orm(db, statement_cache)
+    raw = db.execute
+    results: dict[str, tuple[float, float]] = {}
+
+    results["insert"] = (
+        _per_call_us(
+            calls,
+            lambda i: orm.insert(TABLE, {"setting_key": f"new_{i}", "setting_value": "1", "updated_at": "now"}),
+        ),
+        _per_call_us(
+            calls,
+            lambda i: raw(
+                f"INSERT INTO `{TABLE}` (`setting_key`, `setting_value`, `updated_at`) VALUES (?, ?, ?)",
+                [f"raw_{i}", "1", "now"],
+            ),
+        ),
+    )
+    results["find_one_by"] = (
+        _per_call_us(calls, lambda i: orm.find_one_by(TABLE, {"setting_key": f"key_{i % rows}"})),
+        _per_call_us(
+            calls,
+            lambda i: raw(f"SELECT * FROM `{TABLE}` WHERE `setting_key` = ? LIMIT 1", [f"key_{i % rows}"]).fetchone(),
+        ),
+    )
+    results["count"] = (
+        _per_call_us(calls, lambda i: orm.count(TABLE, {"setting_key": f"key_{i % rows}"})),
+        _per_call_us(
+            calls,
+            lambda i: raw(
+                f"SELECT COUNT(*) AS count_value FROM `{TABLE}` WHERE `setting_key` = ?",
+                [f"key_{i % rows}"],
+            ).fetchone(),
+        ),
+    )
+    results["update_by_id"] = (
+        _per_call_us(calls, lambda i: orm.update_by_id(TABLE, i % rows + 1, {"setting_value": str(i), "updated_at": "now"})),
+        _per_call_us(
+            calls,
+            lambda i: raw(
+                f"UPDATE `{TABLE}` SET `setting_value` = ?, `updated_at` = ? WHERE id = ?",
+                [str(i), "now", i % rows + 1],
+            ),
+        ),
+    )
+    db.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="1000,10000,100000", help="comma-separated table sizes")
+    parser.add_argument("--calls", type=int, default=5000, help="calls per operation and table size")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}  {'operation':<13} {'cache':<5} {'orm us':>9} {'driver us':>10} {'overhead us':>12}")
+    for rows in (int(value) for value in args.rows.split(",") if value.strip()):
+        for statement_cache in (True, False):
+            for operation, (orm_us, driver_us) in _bench(rows, args.calls, statement_cache).items():
+                print(
+                    f"{rows:>8}  {operation:<13} {'on' if statement_cache else 'off':<5} "
+                    f"{orm_us:>9.2f} {driver_us:>10.2f} {orm_us - driver_us:>12.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Compare the legacy text-typed ``configs`` layout with the native-typed one.
+
+Creates two scratch tables in the configured database, fills both with the
+same synthetic transfer log, then reports on-disk row/index size and the
+latency of the dedup and stats queries used by the relay and admin panel.
+
+    python -m benchmarks.schema_bench --rows 200000 --lookups 2000
+
+The scratch tables are dropped afterwards.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import random
+import time
+from datetime import datetime, timedelta
+
+from src.config import load_settings
+from src.models import CONFIGS_COLUMNS, CONFIGS_INDEXES
+from src.orm import Column, SimpleORM
+
+
+LEGACY_TABLE = "bench_configs_legacy"
+NATIVE_TABLE = "bench_configs_native"
+
+LEGACY_COLUMNS = [
+    Column("id", "BIGINT(85)", primary_key=True, nullable=False, auto_increment=True),
+    Column("file_id", "VARCHAR(255)", nullable=False, default="not_set"),
+    Column("file_hash", "VARCHAR(64)", nullable=False, default="not_set"),
+    Column("name", "VARCHAR(255)", nullable=False, default="not_set"),
+    Column("from_chat", "VARCHAR(45)", nullable=False, default="not_set"),
+    Column("to_chat", "VARCHAR(45)", nullable=False, default="not_set"),
+    Column("from_messsage_id", "VARCHAR(45)", nullable=False, default="not_set"),
+    Column("to_messsage_id", "VARCHAR(45)", nullable=False, default="not_set"),
+    Column("date", "VARCHAR(255)", nullable=False, default="not_set"),
+]
+
+STATS_QUERIES = [
+    "SELECT COUNT(*) FROM `{table}`",
+    "SELECT COUNT(DISTINCT `from_chat`) FROM `{table}`",
+    "SELECT COUNT(DISTINCT `to_chat`) FROM `{table}`",
+    "SELECT COUNT(DISTINCT `file_hash`) FROM `{table}`",
+    "SELECT * FROM `{table}` ORDER BY `id` DESC LIMIT 1",
+]
+
+
+def _synthetic_rows(count: int) -> list[tuple]:
+    rng = random.Random(1337)
+    start = datetime(2025, 1, 1)
+    rows = []
+    for index in range(count):
+        digest = hashlib.sha256(index.to_bytes(8, "big")).digest()
+        rows.append(
+            (
+                f"BQACAgQAAx0C{index:012d}",
+                digest,
+                f"npvt ({index + 1}).npvt",
+                -1000000000000 - rng.randint(1, 500),
+                -1000000000000 - rng.randint(501, 600),
+                rng.randint(1, 2_000_000),
+                rng.randint(1, 2_000_000),
+                start + timedelta(seconds=index * 7),
+            )
+        )
+    return rows
+
+
+def _fill(orm: SimpleORM, rows: list[tuple]) -> None:
+    legacy_rows = [
+        (file_id, digest.hex(), name, str(src), str(dst), str(src_msg), str(dst_msg), date.isoformat())
+        for file_id, digest, name, src, dst, src_msg, dst_msg, date in rows
+    ]
+    columns = "`file_id`, `file_hash`, `name`, `from_chat`, `to_chat`, `from_messsage_id`, `to_messsage_id`, `date`"
+    placeholders = ", ".join(["%s"] * 8)
+    with orm._connect() as conn:
+        with conn.cursor() as cursor:
+            for table, payload in ((LEGACY_TABLE, legacy_rows), (NATIVE_TABLE, rows)):
+                for offset in range(0, len(payload), 5000):
+                    cursor.executemany(
+                        f"INSERT INTO `{table}` ({columns}) VALUES ({placeholders})",
+                        payload[offset:offset + 5000],
+                    )
+                cursor.execute(f"ANALYZE TABLE `{table}`")
+                cursor.fetchall()
+        conn.commit()
+
+
+def _table_size(orm: SimpleORM, table: str) -> dict:
+    with orm._connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT AVG_ROW_LENGTH AS avg_row, DATA_LENGTH AS data_bytes, INDEX_LENGTH AS index_bytes "
+                "FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [table],
+            )
+            return cursor.fetchone() or {}
+
+
+def _time_queries(orm: SimpleORM, sql_and_params: list[tuple[str, list]]) -> float:
+    with orm._connect() as conn:
+        with conn.cursor() as cursor:
+            started = time.perf_counter()
+            for sql, params in sql_and_params:
+                cursor.execute(sql, params)
+                cursor.fetchall()
+            elapsed = time.perf_counter() - started
+    return elapsed * 1000 / max(1, len(sql_and_params))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    orm = SimpleORM.from_settings(load_settings())
+    for table in (LEGACY_TABLE, NATIVE_TABLE):
+        orm.execute(f"DROP TABLE IF EXISTS `{table}`")
+    orm.create_table(LEGACY_TABLE, LEGACY_COLUMNS)
+    orm.create_table(NATIVE_TABLE, CONFIGS_COLUMNS, CONFIGS_INDEXES)
+
+    try:
+        rows = _synthetic_rows(args.rows)
+        _fill(orm, rows)
+
+        rng = random.Random(7)
+        probes = [rng.choice(rows)[1] if rng.random() < 0.5 else rng.randbytes(32) for _ in range(args.lookups)]
+
+        print(f"rows={args.rows} lookups={args.lookups}")
+        print(f"{'layout':<8} {'avg_row_B':>10} {'data_MB':>9} {'index_MB':>9} {'dedup_ms':>9} {'stats_ms':>9}")
+        for label, table, encode in (
+            ("legacy", LEGACY_TABLE, lambda digest: digest.hex()),
+            ("native", NATIVE_TABLE, lambda digest: digest),
+        ):
+            size = _table_size(orm, table)
+            dedup_ms = _time_queries(
+                orm,
+                [(f"SELECT * FROM `{table}` WHERE `file_hash` = %s LIMIT 1", [encode(probe)]) for probe in probes],
+            )
+            stats_ms = _time_queries(orm, [(sql.format(table=table), []) for sql in STATS_QUERIES])
+            print(
+                f"{label:<8} {int(size.get('avg_row') or 0):>10} "
+                f"{(size.get('data_bytes') or 0) / 1048576:>9.2f} {(size.get('index_bytes') or 0) / 1048576:>9.2f} "
+                f"{dedup_ms:>9.3f} {stats_ms:>9.3f}"
+            )
+    finally:
+        for table in (LEGACY_TABLE, NATIVE_TABLE):
+            orm.execute(f"DROP TABLE IF EXISTS `{table}`")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Compare standard and parallel chunked file transfers over a simulated link.
+
+Runs ``ChunkedTransfer.upload`` and ``ChunkedTransfer.download`` against a
+stand-in client whose every part request costs one round trip plus the
+part's transmission time on a shared link, so parts in flight overlap their
+round trips but not their bandwidth. ``1`` part in flight is the standard
+one-part-at-a-time transfer Telethon performs. A failure rate exercises the
+per-part retries.
+
+    python -m benchmarks.transfer_bench --sizes-mb 1,8,32 --workers 1,2,4,8 --rtt-ms 80 --mbps 40
+
+No Telegram connection is made; the numbers show how much of a transfer is
+round-trip bound under the given latency and bandwidth.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import time
+import types
+
+from telethon.errors import RPCError
+from telethon.tl.functions.upload import GetFileRequest, SaveBigFilePartRequest, SaveFilePartRequest
+
+from src.media_transfer import ChunkedTransfer
+
+
+class _StandInClient:
+    """Answers upload/download part requests after a simulated round trip and transmission."""
+
+    def __init__(self, rtt_seconds: float, bytes_per_second: float, fail_rate: float, data: bytes) -> None:
+        self.rtt_seconds = rtt_seconds
+        self.bytes_per_second = bytes_per_second
+        self.fail_rate = fail_rate
+        self.data = data
+        self.requests = 0
+        self._link = asyncio.Lock()
+
+    async def __call__(self, request):
+        self.requests += 1
+        if isinstance(request, (SaveFilePartRequest, SaveBigFilePartRequest)):
+            payload = len(request.bytes)
+        elif isinstance(request, GetFileRequest):
+            payload = min(request.limit, max(0, len(self.data) - request.offset))
+        else:
+            raise TypeError(f"unexpected request {type(request).__name__}")
+
+        await asyncio.sleep(self.rtt_seconds / 2)
+        async with self._link:
+            await asyncio.sleep(payload / self.bytes_per_second)
+        await asyncio.sleep(self.rtt_seconds / 2)
+
+        if random.random() < self.fail_rate:
+            raise RPCError(request, "INTERNAL_SERVER_ERROR", 500)
+        if isinstance(request, GetFileRequest):
+            return types.SimpleNamespace(bytes=self.data[request.offset:request.offset + request.limit])
+        return True
+
+
+async def _bench(size: int, workers: int, args: argparse.Namespace) -> dict[str, tuple[float, int]]:
+    data = random.randbytes(size)
+    document = types.SimpleNamespace(id=1, access_hash=1, file_reference=b"", size=size)
+    results: dict[str, tuple[float, int]] = {}
+    for operation in ("upload", "download"):
+        client = _StandInClient(args.rtt_ms / 1000, args.mbps * 1024 * 1024 / 8, args.fail_rate, data)
+        engine = ChunkedTransfer(workers)
+        started = time.perf_counter()
+        if operation == "upload":
+            await engine.upload(client, data, "bench.npvt")
+        else:
+            assert await engine.download(client, document) == data
+        results[operation] = (time.perf_counter() - started, engine.retried_parts)
+    return results
+
+
+async def _run(args: argparse.Namespace) -> None:
+    print(f"{'size MB':>8}  {'operation':<9} {'in flight':>9} {'seconds':>8} {'MB/s':>7} {'speedup':>8} {'retries':>8}")
+    for size_mb in (float(value) for value in args.sizes_mb.split(",") if value.strip()):
+        size = int(size_mb * 1024 * 1024)
+        baseline: dict[str, float] = {}
+        for workers in (int(value) for value in args.workers.split(",") if value.strip()):
+            for operation, (seconds, retries) in (await _bench(size, workers, args)).items():
+                baseline.setdefault(operation, seconds)
+                print(
+                    f"{size_mb:>8g}  {operation:<9} {workers:>9} {seconds:>8.2f} "
+                    f"{size_mb / seconds:>7.2f} {baseline[operation] / seconds:>7.2f}x {retries:>8}"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes-mb", default="1,8,32", help="comma-separated file sizes in MB")
+    parser.add_argument("--workers", default="1,2,4,8", help="comma-separated parts in flight; the first is the baseline")
+    parser.add_argument("--rtt-ms", type=float, default=80.0, help="round trip per part request")
+    parser.add_argument("--mbps", type=float, default=40.0, help="link bandwidth in megabits per second")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of part requests that fail once")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
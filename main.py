@@ -9,15 +9,28 @@ from src.config import (
     API_ID,
     BOT_SESSION,
     BOT_TOKEN,
+    LOG_FILE,
+    LOG_FILE_BACKUPS,
+    LOG_FILE_MAX_BYTES,
+    LOG_FORMAT,
+    LOG_LEVEL,
+    LOG_LEVELS,
+    LOG_SAMPLE,
+    LOOP_LAG_WARN_MS,
     PHONE,
+    RELAY_MEDIA_CLIENT,
     SELF_USER_ID,
     USER_SESSION,
     load_settings,
 )
+from src.cpu import LoopLagMonitor, cpu_executor
 from src.handlers import configure_panel_handler, handle_panel
+from src.logging_setup import configure_logging, parse_levels, parse_sample_rates
+from src.media_client import connect_media_client
 from src.models import setup
 from src.npvt_relay import start_npvt_relay
 from src.orm import SimpleORM
+from src.startup import StartupOrchestrator
 from src.utilities import show_logo
 
 
@@ -25,42 +38,94 @@ async def main() -> None:
     settings = load_settings()
     orm = SimpleORM.from_settings(settings)
 
-    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(levelname)s - %(message)s")
+    log_listener = configure_logging(
+        level=LOG_LEVEL,
+        console_format=LOG_FORMAT,
+        log_file=LOG_FILE or None,
+        max_bytes=LOG_FILE_MAX_BYTES,
+        backup_count=LOG_FILE_BACKUPS,
+        component_levels=parse_levels(LOG_LEVELS),
+        sample_rates=parse_sample_rates(LOG_SAMPLE),
+    )
     log = logging.getLogger("userbot")
 
-    setup(orm)
-
     show_logo()
     log.info("🍓 Script launched")
 
+    loop_monitor = LoopLagMonitor(logging.getLogger("userbot.loop"), LOOP_LAG_WARN_MS)
+    loop_monitor.start()
+
+    startup = StartupOrchestrator(log)
     user_client = TelegramClient(USER_SESSION, API_ID, API_HASH)
-    await user_client.start(phone=PHONE)
-    me = await user_client.get_me()
-    log.info("👤 SELF: %s (ID: %s)", me.first_name, me.id)
 
+    # Handlers are registered before connecting so no update is missed; jobs
+    # wait inside the relay until its caches are warm.
+    relay_service = start_npvt_relay(user_client, orm, logging.getLogger("userbot.relay"))
     user_client.add_event_handler(handle_panel)
+    log.info("🛠 NPVT relay worker started")
 
-    bot_client, bot_username = await start_helper_bot(
-        user_client,
-        BOT_SESSION,
-        API_ID,
-        API_HASH,
-        BOT_TOKEN,
-        SELF_USER_ID,
+    schema_stage = startup.stage("schema", asyncio.to_thread(setup, orm))
+    user_login_stage = startup.stage("user_login", user_client.start(phone=PHONE))
+    helper_bot_stage = startup.stage(
+        "helper_bot",
+        start_helper_bot(
+            user_client,
+            BOT_SESSION,
+            API_ID,
+            API_HASH,
+            BOT_TOKEN,
+            SELF_USER_ID,
+            relay_service,
+            schema_ready=schema_stage,
+        ),
     )
+
+    async def connect_media() -> TelegramClient | None:
+        await user_login_stage
+        if not RELAY_MEDIA_CLIENT:
+            return None
+        media_client = await connect_media_client(user_client, API_ID, API_HASH)
+        relay_service.use_media_client(media_client)
+        return media_client
+
+    media_stage = startup.stage("media_client", connect_media())
+
+    async def warm_relay() -> None:
+        # Jobs are held until warm-up ends, so media I/O never starts on the wrong connection.
+        await asyncio.gather(schema_stage, media_stage)
+        await relay_service.warm_up()
+
+    warmup_stage = startup.stage("cache_warmup", warm_relay())
+
+    await user_login_stage
+    me = await startup.stage("user_profile", user_client.get_me())
+    log.info("👤 SELF: %s (ID: %s)", me.first_name, me.id)
+
+    bot_client, bot_username = await helper_bot_stage
     configure_panel_handler(user_client, bot_username)
     log.info("🤖 HELPER BOT: @%s", bot_username)
 
-    relay_service = start_npvt_relay(user_client, orm, log)
-    log.info("🛠 NPVT relay worker started")
+    media_client = await media_stage
+    if media_client is not None:
+        log.info("📦 Relay media I/O runs on a dedicated connection")
 
-    await asyncio.gather(
-        user_client.run_until_disconnected(),
-        bot_client.run_until_disconnected(),
-    )
+    await warmup_stage
+    startup.log_summary()
 
-    _ = relay_service
+    try:
+        await asyncio.gather(
+            user_client.run_until_disconnected(),
+            bot_client.run_until_disconnected(),
+        )
+    finally:
+        await relay_service.save_snapshot(force=True)
+        await relay_service.flush_rate_state()
+        if media_client is not None:
+            await media_client.disconnect()
+        loop_monitor.stop()
+        cpu_executor.shutdown(wait=False)
+        log_listener.stop()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+
+from src.config import RELAY_ARCHIVE_DIR
+from src.controllers import LATENCY_STAGES, ArchiveManager, ConfigManager
+from src.orm import SimpleORM
+
+
+ARCHIVE_BATCH_SIZE = 2000
+ARCHIVE_COLUMNS = (
+    "id",
+    "file_id",
+    "file_hash",
+    "name",
+    "from_chat",
+    "to_chat",
+    "from_messsage_id",
+    "to_messsage_id",
+    "date",
+    *(f"latency_{stage}_ms" for stage in LATENCY_STAGES),
+)
+
+# The relay's timer and the panel's "archive now" share one process; runs never overlap.
+_run_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class ArchiveResult:
+    rows: int
+    raw_bytes: int
+    file_bytes: int
+    path: str | None
+
+
+class TransferArchiver:
+    """Move ``configs`` rows older than a cutoff into gzip-compressed JSON-lines files.
+
+    Rows are walked in ``id`` order in pages of ``batch_size``; ids and dates
+    grow together, so the walk stops at the first row inside the retention
+    period. Each page is appended to the file as its own gzip member and
+    fsynced; only then is its id range deleted, in the same transaction that
+    adds the page to the run's ``configs_archive_runs`` totals. No lock is
+    held across pages, and the archived-row count (which file numbering
+    relies on) always matches what has left the table. A crash mid-page
+    leaves that page in the table and at worst a truncated last member in
+    the file, after the complete members of the pages already deleted.
+    Rows with no date predate typed columns and are archived as old.
+    Dedup keys live in ``relay_dedup`` and are not touched. Blocking; run it
+    in a worker thread.
+    """
+
+    def __init__(self, orm: SimpleORM, directory: str = RELAY_ARCHIVE_DIR, batch_size: int = ARCHIVE_BATCH_SIZE) -> None:
+        self.orm = orm
+        self.directory = directory
+        self.batch_size = max(1, int(batch_size))
+        self.table = ConfigManager(orm).table
+
+    def archive_before(self, cutoff: datetime) -> ArchiveResult:
+        with _run_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"configs-{datetime.now():%Y%m%d-%H%M%S-%f}.jsonl.gz")
+            rows = raw_bytes = file_bytes = 0
+            run_id = last_id = None
+
+            with open(path, "wb") as archive:
+                while True:
+                    page = self.orm.page_after(self.table, last_id, self.batch_size, columns=ARCHIVE_COLUMNS)
+                    expired = []
+                    for row in page:
+                        if row["date"] is not None and row["date"] >= cutoff:
+                            break
+                        expired.append(row)
+                    if not expired:
+                        break
+
+                    lines = b"".join(self._encode(row) for row in expired)
+                    # Concatenated gzip members read back as one stream (gzip.open, zcat).
+                    member = gzip.compress(lines, compresslevel=9)
+                    archive.write(member)
+                    archive.flush()
+                    os.fsync(archive.fileno())
+
+                    first_id, last_id = int(expired[0]["id"]), int(expired[-1]["id"])
+                    with self.orm.transaction() as tx:
+                        deleted = tx.delete_id_range(self.table, first_id, last_id)
+                        run_id = ArchiveManager(tx).record_run(
+                            cutoff,
+                            rows + deleted,
+                            raw_bytes + len(lines),
+                            file_bytes + len(member),
+                            path,
+                            run_id=run_id,
+                        )
+                    rows += deleted
+                    raw_bytes += len(lines)
+                    file_bytes += len(member)
+                    if len(expired) < len(page) or len(page) < self.batch_size:
+                        break
+
+            if not rows:
+                os.remove(path)
+                return ArchiveResult(0, 0, 0, None)
+            return ArchiveResult(rows, raw_bytes, file_bytes, path)
+
+    @staticmethod
+    def _encode(row: dict) -> bytes:
+        record = dict(row)
+        if record["file_hash"] is not None:
+            record["file_hash"] = bytes(record["file_hash"]).hex()
+        if record["date"] is not None:
+            record["date"] = record["date"].isoformat(sep=" ")
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
@@ -1,12 +1,32 @@
-import json
-import os
+import asyncio
+import csv
+import io
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable
 
 from telethon import TelegramClient, events, Button
+from telethon.errors import MessageNotModifiedError
 
+from src.archive import TransferArchiver
 from src.buttons import BACK_MENU_BTN, CHANNEL_MANAGEMENT, MAIN_MENU_BTN
+from src.cache import TTLCache
 from src.config import VERSION, load_settings
-from src.controllers import ChannelManager, ConfigManager, RelaySettingsManager, UserManager
+from src.controllers import (
+    DEDUP_SCOPES,
+    DELIVERY_MODES,
+    LATENCY_STAGES,
+    ArchiveManager,
+    ChannelManager,
+    ConfigManager,
+    RelaySettingsManager,
+    UserManager,
+)
+from src.entities import channel_peer_id, entity_cache
+from src.mapping_import import IMPORT_MAX_BYTES, MappingImporter
 from src.orm import SimpleORM
+from src.panel_router import PanelRouter
+from src.panel_state import PanelStateCache
 from src.utilities import is_owner, safe_answer_callback
 
 settings = load_settings()
@@ -16,55 +36,329 @@ user_manager            = UserManager(orm)
 channel_manager         = ChannelManager(orm)
 config_manager          = ConfigManager(orm)
 relay_settings_manager  = RelaySettingsManager(orm)
+archive_manager         = ArchiveManager(orm)
+archiver                = TransferArchiver(orm)
+panel_states            = PanelStateCache(user_manager)
+router                  = PanelRouter(logging.getLogger("userbot.panel"))
+
+# Rendered text of views that are expensive to query; refresh buttons bypass it.
+VIEW_CACHE_SECONDS = 15.0
+view_cache: TTLCache[str, str] = TTLCache(16, VIEW_CACHE_SECONDS)
+
+CHANNEL_PAGE_SIZE = 10
+EXPORT_FORMATS = ("txt", "csv")
+EXPORT_CSV_HEADER = ("id", "source_channel_id", "destination_channel_id", "delivery_mode")
+
+# Set by start_helper_bot so panel views can read live relay state.
+active_relay = None
+
+SETTINGS_STEPS = (
+    "relay_caption",
+    "relay_rate_limit",
+    "relay_rate_bounds",
+    "relay_album_window",
+    "relay_bundle",
+    "relay_dedup_window",
+    "relay_transfer_engine",
+    "relay_file_prefix",
+    "relay_source_refresh",
+)
+
+ADMIN_STATS_NOTE = "⚠️ *Note: Resetting configs will clear transfer history and duplicate cache.*"
+
+# Callback action -> (panel step it enters, prompt shown in place of the menu).
+STEP_PROMPTS = {
+    "admin_reset_configs": (
+        "reset_configs_confirm",
+        "💣 **DANGER ZONE: Reset Configs Table** ⚠️\n\n"
+        "This action will **permanently remove ALL transfer history** and **clear the duplicate cache**.\n\n"
+        "📝 To confirm, type exactly in your self chat:\n"
+        "`RESET CONFIGS`\n\n"
+        "❌ Send `cancel` to abort this operation safely.",
+    ),
+    "admin_set_retention": (
+        "admin_retention",
+        "🗓️ **Set Transfer History Retention**\n\n"
+        "Transfer rows older than this many days are moved out of MySQL into compressed "
+        "archive files under `sessions/archive/`. Duplicate detection and file numbering are not affected.\n\n"
+        "Send a number of days (1-3650), or `0` to keep everything in MySQL.\n"
+        "📌 Example: `90`\n\n"
+        "❌ Type `cancel` to abort this action.",
+    ),
+    "relay_set_caption": (
+        "relay_caption",
+        "✏️ **Send New Caption for Relayed Files**\n\n"
+        "• Supports **Persian / English** and **multi-line text**.\n\n"
+        "📌 Example:\n"
+        "`سلام این کپشن هست\\n@hojjat_jh`\n\n"
+        "❌ Type `cancel` to abort this action.",
+    ),
+    "relay_set_rate_limit": (
+        "relay_rate_limit",
+        "• Send the new rate limit in **seconds** (number ≥ 1)",
+    ),
+    "relay_set_rate_bounds": (
+        "relay_rate_bounds",
+        "📈 **Set Adaptive Rate Bounds**\n\n"
+        "The relay speeds up while sends succeed and slows down on FloodWait, "
+        "per destination, within these bounds.\n\n"
+        "Send two numbers in seconds: `min max`\n"
+        "📌 Example: `2 60`\n\n"
+        "❌ Type `cancel` to abort this action.",
+    ),
+    "relay_set_album_window": (
+        "relay_album_window",
+        "🧺 **Set Album Window**\n\n"
+        "For destinations in `album` mode, files arriving within this many seconds "
+        "are sent together as one album (up to 10 files).\n\n"
+        "Send a number between 0.5 and 60.\n"
+        "📌 Example: `5`\n\n"
+        "❌ Type `cancel` to abort this action.",
+    ),
+    "relay_set_bundle": (
+        "relay_bundle",
+        "📦 **Set Bundle Thresholds**\n\n"
+        "For destinations in `bundle` mode, new files are collected into one zip archive "
+        "that is posted when it has been open this many minutes or reaches this size.\n\n"
+        "Send two numbers: `minutes megabytes`\n"
+        "📌 Example: `10 20`\n\n"
+        "❌ Type `cancel` to abort this action.",
+    ),
+    "relay_set_dedup_window": (
+        "relay_dedup_window",
+        "🧹 **Set Dedup Window**\n\n"
+        "A file is treated as a duplicate only if it was relayed within this many days; "
+        "older entries expire and are cleaned up in the background. `0` keeps them forever.\n\n"
+        "The scope decides what counts as the same place: `global` (anywhere), "
+        "`source` (same source channel) or `destination` (same destination channel).\n\n"
+        "Send: `days scope`\n"
+        "📌 Example: `7 destination`\n\n"
+        "❌ Type `cancel` to abort this action.",
+    ),
+    "relay_set_transfer_engine": (
+        "relay_transfer_engine",
+        "🚀 **Set Transfer Engine**\n\n"
+        "`on` downloads and uploads files as parts kept in flight concurrently, "
+        "retrying failed parts on their own; `off` uses the standard one-part-at-a-time transfer.\n\n"
+        "Send `off`, or `on` with the number of parts in flight (1-8).\n"
+        "📌 Example: `on 4`\n\n"
+        "❌ Type `cancel` to abort this action.",
+    ),
+    "relay_set_file_prefix": (
+        "relay_file_prefix",
+        "📁 **Set New File Prefix**\n\n"
+        "• Supports **Persian / English** characters.\n"
+        "📌 Example:\n"
+        "`Myfilename`\n"
+        "➡ Resulting filename: `Myfilename (123).npvt`\n\n"
+        "❌ Type `cancel` to abort this action.",
+    ),
+    "relay_set_source_refresh": (
+        "relay_source_refresh",
+        "• Send source mapping refresh in seconds (integer >= 5).\n\nExample: 20\nType 'cancel' to abort.",
+    ),
+    "channel_management_add": (
+        "panel2",
+        "🔗 **Send Source Channel / Group**\n\n"
+        "You can provide the source in one of the following formats:\n"
+        "• `@username`\n"
+        "• Public link\n"
+        "• Numeric ID starting with `-100`\n\n"
+        "💡 Make sure the bot has access to the source channel/group.",
+    ),
+    "channel_management_mode": (
+        "panel_mode",
+        "🎛 **Set Delivery Mode**\n\n"
+        "Send the source ID and the mode, separated by a space.\n\n"
+        "• `single`: one message per file\n"
+        "• `album`: files arriving within the album window are grouped (up to 10)\n"
+        "• `bundle`: files are collected into one zip posted per bundle interval or size\n\n"
+        "📌 Example: `-1001234567890 album`\n\n"
+        "❌ Type `cancel` to abort this action.",
+    ),
+    "channel_management_import": (
+        "panel_import",
+        "📥 **Bulk Import Channel Mappings**\n\n"
+        "Send a `.csv` or `.txt` file in your self chat with one mapping per line:\n"
+        "`source destination [mode]`\n\n"
+        "• Source: `@username`, link or numeric ID starting with `-100`\n"
+        "• Destination: numeric ID starting with `-100`\n"
+        "• Mode (optional): `single`, `album` or `bundle`\n\n"
+        "Files from **Bulk Export** are accepted as they are.\n\n"
+        "❌ Type `cancel` to abort this action.",
+    ),
+    "channel_management_del": (
+        "panel4",
+        "🗑️ **Delete Source Channel Mapping**\n\n"
+        "Send the **numeric ID** of the source channel you want to delete.\n\n"
+        "❌ Type `cancel` to abort this action.",
+    ),
+}
+
+CHANNEL_HELP_TEXT = (
+    "📚 **Channel Management Guide**\n"
+    "━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    "➕ **Add Channel**\n"
+    "──────────────────────\n"
+    "🎯 **Purpose:**\n"
+    "Register a source channel/group and link it to a destination channel for automatic operations.\n\n"
+    "⚙️ **How It Works:**\n"
+    "1️⃣ Send source channel/group:\n"
+    "   • `@username`\n"
+    "   • `https://t.me/...`\n"
+    "   • Numeric ID starting with `-100`\n\n"
+    "2️⃣ Send destination numeric ID\n"
+    "   • Must start with `-100`\n\n"
+    "3️⃣ Confirm information\n"
+    "   • Type: `yes` or `no`\n\n"
+    "✅ After Confirmation:\n"
+    "• Numeric ID will be resolved automatically\n"
+    "• Data securely saved in database\n"
+    "• Channel pair becomes active\n\n"
+    "⚠️ **Important Notes:**\n"
+    "• You must have proper access to channels\n"
+    "• Destination must always be numeric ID\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    "📋 **Channel List**\n"
+    "──────────────────────\n"
+    "🎯 **Purpose:**\n"
+    "View all registered channel pairs.\n\n"
+    "📌 **Features:**\n"
+    "• Browse all channels inside panel, page by page\n"
+    "• Download full list as `.txt` or `.csv` file\n\n"
+    "📊 **Displays:**\n"
+    "• Record ID\n"
+    "• Source Channel ID\n"
+    "• Destination Channel ID\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    "📥 **Bulk Import / Export**\n"
+    "──────────────────────\n"
+    "• Import many mappings from a `.csv` or `.txt` file in one go\n"
+    "• Rows that fail validation are reported back with the reason\n"
+    "• Both export formats (`.csv` and `.txt`) import back as they are, delivery mode included\n\n"
+    "🔒 **Security:**\n"
+    "• Owner access only\n"
+    "• Exports are built in memory, nothing is written to disk\n"
+)
 
 
 async def resolve_channel_title(client: TelegramClient, channel_id: int) -> str:
     """Return a readable title for the source ID or fall back to the numeric ID."""
-    try:
-        entity = await client.get_entity(channel_id)
-    except Exception:
-        return str(channel_id)
-
-    title = getattr(entity, "title", None)
-    if title:
-        return title
+    return await entity_cache.title(client, channel_id)
 
-    first_name = getattr(entity, "first_name", None)
-    last_name = getattr(entity, "last_name", None)
-    if first_name or last_name:
-        return " ".join(part for part in (first_name, last_name) if part)
 
-    return str(channel_id)
-
-
-def build_relay_settings_text() -> str:
-    runtime = relay_settings_manager.get_runtime_settings()
+def build_relay_settings_text(runtime: dict | None = None) -> str:
+    runtime = runtime or relay_settings_manager.get_runtime_settings()
     relay_state = "ON" if bool(runtime["relay_enabled"]) else "OFF"
     dedup_state = "ON" if bool(runtime["dedup_enabled"]) else "OFF"
     return (
         "⚡ **Relay Runtime Settings** ⚡\n\n"
         f"• **Relay Status:** {relay_state}\n"
         f"• **Duplicate Filter:** {dedup_state}\n"
+        f"• **Dedup Window:** {build_dedup_window_text(runtime)} 🧹\n"
+        f"• **Transfer Engine:** {build_transfer_engine_text(runtime)} 🚀\n"
         f"• **Caption:** {runtime['caption']}\n"
         f"• **Rate Limit:** Every {runtime['send_interval_seconds']} sec ⏱️\n"
+        f"• **Adaptive Bounds:** {runtime['send_interval_min_seconds']}–{runtime['send_interval_max_seconds']} sec\n"
         f"• **File Prefix:** {runtime['filename_prefix']}\n"
-        f"• **Source Refresh:** Every {runtime['source_cache_seconds']} sec 🔄\n\n"
+        f"• **Source Refresh:** Every {runtime['source_cache_seconds']} sec 🔄\n"
+        f"• **Album Window:** {runtime['album_window_seconds']} sec 🧺\n"
+        f"• **Bundle:** Every {runtime['bundle_interval_seconds'] / 60:g} min or {runtime['bundle_max_bytes'] / (1024 * 1024):g} MB 📦\n\n"
+        f"{build_effective_rates_text()}"
         "💡 *Captions support multi-line text and are fully multilingual (Persian/English)*"
     )
 
 
-def build_relay_settings_buttons() -> list[list[Button]]:
-    runtime = relay_settings_manager.get_runtime_settings()
+def build_dedup_window_text(runtime: dict) -> str:
+    days = float(runtime["dedup_window_days"])
+    window = f"{days:g} days" if days else "forever"
+    return f"{window}, {runtime['dedup_scope']} scope"
+
+
+def build_transfer_engine_text(runtime: dict) -> str:
+    if not runtime["parallel_transfers"]:
+        return "standard"
+    return f"parallel, {runtime['transfer_workers']} parts in flight"
+
+
+def build_effective_rates_text(limit: int = 10) -> str:
+    if active_relay is None:
+        return ""
+    rates = active_relay.effective_rates()
+    if not rates:
+        return ""
+
+    lines = ["📈 **Effective Send Rate (learned):**"]
+    for destination_id, (interval, flood_waits) in sorted(rates.items(), key=lambda item: -item[1][0])[:limit]:
+        lines.append(f"• `{destination_id}`: every {interval:.1f} sec (FloodWaits: {flood_waits})")
+    if len(rates) > limit:
+        lines.append(f"• … and {len(rates) - limit} more")
+    return "\n".join(lines) + "\n\n"
+
+
+def build_relay_settings_buttons(runtime: dict | None = None) -> list[list[Button]]:
+    runtime = runtime or relay_settings_manager.get_runtime_settings()
     relay_state = "🔴 Disable Relay" if bool(runtime["relay_enabled"]) else "🟢 Enable Relay"
     dedup_state = "🔴 Disable Duplicate Filter" if bool(runtime["dedup_enabled"]) else "🟢 Enable Duplicate Filter"
     return [
         [Button.inline("✏️ Set Caption", b"relay_set_caption")],
         [Button.inline("⏱️ Set Rate Limit", b"relay_set_rate_limit"),Button.inline("📁 Set File Prefix", b"relay_set_file_prefix"),Button.inline("🔄 Set Source Refresh", b"relay_set_source_refresh")],
-        [Button.inline(relay_state, b"relay_toggle_enabled"),Button.inline(dedup_state, b"relay_toggle_dedup")],
+        [Button.inline("📈 Set Adaptive Bounds", b"relay_set_rate_bounds"),Button.inline("🧺 Set Album Window", b"relay_set_album_window"),Button.inline("📦 Set Bundle Thresholds", b"relay_set_bundle")],
+        [Button.inline(relay_state, b"relay_toggle_enabled"),Button.inline(dedup_state, b"relay_toggle_dedup"),Button.inline("🧹 Set Dedup Window", b"relay_set_dedup_window")],
+        [Button.inline("🚀 Transfer Engine", b"relay_set_transfer_engine")],
         [Button.inline("🔙 Back to Menu", b"main_menu")],
     ]
 
 
+def build_channel_export(export_format: str) -> tuple[io.BytesIO, int]:
+    """Stream every mapping into an in-memory ``txt`` or ``csv`` file; return it with the row count.
+
+    Each request gets its own buffer, so concurrent exports never share a path.
+    """
+    buffer = io.BytesIO()
+    text = io.TextIOWrapper(buffer, encoding="utf-8", newline="")
+    written = 0
+    if export_format == "csv":
+        writer = csv.writer(text)
+        writer.writerow(EXPORT_CSV_HEADER)
+        for row in channel_manager.iter_mappings():
+            writer.writerow(row)
+            written += 1
+    else:
+        text.write("NPVT channel mappings:\n\n")
+        for row_id, source_id, destination_id, delivery_mode in channel_manager.iter_mappings():
+            text.write(
+                f"ID: {row_id}\n"
+                f"source_channel_id: {source_id}\n"
+                f"destination_channel_id: {destination_id}\n"
+                f"delivery_mode: {delivery_mode}\n"
+                + "-" * 32
+                + "\n"
+            )
+            written += 1
+    text.flush()
+    text.detach()
+    buffer.seek(0)
+    buffer.name = f"channels_list.{export_format}"
+    return buffer, written
+
+
+def load_channel_page(direction: str = "next", anchor: int | None = None) -> tuple[list[dict], bool, bool]:
+    """One page of mappings around ``anchor`` plus whether older and newer pages exist.
+
+    ``next`` starts after ``anchor`` (``None`` is the first page), ``prev`` ends
+    before it. One extra row is fetched to tell whether the walk can go on.
+    """
+    if direction == "prev" and anchor is not None:
+        rows = channel_manager.channels_before(anchor, CHANNEL_PAGE_SIZE + 1)
+        has_prev = len(rows) > CHANNEL_PAGE_SIZE
+        return rows[-CHANNEL_PAGE_SIZE:], has_prev, True
+
+    rows = channel_manager.channels_after(anchor, CHANNEL_PAGE_SIZE + 1)
+    has_next = len(rows) > CHANNEL_PAGE_SIZE
+    return rows[:CHANNEL_PAGE_SIZE], anchor is not None, has_next
+
+
 def build_admin_stats_text() -> str:
     stats = config_manager.get_stats()
     channels_count = channel_manager.count_channels()
@@ -79,17 +373,124 @@ def build_admin_stats_text() -> str:
         f"• **Unique File IDs:** {stats['unique_file_ids']}\n"
         f"• **Unique File Hashes (Dedup Cache):** {dedup_cache_size}\n"
         f"• **Latest Transfer:** {stats['latest_transfer_date']}\n\n"
-        "⚠️ *Note: Resetting configs will clear transfer history and duplicate cache.*"
+        + build_relay_latency_text()
     )
 
 
+def _format_ms(ms: int) -> str:
+    if ms < 1000:
+        return f"{ms}ms"
+    if ms < 60_000:
+        return f"{ms / 1000:.1f}s"
+    return f"{ms / 60_000:.1f}m"
+
+
+def build_relay_latency_text() -> str:
+    """Source post -> destination latency per window: the total first, then each stage in pipeline order."""
+    lines = ["⏳ **Relay Latency (p50 / p95 / p99):**"]
+    for window, summary in config_manager.latency_percentiles().items():
+        label = f"Last {int(window.total_seconds() // 3600)}h"
+        if not summary["transfers"]:
+            lines.append(f"**{label}:** no tracked transfers")
+            continue
+        lines.append(f"**{label}** · {summary['transfers']} file(s)")
+        for stage in ("total", *LATENCY_STAGES[:-1]):
+            percentiles = summary[stage]
+            if percentiles is None:
+                continue
+            lines.append(f"• `{stage:<8}` " + " / ".join(_format_ms(ms) for ms in percentiles.values()))
+    lines.append("💡 *queue = waiting for the relay; download/upload/send = Telegram I/O plus the wait before it (send includes pacing).*")
+    return "\n".join(lines) + "\n\n"
+
+
+def build_panel_latency_text(limit: int = 3) -> str:
+    slowest = router.slowest(limit)
+    if not slowest:
+        return ""
+
+    lines = ["⏱️ **Slowest Panel Actions:**"]
+    for route, avg_ms, max_ms in slowest:
+        lines.append(f"• `{route}`: avg {avg_ms:.0f} ms, max {max_ms:.0f} ms")
+    return "\n".join(lines) + "\n\n"
+
+
 def build_admin_stats_buttons() -> list[list[Button]]:
     return [
         [Button.inline("🔄 Refresh Stats", b"admin_stats_refresh"),Button.inline("⚠️ Reset Configs Table", b"admin_reset_configs")],
+        [Button.inline("🗄️ Archive & Retention", b"admin_archive")],
         [Button.inline("🔙 Back to Menu", b"main_menu")],
     ]
 
 
+def build_archive_text() -> str:
+    retention_days = relay_settings_manager.get_runtime_settings()["retention_days"]
+    stats = archive_manager.get_stats()
+    raw_mb = stats["raw_bytes"] / (1024 * 1024)
+    file_mb = stats["file_bytes"] / (1024 * 1024)
+    saved = (1 - stats["file_bytes"] / stats["raw_bytes"]) * 100 if stats["raw_bytes"] else 0.0
+
+    return (
+        "🗄️ **Archive & Retention**\n\n"
+        f"• **Retention:** {f'{retention_days} days' if retention_days else 'off (keep everything)'}\n"
+        f"• **Rows Archived:** {stats['rows_archived']} in {stats['runs']} run(s)\n"
+        f"• **Moved Out of MySQL:** {raw_mb:.2f} MB\n"
+        f"• **Archive Files:** {file_mb:.2f} MB ({saved:.0f}% saved by compression)\n"
+        f"• **Last Run:** {stats['last_run_at']}\n\n"
+        "💡 *Archived rows keep their file numbers and their duplicate-filter entries.*"
+    )
+
+
+def build_archive_buttons() -> list[list[Button]]:
+    return [
+        [Button.inline("🗓️ Set Retention", b"admin_set_retention"),Button.inline("▶️ Archive Now", b"admin_archive_run")],
+        [Button.inline("🔙 Back to Stats", b"admin_stats")],
+    ]
+
+
+async def cached_view(key: str, build, refresh: bool = False) -> str:
+    """Return the cached text for ``key``, rebuilding it off the event loop when missing or refreshed."""
+    text = None if refresh else view_cache.get(key)
+    if text is None:
+        text = await asyncio.to_thread(build)
+        view_cache.set(key, text)
+    return text
+
+
+async def show(event, text: str, buttons=None) -> None:
+    """Edit the panel message in place; fall back to an alert when it can't be edited."""
+    try:
+        await event.edit(text, buttons=buttons)
+    except MessageNotModifiedError:
+        pass
+    except Exception:
+        await safe_answer_callback(event, text, alert=True)
+
+
+async def show_relay_settings(event) -> None:
+    runtime = await asyncio.to_thread(relay_settings_manager.get_runtime_settings)
+    await show(event, build_relay_settings_text(runtime), build_relay_settings_buttons(runtime))
+
+
+async def show_admin_stats(event, refresh: bool = False) -> None:
+    text = await cached_view("admin_stats", build_admin_stats_text, refresh=refresh)
+    await show(event, text + build_panel_latency_text() + ADMIN_STATS_NOTE, build_admin_stats_buttons())
+
+
+async def show_archive(event, note: str = "") -> None:
+    text = await asyncio.to_thread(build_archive_text)
+    await show(event, note + text, build_archive_buttons())
+
+
+def _register_step_prompts() -> None:
+    for action, (step, prompt) in STEP_PROMPTS.items():
+
+        async def enter_step(event, sender, user, step=step, prompt=prompt):
+            await asyncio.to_thread(panel_states.set, sender, step, {})
+            await event.edit(prompt, buttons=BACK_MENU_BTN)
+
+        router.action(action)(enter_step)
+
+
 async def start_helper_bot(
     user_client: TelegramClient,
     BOT_SESSION: str,
@@ -97,522 +498,599 @@ async def start_helper_bot(
     API_HASH: str,
     BOT_TOKEN: str,
     SELF_USER_ID: int,
+    relay_service=None,
+    schema_ready: Awaitable | None = None,
 ):
+    """Connect the helper bot and register the panel.
+
+    The bot logs in while migrations run; handlers are only attached once
+    ``schema_ready`` has finished, since every panel route reads or writes
+    tables a migration may still be creating or swapping.
+    """
+    global active_relay
+    active_relay = relay_service
+
     self_client = user_client
     bot         = TelegramClient(BOT_SESSION, API_ID, API_HASH)
     await bot.start(bot_token=BOT_TOKEN)
 
-    @self_client.on(events.NewMessage)
-    async def message_handler(event):
-        sender = event.sender_id
-        if not is_owner(sender):
+    # ---- Panel steps: owner messages sent while a prompt is open ----
+
+    @router.step("reset_configs_confirm")
+    async def reset_configs_step(event, sender, user, text):
+        if text.lower() == "cancel":
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("📍 Configs reset cancelled.")
             return
 
-        user = user_manager.ensure_user(sender, "none")
-        text = (event.text or "").strip()
-        lower_text = text.lower()
+        if text != "RESET CONFIGS":
+            await event.reply("❓ Confirmation mismatch. Send exactly: RESET CONFIGS\nOr send: cancel")
+            return
 
-        if lower_text in {".panel", "/panel"}:
-            user_manager.update_user(sender, step="none", data=json.dumps({}))
+        removed = await asyncio.to_thread(config_manager.reset_all_transfers)
+        view_cache.pop("admin_stats")
+        if relay_service is not None:
+            relay_service.invalidate_transfer_caches()
+        await asyncio.to_thread(panel_states.set, sender, "reset_configs_confirm", {})
+        await event.reply(
+            f"✅ Configs table reset successfully.\n"
+            f"• Removed rows: {removed}\n"
+            "Duplicate cache is now cleared."
+        )
+
+    @router.step("relay_caption")
+    async def relay_caption_step(event, sender, user, text):
+        if text.lower() == "cancel":
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("• Relay caption update cancelled.")
             return
 
-        if user["step"] == "reset_configs_confirm":
-            if lower_text == "cancel":
-                user_manager.update_user(sender, step="none", data=json.dumps({}))
-                await event.reply("📍 Configs reset cancelled.")
-                return
+        caption_text = text.replace("\\n", "\n")
+        caption_text = caption_text.replace("\r\n", "\n").replace("\r", "\n")
+        if len(caption_text.strip()) > 1000:
+            await event.reply("• Caption too long. Telegram allows max 1024 characters.")
+            return
 
-            if text != "RESET CONFIGS":
-                await event.reply("❓ Confirmation mismatch. Send exactly: RESET CONFIGS\nOr send: cancel")
-                return
+        await asyncio.to_thread(relay_settings_manager.set_caption, caption_text)
+        await asyncio.to_thread(panel_states.set, sender, "relay_caption", {})
+        await event.reply("• Relay caption updated successfully.")
 
-            removed = config_manager.reset_all_transfers()
-            user_manager.update_user(sender, step="reset_configs_confirm", data=json.dumps({}))
-            await event.reply(
-                f"✅ Configs table reset successfully.\n"
-                f"• Removed rows: {removed}\n"
-                "Duplicate cache is now cleared."
-            )
+    @router.step("relay_rate_limit")
+    async def relay_rate_limit_step(event, sender, user, text):
+        if text.lower() == "cancel":
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("• Rate limit update cancelled.")
             return
 
-        if user["step"] == "relay_caption":
-            if lower_text == "cancel":
-                user_manager.update_user(sender, step="none", data=json.dumps({}))
-                await event.reply("• Relay caption update cancelled.")
-                return
+        try:
+            seconds = float(text)
+            if seconds < 1:
+                raise ValueError
+        except ValueError:
+            await event.reply("• Invalid value. Send a number >= 1 (example: 6)")
+            return
 
-            caption_text = text.replace("\\n", "\n")
-            caption_text = caption_text.replace("\r\n", "\n").replace("\r", "\n")
-            if len(caption_text.strip()) > 1000:
-                await event.reply("• Caption too long. Telegram allows max 1024 characters.")
-                return
+        await asyncio.to_thread(relay_settings_manager.set_send_interval_seconds, seconds)
+        await asyncio.to_thread(panel_states.set, sender, "relay_rate_limit", {})
+        await event.reply("• Rate limit updated successfully.")
 
-            relay_settings_manager.set_caption(caption_text)
-            user_manager.update_user(sender, step="relay_caption", data=json.dumps({}))
-            await event.reply("• Relay caption updated successfully.")
+    @router.step("relay_rate_bounds")
+    async def relay_rate_bounds_step(event, sender, user, text):
+        if text.lower() == "cancel":
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("• Adaptive bounds update cancelled.")
             return
 
-        if user["step"] == "relay_rate_limit":
-            if lower_text == "cancel":
-                user_manager.update_user(sender, step="none", data=json.dumps({}))
-                await event.reply("• Rate limit update cancelled.")
-                return
+        try:
+            min_text, max_text = text.split()
+            min_seconds = float(min_text)
+            max_seconds = float(max_text)
+            if min_seconds < 1 or max_seconds < min_seconds:
+                raise ValueError
+        except ValueError:
+            await event.reply("• Invalid value. Send two numbers: min max (min >= 1, max >= min). Example: 2 60")
+            return
 
-            try:
-                seconds = float(text)
-                if seconds < 1:
-                    raise ValueError
-            except ValueError:
-                await event.reply("• Invalid value. Send a number >= 1 (example: 6)")
-                return
+        await asyncio.to_thread(relay_settings_manager.set_send_interval_bounds, min_seconds, max_seconds)
+        await asyncio.to_thread(panel_states.set, sender, "relay_rate_bounds", {})
+        await event.reply("• Adaptive bounds updated successfully.")
 
-            relay_settings_manager.set_send_interval_seconds(seconds)
-            user_manager.update_user(sender, step="relay_rate_limit", data=json.dumps({}))
-            await event.reply("• Rate limit updated successfully.")
+    @router.step("relay_album_window")
+    async def relay_album_window_step(event, sender, user, text):
+        if text.lower() == "cancel":
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("• Album window update cancelled.")
             return
 
-        if user["step"] == "relay_file_prefix":
-            if lower_text == "cancel":
-                user_manager.update_user(sender, step="none", data=json.dumps({}))
-                await event.reply("• File prefix update cancelled.")
-                return
+        try:
+            seconds = float(text)
+            if seconds < 0.5 or seconds > 60:
+                raise ValueError
+        except ValueError:
+            await event.reply("• Invalid value. Send a number between 0.5 and 60 (example: 5)")
+            return
+
+        await asyncio.to_thread(relay_settings_manager.set_album_window_seconds, seconds)
+        await asyncio.to_thread(panel_states.set, sender, "relay_album_window", {})
+        await event.reply("• Album window updated successfully.")
 
-            normalized_prefix = relay_settings_manager.normalize_filename_prefix(text)
-            relay_settings_manager.set_filename_prefix(normalized_prefix)
-            user_manager.update_user(sender, step="relay_file_prefix", data=json.dumps({}))
-            await event.reply(f"✅ File prefix updated successfully.\nCurrent prefix: {normalized_prefix}")
+    @router.step("relay_bundle")
+    async def relay_bundle_step(event, sender, user, text):
+        if text.lower() == "cancel":
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("• Bundle thresholds update cancelled.")
             return
 
-        if user["step"] == "relay_source_refresh":
-            if lower_text == "cancel":
-                user_manager.update_user(sender, step="none", data=json.dumps({}))
-                await event.reply("• Source refresh update cancelled.")
-                return
+        try:
+            minutes_text, megabytes_text = text.split()
+            minutes = float(minutes_text)
+            megabytes = float(megabytes_text)
+            if minutes < 1 or minutes > 1440 or megabytes < 1 or megabytes > 2000:
+                raise ValueError
+        except ValueError:
+            await event.reply("• Invalid value. Send two numbers: minutes megabytes (1-1440 and 1-2000). Example: 10 20")
+            return
 
-            try:
-                seconds = int(text)
-                if seconds < 5:
-                    raise ValueError
-            except ValueError:
-                await event.reply("• Invalid value. Send an integer >= 5 (example: 20)")
-                return
+        await asyncio.to_thread(relay_settings_manager.set_bundle_thresholds, minutes * 60, int(megabytes * 1024 * 1024))
+        await asyncio.to_thread(panel_states.set, sender, "relay_bundle", {})
+        await event.reply("• Bundle thresholds updated successfully.")
 
-            relay_settings_manager.set_source_cache_seconds(seconds)
-            user_manager.update_user(sender, step="relay_source_refresh", data=json.dumps({}))
-            await event.reply("✅ Source refresh updated successfully.")
-            return
-
-        if user["step"] == "panel2":
-            try:
-                if text.startswith("-100") and text[4:].isdigit():
-                    source_id = int(text)
-                else:
-                    entity = await self_client.get_entity(text)
-                    source_id = int(getattr(entity, "id"))
-                    if source_id > 0:
-                        source_id = int(f"-100{source_id}")
-
-                if not str(source_id).startswith("-100"):
-                    raise ValueError("• Source ID must start with -100")
-            except Exception:
-                await event.reply("• Invalid source channel/group. Make sure self account has access.")
-                return
+    @router.step("relay_dedup_window")
+    async def relay_dedup_window_step(event, sender, user, text):
+        if text.lower() == "cancel":
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("• Dedup window update cancelled.")
+            return
+
+        try:
+            days_text, scope = text.split()
+            days = float(days_text)
+            scope = scope.lower()
+            if days < 0 or days > 3650 or scope not in DEDUP_SCOPES:
+                raise ValueError
+        except ValueError:
+            await event.reply(
+                f"• Invalid value. Send days (0-3650) and a scope ({', '.join(DEDUP_SCOPES)}). Example: 7 destination"
+            )
+            return
 
-            raw_data = user.get("data")
-            data_dict = json.loads(raw_data) if raw_data else {}
-            data_dict["source"] = source_id
+        await asyncio.to_thread(relay_settings_manager.set_dedup_policy, days, scope)
+        await asyncio.to_thread(panel_states.set, sender, "relay_dedup_window", {})
+        await event.reply("• Dedup window updated successfully.")
 
-            user_manager.update_user(sender, step="panel2_dest", data=json.dumps(data_dict))
-            await event.reply("✅ Now send destination numeric ID (must start with -100)")
+    @router.step("admin_retention")
+    async def admin_retention_step(event, sender, user, text):
+        if text.lower() == "cancel":
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("• Retention update cancelled.")
             return
 
-        if user["step"] == "panel2_dest":
-            if not (text.startswith("-100") and text[4:].isdigit()):
-                await event.reply("❌ Destination must start with -100")
-                return
+        try:
+            days = int(text)
+            if days < 0 or days > 3650:
+                raise ValueError
+        except ValueError:
+            await event.reply("• Invalid value. Send whole days between 0 and 3650 (example: 90)")
+            return
 
-            raw_data = user.get("data")
-            data_dict = json.loads(raw_data) if raw_data else {}
-            data_dict["destination"] = int(text)
+        await asyncio.to_thread(relay_settings_manager.set_retention_days, days)
+        await asyncio.to_thread(panel_states.reset, sender)
+        await event.reply("• Retention updated successfully." if days else "• Retention turned off.")
 
-            user_manager.update_user(sender, step="panel2_confirm", data=json.dumps(data_dict))
-            await event.reply(
-                "Confirm registration:\n\n"
-                f"Source: {data_dict['source']}\n"
-                f"Destination: {data_dict['destination']}\n\n"
-                "Type: yes / no"
-            )
+    @router.step("relay_transfer_engine")
+    async def relay_transfer_engine_step(event, sender, user, text):
+        parts = text.lower().split()
+        if parts == ["cancel"]:
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("• Transfer engine update cancelled.")
+            return
+
+        if parts == ["off"]:
+            await asyncio.to_thread(relay_settings_manager.set_parallel_transfers, False)
+        elif len(parts) == 2 and parts[0] == "on" and parts[1].isdigit() and 1 <= int(parts[1]) <= 8:
+            await asyncio.to_thread(relay_settings_manager.set_parallel_transfers, True, int(parts[1]))
+        else:
+            await event.reply("• Invalid value. Send `off` or `on <1-8>` (example: on 4)")
             return
 
-        if user["step"] == "panel2_confirm":
-            if lower_text == "yes":
-                raw_data = user.get("data")
-                data_dict = json.loads(raw_data) if raw_data else {}
+        await asyncio.to_thread(panel_states.set, sender, "relay_transfer_engine", {})
+        await event.reply("• Transfer engine updated successfully.")
 
-                channel_manager.add_channel(
-                    source_id=data_dict["source"],
-                    dest_id=data_dict["destination"],
-                )
+    @router.step("relay_file_prefix")
+    async def relay_file_prefix_step(event, sender, user, text):
+        if text.lower() == "cancel":
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("• File prefix update cancelled.")
+            return
 
-                user_manager.update_user(sender, step="none", data=json.dumps({}))
-                await event.reply("✅ Channel mapping registered successfully.")
-                return
+        normalized_prefix = relay_settings_manager.normalize_filename_prefix(text)
+        await asyncio.to_thread(relay_settings_manager.set_filename_prefix, normalized_prefix)
+        await asyncio.to_thread(panel_states.set, sender, "relay_file_prefix", {})
+        await event.reply(f"✅ File prefix updated successfully.\nCurrent prefix: {normalized_prefix}")
 
-            if lower_text in {"no", ".panel", "/panel"}:
-                user_manager.update_user(sender, step="none", data=json.dumps({}))
-                await event.reply("💔 Registration cancelled.")
-                return
+    @router.step("relay_source_refresh")
+    async def relay_source_refresh_step(event, sender, user, text):
+        if text.lower() == "cancel":
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("• Source refresh update cancelled.")
+            return
 
-            await event.reply("📍 Type yes or no")
+        try:
+            seconds = int(text)
+            if seconds < 5:
+                raise ValueError
+        except ValueError:
+            await event.reply("• Invalid value. Send an integer >= 5 (example: 20)")
             return
 
-        if user["step"] == "panel4":
+        await asyncio.to_thread(relay_settings_manager.set_source_cache_seconds, seconds)
+        await asyncio.to_thread(panel_states.set, sender, "relay_source_refresh", {})
+        await event.reply("✅ Source refresh updated successfully.")
+
+    @router.step("panel2")
+    async def add_source_step(event, sender, user, text):
+        try:
             if text.startswith("-100") and text[4:].isdigit():
-                source_lookup = int(text)
-            elif text.isdigit():
-                source_lookup = int(f"-{text}")
+                source_id = int(text)
             else:
-                await event.reply("📍 Source ID must be numeric.")
-                return
+                source_id = channel_peer_id(await self_client.get_entity(text))
+                if source_id is None:
+                    await event.reply("• Source must be a channel or supergroup (users and basic groups cannot be relayed).")
+                    return
+        except Exception:
+            await event.reply("• Invalid source channel/group. Make sure self account has access.")
+            return
 
-            existing = channel_manager.get_by_source(source_lookup)
-            if existing:
-                user_manager.update_user(sender, step="panel4_confirm", data=str(existing["id"]))
-                await event.reply(
-                    "⚠️ **Warning:** Are you sure you want to delete this mapping?\n\n"
-                     f"• **Record ID:** {existing['id']}\n"
-                     f"• **Source Channel:** {existing['source_channel_id']}\n"
-                     f"• **Destination Channel:** {existing['destination_channel_id']}\n\n"
-                     "✅ Type `yes` to confirm / ❌ Type `no` to cancel"
-                )
-                return
+        data_dict = dict(user.data)
+        data_dict["source"] = source_id
 
-            await event.reply("❌ No mapping found for this source ID.")
+        await asyncio.to_thread(panel_states.set, sender, "panel2_dest", data_dict)
+        await event.reply("✅ Now send destination numeric ID (must start with -100)")
+
+    @router.step("panel2_dest")
+    async def add_destination_step(event, sender, user, text):
+        if not (text.startswith("-100") and text[4:].isdigit()):
+            await event.reply("❌ Destination must start with -100")
             return
 
-        if user["step"] == "panel4_confirm":
-            if lower_text == "yes":
-                channel_manager.delete_channel(int(user["data"]))
-                user_manager.update_user(sender, step="none", data=json.dumps({}))
-                await event.reply("✅ Mapping deleted successfully.")
-                return
+        data_dict = dict(user.data)
+        data_dict["destination"] = int(text)
 
-            if lower_text in {"no", ".panel", "/panel"}:
-                user_manager.update_user(sender, step="none", data=json.dumps({}))
-                await event.reply("• Operation cancelled.")
-                return
+        await asyncio.to_thread(panel_states.set, sender, "panel2_confirm", data_dict)
+        await event.reply(
+            "Confirm registration:\n\n"
+            f"Source: {data_dict['source']}\n"
+            f"Destination: {data_dict['destination']}\n\n"
+            "Type: yes / no"
+        )
+
+    @router.step("panel2_confirm")
+    async def add_confirm_step(event, sender, user, text):
+        lower_text = text.lower()
+        if lower_text == "yes":
+            data_dict = dict(user.data)
 
-            await event.reply("📍 Type yes or no")
+            await asyncio.to_thread(
+                channel_manager.add_channel,
+                source_id=data_dict["source"],
+                dest_id=data_dict["destination"],
+            )
+
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("✅ Channel mapping registered successfully.")
             return
 
-    @bot.on(events.InlineQuery)
-    async def inline_handler(event: events.InlineQuery.Event):
-        if event.sender_id != SELF_USER_ID:
-            await event.answer([], cache_time=0)
+        if lower_text in {"no", ".panel", "/panel"}:
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("💔 Registration cancelled.")
             return
 
-        q = (event.text or "").strip().lower()
-        if q in ("panel", ""):
-            user_manager.update_user(event.sender_id, step="none")
-            result = event.builder.article(
-                title="Self Admin Panel",
-                description="Admin panel for owner only",
-                text="🍓 **Welcome to the NPVT(AUTOPOST) Admin Panel!**\n\nTap the buttons below to manage everything like a pro",
-                buttons=MAIN_MENU_BTN,
-            )
-            await event.answer([result], cache_time=0)
+        await event.reply("📍 Type yes or no")
 
-    @bot.on(events.CallbackQuery)
-    async def callback_handler(event: events.CallbackQuery.Event):
-        sender = event.sender_id
-        data = event.data.decode() if event.data else ""
+    @router.step("panel_import")
+    async def import_mappings_step(event, sender, user, text):
+        if text.lower() == "cancel":
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("• Bulk import cancelled.")
+            return
 
-        if not is_owner(sender):
+        if event.file is None or event.photo:
+            await event.reply("📍 Send the mappings as a .csv or .txt file, or type cancel.")
             return
 
-        user = user_manager.ensure_user(sender, "none")
+        if (event.file.size or 0) > IMPORT_MAX_BYTES:
+            await event.reply(f"❌ File too large. Max size: {IMPORT_MAX_BYTES // 1024} KB")
+            return
 
-        if data == "acc_info":
-            me = await user_client.get_me()
-            info_text = (
-                "👤 **Self Account Information**\n\n"
-                f"• **Name:** {me.first_name}\n"
-                f"• **ID:** `{me.id}`\n"
-                f"• **Username:** @{me.username if me.username else 'Not set'}"
-            )
-            buttons = [[Button.inline("🔙 Back to Menu", b"main_menu")]]
-            try:
-                await event.edit(info_text, buttons=buttons)
-            except Exception:
-                await safe_answer_callback(event, info_text, alert=True)
-
-        elif data == "script_info":
-            developers = [
-                {"name": "Hojjat Jahanpour", "github": "https://github.com/hojjatjh"},
-                {"name": "Anita Bagheri", "github": "https://github.com/anitabg00"},
-            ]
-
-            dev_text  = "\n".join([f"👤 {dev['name']} — [GitHub]({dev['github']})" for dev in developers])
-            info_text = (
-                f"🍓 **Script Information**\n"
-                f"─────────────────────────────\n"
-                f"⚡ Version: {VERSION}\n"
-                f"🐍 Python: >=3.10\n"
-                f"📜 License: MIT\n"
-                f"─────────────────────────────\n"
-                f"🧑‍💻 **Developers:**\n"
-                f"{dev_text}\n"
-                f"─────────────────────────────\n"
-                f"✨ Thank you for using this selfbot!"
-            )
+        await event.reply("⏳ Importing mappings... Please wait...")
+        data = await event.download_media(file=bytes)
+        report = await MappingImporter(self_client, channel_manager).run(data)
+        await asyncio.to_thread(panel_states.reset, sender)
+        view_cache.pop("admin_stats")
+
+        lines = [
+            "📥 **Bulk import finished**\n",
+            f"• **Accepted:** {len(report.accepted)}",
+            f"• **Rejected:** {len(report.rejected)}",
+        ]
+        for line_no, row, reason in sorted(report.rejected)[:10]:
+            lines.append(f"  – line {line_no}: `{row}` ({reason})")
+        if len(report.rejected) > 10:
+            lines.append("  – … full list attached")
+        await event.reply("\n".join(lines))
+        if len(report.rejected) > 10:
+            await event.reply(file=report.rejected_csv(), force_document=True)
+
+    @router.step("panel_mode")
+    async def delivery_mode_step(event, sender, user, text):
+        lower_text = text.lower()
+        parts = lower_text.split()
+        if lower_text == "cancel":
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("• Delivery mode update cancelled.")
+            return
 
-            buttons = [
-                [
-                    Button.url('📂 GitHub Project', 'https://github.com/hojjatjh/NPVT-AutoPost'),
-                    Button.url('👨‍💻 Main Developer', 'https://t.me/hojjat_jh')
-                ],
-                [Button.inline('🔙 Return to main menu', b'main_menu')]
-            ]
-            try:
-                await event.edit(info_text, buttons=buttons)
-            except:
-                await safe_answer_callback(event, info_text, alert=True)
-
-        elif data == "channel_management":
-            text = "📣 You can manage your channels in this section\n\n⌨️ Use the menu below to manage"
-            try:
-                await event.edit(text, buttons=CHANNEL_MANAGEMENT)
-            except Exception:
-                await safe_answer_callback(event, text, alert=True)
-
-        elif data == "admin_stats":
-            user_manager.update_user(sender, step="none", data=json.dumps({}))
-            text = build_admin_stats_text()
-            try:
-                await event.edit(text, buttons=build_admin_stats_buttons())
-            except Exception:
-                await safe_answer_callback(event, text, alert=True)
-
-        elif data == "admin_stats_refresh":
-            text = build_admin_stats_text()
-            try:
-                await event.edit(text, buttons=build_admin_stats_buttons())
-            except Exception:
-                await safe_answer_callback(event, text, alert=True)
-
-        elif data == "admin_reset_configs":
-            user_manager.update_user(sender, step="reset_configs_confirm", data=json.dumps({}))
-            await event.edit(
-                "💣 **DANGER ZONE: Reset Configs Table** ⚠️\n\n"
-                "This action will **permanently remove ALL transfer history** and **clear the duplicate cache**.\n\n"
-                "📝 To confirm, type exactly in your self chat:\n"
-                "`RESET CONFIGS`\n\n"
-                "❌ Send `cancel` to abort this operation safely.",
-                buttons=BACK_MENU_BTN,
-            )
+        if len(parts) != 2 or not (parts[0].startswith("-100") and parts[0][4:].isdigit()) or parts[1] not in DELIVERY_MODES:
+            await event.reply(f"📍 Send: <source -100 ID> <mode>\nModes: {', '.join(DELIVERY_MODES)}")
+            return
 
-        elif data == "relay_settings":
-            user_manager.update_user(sender, step="none", data=json.dumps({}))
-            text = build_relay_settings_text()
-            try:
-                await event.edit(text, buttons=build_relay_settings_buttons())
-            except Exception:
-                await safe_answer_callback(event, text, alert=True)
-
-        elif data == "relay_settings_show":
-            text = build_relay_settings_text()
-            try:
-                await event.edit(text, buttons=build_relay_settings_buttons())
-            except Exception:
-                await safe_answer_callback(event, text, alert=True)
-
-        elif data == "relay_set_caption":
-            user_manager.update_user(sender, step="relay_caption", data=json.dumps({}))
-            await event.edit(
-                "✏️ **Send New Caption for Relayed Files**\n\n"
-                "• Supports **Persian / English** and **multi-line text**.\n\n"
-                "📌 Example:\n"
-                "`سلام این کپشن هست\\n@hojjat_jh`\n\n"
-                "❌ Type `cancel` to abort this action.",
-                buttons=BACK_MENU_BTN,
-            )
+        if not await asyncio.to_thread(channel_manager.set_delivery_mode, int(parts[0]), parts[1]):
+            await event.reply("❌ No mapping found for this source ID.")
+            return
 
-        elif data == "relay_set_rate_limit":
-            user_manager.update_user(sender, step="relay_rate_limit", data=json.dumps({}))
-            await event.edit(
-                "• Send the new rate limit in **seconds** (number ≥ 1)",
-                buttons=BACK_MENU_BTN,
-            )
+        await asyncio.to_thread(panel_states.reset, sender)
+        await event.reply(f"✅ Delivery mode for {parts[0]} set to {parts[1]}.")
 
-        elif data == "relay_set_file_prefix":
-            user_manager.update_user(sender, step="relay_file_prefix", data=json.dumps({}))
-            await event.edit(
-                "📁 **Set New File Prefix**\n\n"
-                "• Supports **Persian / English** characters.\n"
-                "📌 Example:\n"
-                "`Myfilename`\n"
-                "➡ Resulting filename: `Myfilename (123).npvt`\n\n"
-                "❌ Type `cancel` to abort this action.",
-                buttons=BACK_MENU_BTN,
-            )
+    @router.step("panel4")
+    async def delete_lookup_step(event, sender, user, text):
+        if text.startswith("-100") and text[4:].isdigit():
+            source_lookup = int(text)
+        elif text.isdigit():
+            source_lookup = int(f"-{text}")
+        else:
+            await event.reply("📍 Source ID must be numeric.")
+            return
 
-        elif data == "relay_set_source_refresh":
-            user_manager.update_user(sender, step="relay_source_refresh", data=json.dumps({}))
-            await event.edit(
-                "• Send source mapping refresh in seconds (integer >= 5).\n\nExample: 20\nType 'cancel' to abort.",
-                buttons=BACK_MENU_BTN,
+        existing = await asyncio.to_thread(channel_manager.get_by_source, source_lookup)
+        if existing:
+            await asyncio.to_thread(panel_states.set, sender, "panel4_confirm", {"mapping_id": int(existing["id"])})
+            await event.reply(
+                "⚠️ **Warning:** Are you sure you want to delete this mapping?\n\n"
+                 f"• **Record ID:** {existing['id']}\n"
+                 f"• **Source Channel:** {existing['source_channel_id']}\n"
+                 f"• **Destination Channel:** {existing['destination_channel_id']}\n\n"
+                 "✅ Type `yes` to confirm / ❌ Type `no` to cancel"
             )
+            return
 
-        elif data == "relay_toggle_enabled":
-            runtime = relay_settings_manager.get_runtime_settings()
-            new_state = not bool(runtime["relay_enabled"])
-            relay_settings_manager.set_relay_enabled(new_state)
-            text = build_relay_settings_text()
-            try:
-                await event.edit(text, buttons=build_relay_settings_buttons())
-            except Exception:
-                await safe_answer_callback(event, text, alert=True)
-
-        elif data == "relay_toggle_dedup":
-            runtime = relay_settings_manager.get_runtime_settings()
-            new_state = not bool(runtime["dedup_enabled"])
-            relay_settings_manager.set_dedup_enabled(new_state)
-            text = build_relay_settings_text()
-            try:
-                await event.edit(text, buttons=build_relay_settings_buttons())
-            except Exception:
-                await safe_answer_callback(event, text, alert=True)
-
-        elif data == "channel_management_add":
-            user_manager.update_user(sender, step="panel2", data=json.dumps({}))
-            await event.edit(
-                 "🔗 **Send Source Channel / Group**\n\n"
-                "You can provide the source in one of the following formats:\n"
-                "• `@username`\n"
-                "• Public link\n"
-                "• Numeric ID starting with `-100`\n\n"
-                "💡 Make sure the bot has access to the source channel/group.",
-                buttons=BACK_MENU_BTN,
-            )
+        await event.reply("❌ No mapping found for this source ID.")
 
-        elif data == "channel_management_del":
-            user_manager.update_user(sender, step="panel4", data="")
-            await event.edit(
-                "🗑️ **Delete Source Channel Mapping**\n\n"
-                "Send the **numeric ID** of the source channel you want to delete.\n\n"
-                "❌ Type `cancel` to abort this action.",
-                buttons=BACK_MENU_BTN,
-            )
+    @router.step("panel4_confirm")
+    async def delete_confirm_step(event, sender, user, text):
+        lower_text = text.lower()
+        if lower_text == "yes" and user.data.get("mapping_id") is not None:
+            await asyncio.to_thread(channel_manager.delete_channel, int(user.data["mapping_id"]))
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("✅ Mapping deleted successfully.")
+            return
 
-        elif data == "channel_management_help":
-            help_text = (
-                "📚 **Channel Management Guide**\n"
-                "━━━━━━━━━━━━━━━━━━━━━━\n\n"
-                "➕ **Add Channel**\n"
-                "──────────────────────\n"
-                "🎯 **Purpose:**\n"
-                "Register a source channel/group and link it to a destination channel for automatic operations.\n\n"
-                "⚙️ **How It Works:**\n"
-                "1️⃣ Send source channel/group:\n"
-                "   • `@username`\n"
-                "   • `https://t.me/...`\n"
-                "   • Numeric ID starting with `-100`\n\n"
-                "2️⃣ Send destination numeric ID\n"
-                "   • Must start with `-100`\n\n"
-                "3️⃣ Confirm information\n"
-                "   • Type: `yes` or `no`\n\n"
-                "✅ After Confirmation:\n"
-                "• Numeric ID will be resolved automatically\n"
-                "• Data securely saved in database\n"
-                "• Channel pair becomes active\n\n"
-                "⚠️ **Important Notes:**\n"
-                "• You must have proper access to channels\n"
-                "• Destination must always be numeric ID\n\n"
-                "━━━━━━━━━━━━━━━━━━━━━━\n\n"
-                "📋 **Channel List**\n"
-                "──────────────────────\n"
-                "🎯 **Purpose:**\n"
-                "View all registered channel pairs.\n\n"
-                "📌 **Features:**\n"
-                "• Preview first channels inside panel\n"
-                "• Download full list as `.txt` file\n\n"
-                "📊 **Displays:**\n"
-                "• Record ID\n"
-                "• Source Channel ID\n"
-                "• Destination Channel ID\n\n"
-                "🔒 **Security:**\n"
-                "• Owner access only\n"
-                "• Temporary files auto-deleted after sending\n"
-            )
-            await event.edit(help_text, buttons=BACK_MENU_BTN)
+        if lower_text in {"no", ".panel", "/panel"}:
+            await asyncio.to_thread(panel_states.reset, sender)
+            await event.reply("• Operation cancelled.")
+            return
+
+        await event.reply("📍 Type yes or no")
+
+    # ---- Panel actions: inline button callbacks ----
+
+    _register_step_prompts()
+
+    @router.action("acc_info")
+    async def account_info_action(event, sender, user):
+        me = await user_client.get_me()
+        info_text = (
+            "👤 **Self Account Information**\n\n"
+            f"• **Name:** {me.first_name}\n"
+            f"• **ID:** `{me.id}`\n"
+            f"• **Username:** @{me.username if me.username else 'Not set'}"
+        )
+        await show(event, info_text, [[Button.inline("🔙 Back to Menu", b"main_menu")]])
+
+    @router.action("script_info")
+    async def script_info_action(event, sender, user):
+        developers = [
+            {"name": "Hojjat Jahanpour", "github": "https://github.com/hojjatjh"},
+            {"name": "Anita Bagheri", "github": "https://github.com/anitabg00"},
+        ]
+
+        dev_text  = "\n".join([f"👤 {dev['name']} — [GitHub]({dev['github']})" for dev in developers])
+        info_text = (
+            f"🍓 **Script Information**\n"
+            f"─────────────────────────────\n"
+            f"⚡ Version: {VERSION}\n"
+            f"🐍 Python: >=3.10\n"
+            f"📜 License: MIT\n"
+            f"─────────────────────────────\n"
+            f"🧑‍💻 **Developers:**\n"
+            f"{dev_text}\n"
+            f"─────────────────────────────\n"
+            f"✨ Thank you for using this selfbot!"
+        )
+
+        buttons = [
+            [
+                Button.url('📂 GitHub Project', 'https://github.com/hojjatjh/NPVT-AutoPost'),
+                Button.url('👨‍💻 Main Developer', 'https://t.me/hojjat_jh')
+            ],
+            [Button.inline('🔙 Return to main menu', b'main_menu')]
+        ]
+        await show(event, info_text, buttons)
+
+    @router.action("channel_management")
+    async def channel_management_action(event, sender, user):
+        await show(event, "📣 You can manage your channels in this section\n\n⌨️ Use the menu below to manage", CHANNEL_MANAGEMENT)
+
+    @router.action("channel_management_help")
+    async def channel_help_action(event, sender, user):
+        await event.edit(CHANNEL_HELP_TEXT, buttons=BACK_MENU_BTN)
+
+    @router.action("admin_stats")
+    async def admin_stats_action(event, sender, user):
+        await asyncio.to_thread(panel_states.reset, sender)
+        await show_admin_stats(event)
+
+    @router.action("admin_stats_refresh")
+    async def admin_stats_refresh_action(event, sender, user):
+        await show_admin_stats(event, refresh=True)
+
+    @router.action("admin_archive")
+    async def admin_archive_action(event, sender, user):
+        await show_archive(event)
+
+    @router.action("admin_archive_run")
+    async def admin_archive_run_action(event, sender, user):
+        runtime = await asyncio.to_thread(relay_settings_manager.get_runtime_settings)
+        if not runtime["retention_days"]:
+            await show_archive(event, "⚠️ Set a retention period first.\n\n")
+            return
 
-        elif data == "channel_management_list":
-            user_manager.update_user(sender, step="panel1")
-            channels = channel_manager.get_all_channels()
+        await event.edit("⏳ Archiving old transfer rows... Please wait...")
+        cutoff = datetime.now() - timedelta(days=runtime["retention_days"])
+        result = await asyncio.to_thread(archiver.archive_before, cutoff)
+        view_cache.pop("admin_stats")
+        await show_archive(event, f"✅ Archived {result.rows} row(s) in this run.\n\n")
+
+    @router.action("relay_settings")
+    async def relay_settings_action(event, sender, user):
+        await asyncio.to_thread(panel_states.reset, sender)
+        await show_relay_settings(event)
+
+    @router.action("relay_settings_show")
+    async def relay_settings_show_action(event, sender, user):
+        await show_relay_settings(event)
+
+    @router.action("relay_toggle_enabled")
+    async def relay_toggle_enabled_action(event, sender, user):
+        runtime = await asyncio.to_thread(relay_settings_manager.get_runtime_settings)
+        await asyncio.to_thread(relay_settings_manager.set_relay_enabled, not bool(runtime["relay_enabled"]))
+        await show_relay_settings(event)
+
+    @router.action("relay_toggle_dedup")
+    async def relay_toggle_dedup_action(event, sender, user):
+        runtime = await asyncio.to_thread(relay_settings_manager.get_runtime_settings)
+        await asyncio.to_thread(relay_settings_manager.set_dedup_enabled, not bool(runtime["dedup_enabled"]))
+        await show_relay_settings(event)
+
+    @router.action("channel_management_list", "channel_page")
+    async def channel_list_action(event, sender, user, payload=""):
+        await asyncio.to_thread(panel_states.set, sender, "panel1")
+        direction, _, anchor = payload.partition(":")
+        channels, has_prev, has_next = await asyncio.to_thread(
+            load_channel_page,
+            direction or "next",
+            int(anchor) if anchor.isdigit() else None,
+        )
+
+        if not channels:
+            await event.edit("🔴 No source or destination registered.", buttons=BACK_MENU_BTN)
+            return
+
+        titles = await entity_cache.titles(user_client, [ch["source_channel_id"] for ch in channels])
+        lines = [f"📋 List of channels (records {channels[0]['id']}–{channels[-1]['id']}):\n"]
+        for ch in channels:
+            source_title = titles[int(ch["source_channel_id"])]
+            lines.append(f"• {source_title} ->\n {ch['destination_channel_id']}\n")
+
+        pager = []
+        if has_prev:
+            pager.append(Button.inline("⬅️ Prev", f"channel_page:prev:{channels[0]['id']}".encode()))
+        if has_next:
+            pager.append(Button.inline("Next ➡️", f"channel_page:next:{channels[-1]['id']}".encode()))
+        buttons = [
+            *([pager] if pager else []),
+            [Button.inline("📄 Export (txt)", b"channel_export:txt"), Button.inline("📊 Export (csv)", b"channel_export:csv")],
+            [Button.inline("🔙 Back to Menu", b"main_menu")],
+        ]
+        await show(event, "\n".join(lines), buttons)
+
+    @router.action("channel_export")
+    async def channel_export_action(event, sender, user, export_format="txt"):
+        if export_format not in EXPORT_FORMATS:
+            return
+        await asyncio.to_thread(panel_states.set, sender, "panel1")
+        await event.edit("⏳ Processing... Please wait...")
 
-            if not channels:
-                await event.edit("🔴 No source or destination registered.", buttons=BACK_MENU_BTN)
+        try:
+            export_file, written = await asyncio.to_thread(build_channel_export, export_format)
+            if not written:
+                await event.respond("🔴 No source/destination mappings registered.")
                 return
+            await bot.send_file(sender, export_file, caption="🤝 Complete list of channels", force_document=True)
+        except Exception:
+            await event.edit("Error sending file. Make sure self-bot chat is active.")
+            return
+
+        await event.edit("✅ Channel list sent successfully.", buttons=BACK_MENU_BTN)
+
+    @router.action("main_menu")
+    async def main_menu_action(event, sender, user):
+        if user.step in SETTINGS_STEPS:
+            await asyncio.to_thread(panel_states.reset, sender)
+            await show_relay_settings(event)
+        elif user.step == "reset_configs_confirm":
+            await asyncio.to_thread(panel_states.reset, sender)
+            await show_admin_stats(event)
+        elif user.step == "admin_retention":
+            await asyncio.to_thread(panel_states.reset, sender)
+            await show_archive(event)
+        else:
+            await show(event, "🍓 NPVT Helper Panel\n\nUse the buttons below.", MAIN_MENU_BTN)
 
-            preview_channels = channels[:13]
-            text = "📋 List of channels (first 13):\n\n"
-            for ch in preview_channels:
-                source_title = await resolve_channel_title(user_client, ch["source_channel_id"])
-                text += f"• {source_title} ->\n {ch['destination_channel_id']}\n\n"
+    # ---- Telethon entry points ----
 
-            buttons = [
-                [Button.inline("📄 Show all (txt)", b"channel_list_all")],
-                [Button.inline("🔙 Back to Menu", b"main_menu")],
-            ]
-            await event.edit(text, buttons=buttons)
+    if schema_ready is not None:
+        await schema_ready
 
-        elif data == "channel_list_all":
-            user_manager.update_user(sender, step="panel1")
-            channels = channel_manager.get_all_channels()
-            await event.edit("⏳ Processing... Please wait...")
+    @self_client.on(events.NewMessage)
+    async def message_handler(event):
+        sender = event.sender_id
+        if not is_owner(sender):
+            return
 
-            if not channels:
-                await event.respond("🔴 No source/destination mappings registered.")
-                return
+        user = await asyncio.to_thread(panel_states.get, sender)
+        text = (event.text or "").strip()
 
-            content = "NPVT channel mappings:\n\n"
-            for ch in channels:
-                content += f"ID: {ch['id']}\n"
-                content += f"source_channel_id: {ch['source_channel_id']}\n"
-                content += f"destination_channel_id: {ch['destination_channel_id']}\n"
-                content += "-" * 32 + "\n"
-
-            file_path = "channels_list.txt"
-            try:
-                with open(file_path, "w", encoding="utf-8") as file_obj:
-                    file_obj.write(content)
-                await bot.send_file(sender, file_path, caption="🤝 Complete list of channels")
-            except Exception:
-                await event.edit("Error sending file. Make sure self-bot chat is active.")
-                return
-            finally:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-
-            await event.edit("✅ Channel list sent successfully.", buttons=BACK_MENU_BTN)
-
-        elif data == "main_menu":
-            main_text = "🍓 NPVT Helper Panel\n\nUse the buttons below."
-            try:
-                if user['step'] in ('none', 'not_set'):
-                    await event.edit(main_text, buttons=MAIN_MENU_BTN)
-                elif user['step'] in ('relay_caption', 'relay_rate_limit', 'relay_file_prefix', 'relay_source_refresh'):
-                    user_manager.update_user(sender, step="none", data=json.dumps({}))
-                    await event.edit(build_relay_settings_text(), buttons=build_relay_settings_buttons())
-                elif user['step'] in ('reset_configs_confirm'):
-                    user_manager.update_user(sender, step="none", data=json.dumps({}))
-                    await event.edit(build_admin_stats_text(), buttons=build_admin_stats_buttons())
-                else:
-                    await event.edit(main_text, buttons=MAIN_MENU_BTN)
-            except Exception:
-                await safe_answer_callback(event, "Main panel", alert=True)
+        if text.lower() in {".panel", "/panel"}:
+            await asyncio.to_thread(panel_states.reset, sender)
+            return
 
-        else:
-            await event.answer()
+        await router.dispatch_step(event, user.step, sender, user, text)
+
+    @bot.on(events.InlineQuery)
+    async def inline_handler(event: events.InlineQuery.Event):
+        if event.sender_id != SELF_USER_ID:
+            await event.answer([], cache_time=0)
+            return
+
+        q = (event.text or "").strip().lower()
+        if q in ("panel", ""):
+            await asyncio.to_thread(panel_states.set, event.sender_id, "none")
+            result = event.builder.article(
+                title="Self Admin Panel",
+                description="Admin panel for owner only",
+                text="🍓 **Welcome to the NPVT(AUTOPOST) Admin Panel!**\n\nTap the buttons below to manage everything like a pro",
+                buttons=MAIN_MENU_BTN,
+            )
+            await event.answer([result], cache_time=0)
+
+    @bot.on(events.CallbackQuery)
+    async def callback_handler(event: events.CallbackQuery.Event):
+        sender = event.sender_id
+        if not is_owner(sender):
+            return
+
+        data = event.data.decode() if event.data else ""
+        user = await asyncio.to_thread(panel_states.get, sender)
+        await router.dispatch_callback(event, data, sender, user)
 
     return bot, (await bot.get_me()).username
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+import zipfile
+from dataclasses import asdict, dataclass, field
+
+
+@dataclass(frozen=True)
+class BundleMember:
+    source_chat_id: int
+    destination_chat_id: int
+    message_id: int
+    file_id: str | None
+    file_hash: str
+    file_name: str
+    index: int
+
+
+@dataclass
+class OpenBundle:
+    destination_chat_id: int
+    opened_at: float
+    size: int = 0
+    members: list[BundleMember] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class SealedBundle:
+    destination_chat_id: int
+    path: str
+    manifest_path: str
+    members: tuple[BundleMember, ...]
+
+
+class BundleStore:
+    """On-disk zip archives collecting one destination's files until they are sealed and posted.
+
+    Each open bundle is ``<destination>.zip`` plus a ``<destination>.json``
+    manifest, both rewritten after every member so a crash loses at most the
+    member being written. Sealing renames the pair to ``*.sealed.*`` so new
+    files start a fresh bundle while the sealed one is uploaded; sealed pairs
+    left over from a previous run are picked up again by :meth:`sealed`.
+    All methods do blocking file I/O and are meant to run in a worker thread.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def open_bundles(self) -> dict[int, OpenBundle]:
+        bundles: dict[int, OpenBundle] = {}
+        for entry in os.listdir(self.directory):
+            if not entry.endswith(".json") or ".sealed" in entry:
+                continue
+            manifest = self._read_manifest(os.path.join(self.directory, entry))
+            if manifest is None:
+                continue
+            bundle = OpenBundle(
+                destination_chat_id=int(manifest["destination_chat_id"]),
+                opened_at=float(manifest["opened_at"]),
+                members=[BundleMember(**member) for member in manifest["members"]],
+            )
+            zip_path = self._zip_path(bundle.destination_chat_id)
+            bundle.size = os.path.getsize(zip_path) if os.path.exists(zip_path) else 0
+            bundles[bundle.destination_chat_id] = bundle
+        return bundles
+
+    def append(self, bundle: OpenBundle, member: BundleMember, data: bytes) -> int:
+        """Stream one file into the destination's archive and return the archive size."""
+        zip_path = self._zip_path(bundle.destination_chat_id)
+        with zipfile.ZipFile(zip_path, "a", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+            archive.writestr(member.file_name, data)
+        bundle.members.append(member)
+        bundle.size = os.path.getsize(zip_path)
+        self._write_manifest(self._manifest_path(bundle.destination_chat_id), bundle)
+        return bundle.size
+
+    def seal(self, bundle: OpenBundle) -> SealedBundle | None:
+        zip_path = self._zip_path(bundle.destination_chat_id)
+        manifest_path = self._manifest_path(bundle.destination_chat_id)
+        if not bundle.members or not os.path.exists(zip_path):
+            return None
+
+        stamp = f"{int(time.time() * 1000)}"
+        sealed_zip = os.path.join(self.directory, f"{bundle.destination_chat_id}-{stamp}.sealed.zip")
+        sealed_manifest = os.path.join(self.directory, f"{bundle.destination_chat_id}-{stamp}.sealed.json")
+        os.replace(manifest_path, sealed_manifest)
+        os.replace(zip_path, sealed_zip)
+        return SealedBundle(bundle.destination_chat_id, sealed_zip, sealed_manifest, tuple(bundle.members))
+
+    def sealed(self) -> list[SealedBundle]:
+        bundles: list[SealedBundle] = []
+        for entry in sorted(os.listdir(self.directory)):
+            if not entry.endswith(".sealed.json"):
+                continue
+            manifest_path = os.path.join(self.directory, entry)
+            zip_path = manifest_path[: -len(".json")] + ".zip"
+            manifest = self._read_manifest(manifest_path)
+            if manifest is None or not os.path.exists(zip_path):
+                continue
+            bundles.append(
+                SealedBundle(
+                    destination_chat_id=int(manifest["destination_chat_id"]),
+                    path=zip_path,
+                    manifest_path=manifest_path,
+                    members=tuple(BundleMember(**member) for member in manifest["members"]),
+                )
+            )
+        return bundles
+
+    def discard(self, bundle: SealedBundle) -> None:
+        for path in (bundle.path, bundle.manifest_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _zip_path(self, destination_chat_id: int) -> str:
+        return os.path.join(self.directory, f"{destination_chat_id}.zip")
+
+    def _manifest_path(self, destination_chat_id: int) -> str:
+        return os.path.join(self.directory, f"{destination_chat_id}.json")
+
+    @staticmethod
+    def _write_manifest(path: str, bundle: OpenBundle) -> None:
+        payload = {
+            "destination_chat_id": bundle.destination_chat_id,
+            "opened_at": bundle.opened_at,
+            "members": [asdict(member) for member in bundle.members],
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file_obj:
+            json.dump(payload, file_obj, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read_manifest(path: str) -> dict | None:
+        try:
+            with open(path, "r", encoding="utf-8") as file_obj:
+                manifest = json.load(file_obj)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(manifest, dict) or "destination_chat_id" not in manifest:
+            return None
+        return manifest
@@ -16,6 +16,11 @@ CHANNEL_MANAGEMENT = [
         Button.inline('➖ Delete Channel', b'channel_management_del'),
         Button.inline('➕ Add Channel', b'channel_management_add'),
     ],
+    [
+        Button.inline('📥 Bulk Import', b'channel_management_import'),
+        Button.inline('📤 Bulk Export', b'channel_export:csv'),
+    ],
+    [Button.inline('🎛 Delivery Mode', b'channel_management_mode')],
     [Button.inline('📚 User Guide', b'channel_management_help')],
     [Button.inline('🔙 Back to Menu', b'main_menu')]
 ]
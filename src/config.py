@@ -43,3 +43,18 @@ SESSIONS_DIR = "sessions"
 os.makedirs(SESSIONS_DIR, exist_ok=True)
 USER_SESSION = os.path.join(SESSIONS_DIR, "userbot.session")
 BOT_SESSION = os.path.join(SESSIONS_DIR, "bot_helper.session")
+RELAY_SNAPSHOT_PATH = os.path.join(SESSIONS_DIR, "relay_state.snap")
+RELAY_BUNDLES_DIR = os.path.join(SESSIONS_DIR, "bundles")
+RELAY_ARCHIVE_DIR = os.path.join(SESSIONS_DIR, "archive")
+LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", "100"))
+# Run the relay's downloads, uploads and sends on a second connection so they never queue behind updates.
+RELAY_MEDIA_CLIENT = os.getenv("RELAY_MEDIA_CLIENT", "0").strip().lower() in {"1", "true", "yes", "on"}
+RELAY_MEDIA_CONCURRENCY = max(1, int(os.getenv("RELAY_MEDIA_CONCURRENCY", "2")))
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_FILE = os.getenv("LOG_FILE", os.path.join("logs", "npvt.log"))
+LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_FILE_BACKUPS = int(os.getenv("LOG_FILE_BACKUPS", "5"))
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_SAMPLE = os.getenv("LOG_SAMPLE", "")
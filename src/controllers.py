@@ -1,11 +1,33 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Optional
+import hashlib
+import math
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, Sequence
 
 from src.orm import SimpleORM
 
 
+DELIVERY_SINGLE = "single"
+DELIVERY_ALBUM = "album"
+DELIVERY_BUNDLE = "bundle"
+DELIVERY_MODES = (DELIVERY_SINGLE, DELIVERY_ALBUM, DELIVERY_BUNDLE)
+
+DEDUP_SCOPE_GLOBAL = "global"
+DEDUP_SCOPE_SOURCE = "source"
+DEDUP_SCOPE_DESTINATION = "destination"
+DEDUP_SCOPES = (DEDUP_SCOPE_GLOBAL, DEDUP_SCOPE_SOURCE, DEDUP_SCOPE_DESTINATION)
+
+DEDUP_KIND_FILE_ID = 1
+DEDUP_KIND_HASH = 2
+DEDUP_EXPIRE_BATCH = 5000
+
+# Relay latency stages, in pipeline order; each is stored as ``configs.latency_<stage>_ms``.
+LATENCY_STAGES = ("ingress", "queue", "download", "upload", "send", "log", "total")
+LATENCY_WINDOWS = (timedelta(hours=1), timedelta(hours=24))
+LATENCY_PERCENTILES = (50, 95, 99)
+
+
 class ChannelManager:
     def __init__(self, orm: SimpleORM):
         self.orm = orm
@@ -21,9 +43,55 @@ class ChannelManager:
             },
         )
 
+    def add_channels(self, mappings: list[tuple[int, int, str]]) -> list[tuple[int, int, str]]:
+        """Insert ``(source, destination, delivery_mode)`` mappings whose source is not mapped yet.
+
+        The existence check and the insert share one transaction; returns the
+        mappings that were actually inserted.
+        """
+        created_at = datetime.now().isoformat()
+        with self.orm.transaction() as tx:
+            existing = {
+                int(row["source_channel_id"])
+                for row in tx.find_many_by(
+                    self.table,
+                    "source_channel_id",
+                    [int(source_id) for source_id, _, _ in mappings],
+                    columns=["source_channel_id"],
+                )
+            }
+            fresh = [mapping for mapping in mappings if int(mapping[0]) not in existing]
+            tx.insert_many(
+                self.table,
+                [
+                    {
+                        "source_channel_id": int(source_id),
+                        "destination_channel_id": int(dest_id),
+                        "delivery_mode": mode,
+                        "created_at": created_at,
+                    }
+                    for source_id, dest_id, mode in fresh
+                ],
+            )
+        return fresh
+
     def get_all_channels(self) -> list[dict]:
         return self.orm.all(self.table)
 
+    def iter_mappings(self) -> Iterator[tuple[int, int, int, str | None]]:
+        """Stream ``(id, source, destination, delivery_mode)`` tuples without loading the table."""
+        return self.orm.iter_rows(
+            self.table,
+            columns=["id", "source_channel_id", "destination_channel_id", "delivery_mode"],
+            as_tuples=True,
+        )
+
+    def channels_after(self, after_id: int | None, limit: int) -> list[dict]:
+        return self.orm.page_after(self.table, after_id, limit)
+
+    def channels_before(self, before_id: int, limit: int) -> list[dict]:
+        return self.orm.page_before(self.table, before_id, limit)
+
     def count_channels(self) -> int:
         return self.orm.count(self.table)
 
@@ -44,6 +112,15 @@ class ChannelManager:
     def get_by_source(self, source_id: int) -> dict | None:
         return self.orm.find_one_by(self.table, {"source_channel_id": int(source_id)})
 
+    def set_delivery_mode(self, source_id: int, mode: str) -> bool:
+        if mode not in DELIVERY_MODES:
+            raise ValueError(f"Unknown delivery mode: {mode}")
+        row = self.get_by_source(source_id)
+        if row is None:
+            return False
+        self.orm.update_by_id(self.table, int(row["id"]), {"delivery_mode": mode})
+        return True
+
 
 class ConfigManager:
     def __init__(self, orm: SimpleORM):
@@ -51,64 +128,65 @@ class ConfigManager:
         self.table = "configs"
 
     def next_npvt_index(self) -> int:
-        return self.orm.count(self.table) + 1
+        # Archived rows keep their numbers, so they still count towards the next one.
+        return self.orm.count(self.table) + ArchiveManager(self.orm).archived_rows() + 1
 
     def log_transfer(
         self,
         *,
-        file_id: str,
-        file_hash: str,
+        file_id: str | None,
+        file_hash: str | None,
         name: str,
-        from_chat: str,
-        to_chat: str,
-        from_message_id: str,
-        to_message_id: str,
+        from_chat: int,
+        to_chat: int,
+        from_message_id: int,
+        to_message_id: int,
+        latency: dict[str, int | None] | None = None,
     ) -> int:
-        payload = {
-            "file_id": file_id,
-            "file_hash": file_hash,
+        """Record the transfer and refresh its dedup entries in one transaction.
+
+        ``latency`` maps stage names from :data:`LATENCY_STAGES` to milliseconds.
+        """
+        now = datetime.now()
+        values = {
+            "file_id": file_id or None,
+            "file_hash": self._hash_bytes(file_hash),
             "name": name,
-            "from_chat": from_chat,
-            "to_chat": to_chat,
-            "from_messsage_id": from_message_id,
-            "to_messsage_id": to_message_id,
-            "date": datetime.now().isoformat(),
+            "from_chat": int(from_chat),
+            "to_chat": int(to_chat),
+            "from_messsage_id": int(from_message_id),
+            "to_messsage_id": int(to_message_id),
+            "date": now,
         }
-        try:
-            return self.orm.insert(self.table, payload)
-        except Exception:
-            # Backward-compatible fallback if DB schema has not yet added file_hash.
-            payload.pop("file_hash", None)
-            return self.orm.insert(self.table, payload)
-
-    def exists_file_id(self, file_id: str) -> bool:
-        if not file_id or file_id == "not_set":
+        for stage, ms in (latency or {}).items():
+            values[f"latency_{stage}_ms"] = ms
+        with self.orm.transaction() as tx:
+            new_id = tx.insert(self.table, values)
+            DedupManager(tx).remember(file_id, file_hash, from_chat, to_chat, now)
+        return new_id
+
+    def exists_file_id(self, file_id: str | None) -> bool:
+        if not file_id:
             return False
-        return self.orm.find_one_by(self.table, {"file_id": file_id}) is not None
+        return self.orm.exists(self.table, {"file_id": file_id})
 
-    def exists_file_hash(self, file_hash: str) -> bool:
-        if not file_hash or file_hash == "not_set":
-            return False
-        try:
-            return self.orm.find_one_by(self.table, {"file_hash": file_hash}) is not None
-        except Exception:
+    def exists_file_hash(self, file_hash: str | None) -> bool:
+        hash_bytes = self._hash_bytes(file_hash)
+        if hash_bytes is None:
             return False
+        return self.orm.exists(self.table, {"file_hash": hash_bytes})
 
     def get_stats(self) -> dict[str, str | int]:
         total_transfers = self.orm.count(self.table)
-        unique_source_chats = self.orm.count_distinct(self.table, "from_chat", ignore_value="not_set")
-        unique_destination_chats = self.orm.count_distinct(self.table, "to_chat", ignore_value="not_set")
-        unique_file_ids = self.orm.count_distinct(self.table, "file_id", ignore_value="not_set")
-
-        try:
-            unique_file_hashes = self.orm.count_distinct(self.table, "file_hash", ignore_value="not_set")
-        except Exception:
-            unique_file_hashes = 0
+        unique_source_chats = self.orm.count_distinct(self.table, "from_chat")
+        unique_destination_chats = self.orm.count_distinct(self.table, "to_chat")
+        unique_file_ids = self.orm.count_distinct(self.table, "file_id")
+        unique_file_hashes = self.orm.count_distinct(self.table, "file_hash")
 
         latest_row = self.orm.latest(self.table, order_by="id")
         latest_transfer_date = "not_set"
-        if latest_row is not None:
-            latest_transfer_date = str(latest_row.get("date", "not_set"))
+        if latest_row is not None and latest_row.get("date") is not None:
+            latest_transfer_date = latest_row["date"].isoformat(sep=" ", timespec="seconds")
 
         return {
             "total_transfers": total_transfers,
@@ -119,75 +197,336 @@ class ConfigManager:
             "latest_transfer_date": latest_transfer_date,
         }
 
+    def latency_percentiles(self, windows: Sequence[timedelta] = LATENCY_WINDOWS) -> dict[timedelta, dict]:
+        """Nearest-rank percentiles of each latency stage over the most recent ``windows``.
+
+        Returns ``{window: {"transfers": n, stage: {50: ms, 95: ms, 99: ms}}}``;
+        a stage with no samples in the window maps to ``None``. One streamed
+        pass over the ``date`` index covers every window.
+        """
+        now = datetime.now()
+        columns = ["date", *(f"latency_{stage}_ms" for stage in LATENCY_STAGES)]
+        samples = {window: [[] for _ in LATENCY_STAGES] for window in windows}
+        transfers = dict.fromkeys(windows, 0)
+        for row in self.orm.iter_since(self.table, "date", now - max(windows), columns, as_tuples=True):
+            if row[-1] is None:
+                continue
+            age = now - row[0]
+            for window in windows:
+                if age > window:
+                    continue
+                transfers[window] += 1
+                for values, ms in zip(samples[window], row[1:]):
+                    if ms is not None:
+                        values.append(int(ms))
+
+        summary: dict[timedelta, dict] = {}
+        for window in windows:
+            summary[window] = {"transfers": transfers[window]}
+            for stage, values in zip(LATENCY_STAGES, samples[window]):
+                values.sort()
+                summary[window][stage] = {
+                    percentile: values[max(0, math.ceil(percentile / 100 * len(values)) - 1)]
+                    for percentile in LATENCY_PERCENTILES
+                } if values else None
+        return summary
+
+    @staticmethod
+    def _hash_bytes(file_hash: str | None) -> bytes | None:
+        """Convert a hex SHA-256 digest to the 32 raw bytes stored in ``configs.file_hash``."""
+        if not file_hash:
+            return None
+        try:
+            value = bytes.fromhex(file_hash)
+        except ValueError:
+            return None
+        return value if len(value) == 32 else None
+
     def reset_all_transfers(self) -> int:
-        total_before = self.orm.count(self.table)
-        self.orm.truncate_table(self.table)
+        # One connection for all steps; TRUNCATE commits on its own, so the count is read just before it.
+        with self.orm.transaction() as tx:
+            total_before = tx.count(self.table)
+            tx.truncate_table(self.table)
+            tx.truncate_table(DedupManager.table)
+            tx.truncate_table(ArchiveManager.table)
         return total_before
 
 
+class ArchiveManager:
+    """Bookkeeping for retention runs: one ``configs_archive_runs`` row per run that moved rows out."""
+
+    table = "configs_archive_runs"
+    _totals = ("rows_archived", "raw_bytes", "file_bytes")
+
+    def __init__(self, orm: SimpleORM):
+        self.orm = orm
+
+    def record_run(
+        self,
+        cutoff: datetime,
+        rows: int,
+        raw_bytes: int,
+        file_bytes: int,
+        path: str,
+        run_id: int | None = None,
+    ) -> int:
+        """Insert a run row, or with ``run_id`` overwrite that run's running totals; returns the run id."""
+        values = {
+            "archived_at": datetime.now(),
+            "cutoff": cutoff,
+            "rows_archived": int(rows),
+            "raw_bytes": int(raw_bytes),
+            "file_bytes": int(file_bytes),
+            "path": path,
+        }
+        if run_id is None:
+            return self.orm.insert(self.table, values)
+        self.orm.upsert(self.table, {"id": int(run_id), **values}, update=("archived_at", *self._totals))
+        return int(run_id)
+
+    def archived_rows(self) -> int:
+        return self.orm.sums(self.table, ["rows_archived"])["rows_archived"]
+
+    def get_stats(self) -> dict:
+        totals = self.orm.sums(self.table, self._totals)
+        last_run = self.orm.latest(self.table, order_by="id")
+        return {
+            **totals,
+            "runs": self.orm.count(self.table),
+            "last_run_at": last_run["archived_at"].isoformat(sep=" ", timespec="seconds") if last_run else "never",
+        }
+
+
+class DedupManager:
+    """Compact ``relay_dedup`` table: one row per (key, source, destination) with when it was last relayed.
+
+    Keys are 32-byte digests: the content SHA-256 for file hashes and
+    ``sha256("file_id:" + file_id)`` for Telegram file IDs. Lookups read
+    every row for a key and let the caller apply the scope and window, so
+    changing either setting takes effect without rewriting the table.
+    """
+
+    table = "relay_dedup"
+
+    def __init__(self, orm: SimpleORM):
+        self.orm = orm
+
+    @staticmethod
+    def file_id_digest(file_id: str) -> bytes:
+        return hashlib.sha256(b"file_id:" + str(file_id).encode("utf-8")).digest()
+
+    def remember(
+        self,
+        file_id: str | None,
+        file_hash: str | None,
+        source_chat: int,
+        destination_chat: int,
+        seen_at: datetime,
+    ) -> None:
+        keys = []
+        if file_id:
+            keys.append((DEDUP_KIND_FILE_ID, self.file_id_digest(file_id)))
+        hash_bytes = ConfigManager._hash_bytes(file_hash)
+        if hash_bytes is not None:
+            keys.append((DEDUP_KIND_HASH, hash_bytes))
+        for kind, digest in keys:
+            self.orm.upsert(
+                self.table,
+                {
+                    "key_kind": kind,
+                    "key_hash": digest,
+                    "source_chat": int(source_chat),
+                    "destination_chat": int(destination_chat),
+                    "seen_at": seen_at,
+                },
+                update=["seen_at"],
+            )
+
+    def matches(self, digests: list[bytes], since: datetime | None) -> list[tuple[bytes, int, int, datetime]]:
+        """``(digest, source, destination, seen_at)`` for every entry of ``digests`` seen since ``since``."""
+        rows = self.orm.find_many_by(
+            self.table,
+            "key_hash",
+            digests,
+            columns=["key_hash", "source_chat", "destination_chat", "seen_at"],
+            since=("seen_at", since) if since is not None else None,
+        )
+        return [
+            (bytes(row["key_hash"]), int(row["source_chat"]), int(row["destination_chat"]), row["seen_at"])
+            for row in rows
+        ]
+
+    def recent(self, limit: int, since: datetime | None) -> list[tuple[int, bytes, int, int, datetime]]:
+        """The ``limit`` most recently seen entries as ``(kind, digest, source, destination, seen_at)``.
+
+        Ordered by ``seen_at`` (indexed), not ``id``: ``remember`` bumps
+        ``seen_at`` on existing rows, so often re-posted keys stay warm.
+        """
+        columns = ["key_kind", "key_hash", "source_chat", "destination_chat", "seen_at"]
+        if since is None:
+            rows = self.orm.iter_rows(
+                self.table, columns=columns, order_by="seen_at", descending=True, limit=limit, as_tuples=True
+            )
+        else:
+            rows = self.orm.iter_since(
+                self.table, "seen_at", since, columns=columns, descending=True, limit=limit, as_tuples=True
+            )
+        return [
+            (int(kind), bytes(digest), int(source), int(destination), seen_at)
+            for kind, digest, source, destination, seen_at in rows
+        ]
+
+    def expire(self, before: datetime, batch_size: int = DEDUP_EXPIRE_BATCH) -> int:
+        """Delete entries last seen before ``before`` in short batches; return how many were removed."""
+        removed = 0
+        while True:
+            deleted = self.orm.delete_before(self.table, "seen_at", before, batch_size)
+            removed += deleted
+            if deleted < batch_size:
+                return removed
+
+    def count(self) -> int:
+        return self.orm.count(self.table)
+
+
 class RelaySettingsManager:
     DEFAULT_CAPTION = "#npvt best"
     DEFAULT_SEND_INTERVAL_SECONDS = 6.0
+    DEFAULT_SEND_INTERVAL_MIN_SECONDS = 1.0
+    DEFAULT_SEND_INTERVAL_MAX_SECONDS = 120.0
     DEFAULT_SOURCE_CACHE_SECONDS = 20
     DEFAULT_FILENAME_PREFIX = "npvt"
     DEFAULT_RELAY_ENABLED = True
     DEFAULT_DEDUP_ENABLED = True
+    DEFAULT_ALBUM_WINDOW_SECONDS = 5.0
+    DEFAULT_BUNDLE_INTERVAL_SECONDS = 600.0
+    DEFAULT_BUNDLE_MAX_BYTES = 20 * 1024 * 1024
+    DEFAULT_DEDUP_WINDOW_DAYS = 0.0
+    DEFAULT_DEDUP_SCOPE = DEDUP_SCOPE_GLOBAL
+    DEFAULT_RETENTION_DAYS = 0
+    DEFAULT_PARALLEL_TRANSFERS = False
+    DEFAULT_TRANSFER_WORKERS = 4
 
     def __init__(self, orm: SimpleORM):
         self.orm = orm
         self.table = "relay_settings"
 
-    def _get_raw(self, key: str) -> str | None:
-        row = self.orm.find_one_by(self.table, {"setting_key": key})
-        if row is None:
-            return None
-        return str(row.get("setting_value", "")).strip()
+    def _get_all_raw(self) -> dict[str, str]:
+        rows = self.orm.all(self.table, order_by=None, columns=["setting_key", "setting_value"])
+        return {str(row["setting_key"]): str(row.get("setting_value") or "").strip() for row in rows}
 
     def _set_raw(self, key: str, value: str) -> None:
-        row = self.orm.find_one_by(self.table, {"setting_key": key})
-        payload = {
-            "setting_key": key,
-            "setting_value": value,
-            "updated_at": datetime.now().isoformat(),
-        }
-        if row is None:
-            self.orm.insert(self.table, payload)
-            return
-        self.orm.update_by_id(self.table, int(row["id"]), payload)
+        self.orm.upsert(
+            self.table,
+            {
+                "setting_key": key,
+                "setting_value": value,
+                "updated_at": datetime.now().isoformat(),
+            },
+            update=["setting_value", "updated_at"],
+        )
 
     def get_runtime_settings(self) -> dict[str, str | float | int]:
-        caption = self._get_raw("caption") or self.DEFAULT_CAPTION
-        prefix = self.normalize_filename_prefix(self._get_raw("filename_prefix") or self.DEFAULT_FILENAME_PREFIX)
+        raw = self._get_all_raw()
+        caption = raw.get("caption") or self.DEFAULT_CAPTION
+        prefix = self.normalize_filename_prefix(raw.get("filename_prefix") or self.DEFAULT_FILENAME_PREFIX)
 
         try:
-            send_interval = float(self._get_raw("send_interval_seconds") or self.DEFAULT_SEND_INTERVAL_SECONDS)
+            send_interval = float(raw.get("send_interval_seconds") or self.DEFAULT_SEND_INTERVAL_SECONDS)
         except ValueError:
             send_interval = self.DEFAULT_SEND_INTERVAL_SECONDS
         send_interval = max(1.0, send_interval)
 
         try:
-            source_cache = int(self._get_raw("source_cache_seconds") or self.DEFAULT_SOURCE_CACHE_SECONDS)
+            interval_min = float(raw.get("send_interval_min_seconds") or self.DEFAULT_SEND_INTERVAL_MIN_SECONDS)
+        except ValueError:
+            interval_min = self.DEFAULT_SEND_INTERVAL_MIN_SECONDS
+        interval_min = max(1.0, interval_min)
+
+        try:
+            interval_max = float(raw.get("send_interval_max_seconds") or self.DEFAULT_SEND_INTERVAL_MAX_SECONDS)
+        except ValueError:
+            interval_max = self.DEFAULT_SEND_INTERVAL_MAX_SECONDS
+        interval_max = max(interval_min, interval_max)
+
+        try:
+            source_cache = int(raw.get("source_cache_seconds") or self.DEFAULT_SOURCE_CACHE_SECONDS)
         except ValueError:
             source_cache = self.DEFAULT_SOURCE_CACHE_SECONDS
         source_cache = max(5, source_cache)
 
-        relay_enabled_raw = (self._get_raw("relay_enabled") or "").lower()
+        try:
+            album_window = float(raw.get("album_window_seconds") or self.DEFAULT_ALBUM_WINDOW_SECONDS)
+        except ValueError:
+            album_window = self.DEFAULT_ALBUM_WINDOW_SECONDS
+        album_window = min(60.0, max(0.5, album_window))
+
+        try:
+            bundle_interval = float(raw.get("bundle_interval_seconds") or self.DEFAULT_BUNDLE_INTERVAL_SECONDS)
+        except ValueError:
+            bundle_interval = self.DEFAULT_BUNDLE_INTERVAL_SECONDS
+        bundle_interval = min(86400.0, max(60.0, bundle_interval))
+
+        try:
+            bundle_max_bytes = int(raw.get("bundle_max_bytes") or self.DEFAULT_BUNDLE_MAX_BYTES)
+        except ValueError:
+            bundle_max_bytes = self.DEFAULT_BUNDLE_MAX_BYTES
+        bundle_max_bytes = min(2000 * 1024 * 1024, max(1024 * 1024, bundle_max_bytes))
+
+        try:
+            dedup_window_days = float(raw.get("dedup_window_days") or self.DEFAULT_DEDUP_WINDOW_DAYS)
+        except ValueError:
+            dedup_window_days = self.DEFAULT_DEDUP_WINDOW_DAYS
+        dedup_window_days = min(3650.0, max(0.0, dedup_window_days))
+
+        dedup_scope = (raw.get("dedup_scope") or "").lower()
+        if dedup_scope not in DEDUP_SCOPES:
+            dedup_scope = self.DEFAULT_DEDUP_SCOPE
+
+        try:
+            retention_days = int(raw.get("retention_days") or self.DEFAULT_RETENTION_DAYS)
+        except ValueError:
+            retention_days = self.DEFAULT_RETENTION_DAYS
+        retention_days = min(3650, max(0, retention_days))
+
+        relay_enabled_raw = (raw.get("relay_enabled") or "").lower()
         relay_enabled = relay_enabled_raw in {"1", "true", "on", "yes", "enabled"}
         if relay_enabled_raw == "":
             relay_enabled = self.DEFAULT_RELAY_ENABLED
 
-        dedup_enabled_raw = (self._get_raw("dedup_enabled") or "").lower()
+        dedup_enabled_raw = (raw.get("dedup_enabled") or "").lower()
         dedup_enabled = dedup_enabled_raw in {"1", "true", "on", "yes", "enabled"}
         if dedup_enabled_raw == "":
             dedup_enabled = self.DEFAULT_DEDUP_ENABLED
 
+        parallel_raw = (raw.get("parallel_transfers") or "").lower()
+        parallel_transfers = parallel_raw in {"1", "true", "on", "yes", "enabled"}
+        if parallel_raw == "":
+            parallel_transfers = self.DEFAULT_PARALLEL_TRANSFERS
+
+        try:
+            transfer_workers = int(raw.get("transfer_workers") or self.DEFAULT_TRANSFER_WORKERS)
+        except ValueError:
+            transfer_workers = self.DEFAULT_TRANSFER_WORKERS
+        transfer_workers = min(8, max(1, transfer_workers))
+
         return {
             "caption": caption,
             "filename_prefix": prefix,
             "send_interval_seconds": send_interval,
+            "send_interval_min_seconds": interval_min,
+            "send_interval_max_seconds": interval_max,
             "source_cache_seconds": source_cache,
+            "album_window_seconds": album_window,
+            "bundle_interval_seconds": bundle_interval,
+            "bundle_max_bytes": bundle_max_bytes,
             "relay_enabled": relay_enabled,
             "dedup_enabled": dedup_enabled,
+            "dedup_window_days": dedup_window_days,
+            "dedup_scope": dedup_scope,
+            "retention_days": retention_days,
+            "parallel_transfers": parallel_transfers,
+            "transfer_workers": transfer_workers,
         }
 
     def set_caption(self, caption: str) -> None:
@@ -202,10 +541,36 @@ class RelaySettingsManager:
         value = max(1.0, float(seconds))
         self._set_raw("send_interval_seconds", str(value))
 
+    def set_send_interval_bounds(self, min_seconds: float, max_seconds: float) -> None:
+        low = max(1.0, float(min_seconds))
+        high = max(low, float(max_seconds))
+        self._set_raw("send_interval_min_seconds", str(low))
+        self._set_raw("send_interval_max_seconds", str(high))
+
     def set_source_cache_seconds(self, seconds: int) -> None:
         value = max(5, int(seconds))
         self._set_raw("source_cache_seconds", str(value))
 
+    def set_album_window_seconds(self, seconds: float) -> None:
+        value = min(60.0, max(0.5, float(seconds)))
+        self._set_raw("album_window_seconds", str(value))
+
+    def set_bundle_thresholds(self, interval_seconds: float, max_bytes: int) -> None:
+        interval = min(86400.0, max(60.0, float(interval_seconds)))
+        size = min(2000 * 1024 * 1024, max(1024 * 1024, int(max_bytes)))
+        self._set_raw("bundle_interval_seconds", str(interval))
+        self._set_raw("bundle_max_bytes", str(size))
+
+    def set_dedup_policy(self, window_days: float, scope: str) -> None:
+        if scope not in DEDUP_SCOPES:
+            raise ValueError(f"unknown dedup scope {scope}")
+        days = min(3650.0, max(0.0, float(window_days)))
+        self._set_raw("dedup_window_days", str(days))
+        self._set_raw("dedup_scope", scope)
+
+    def set_retention_days(self, days: int) -> None:
+        self._set_raw("retention_days", str(min(3650, max(0, int(days)))))
+
     def set_filename_prefix(self, prefix: str) -> None:
         value = self.normalize_filename_prefix(prefix)
         self._set_raw("filename_prefix", value)
@@ -216,6 +581,11 @@ class RelaySettingsManager:
     def set_dedup_enabled(self, enabled: bool) -> None:
         self._set_raw("dedup_enabled", "1" if enabled else "0")
 
+    def set_parallel_transfers(self, enabled: bool, workers: int | None = None) -> None:
+        self._set_raw("parallel_transfers", "1" if enabled else "0")
+        if workers is not None:
+            self._set_raw("transfer_workers", str(min(8, max(1, int(workers)))))
+
     @classmethod
     def normalize_filename_prefix(cls, prefix: str | None) -> str:
         value = (prefix or "").replace("\r\n", " ").replace("\r", " ").replace("\n", " ").replace("\t", " ").strip()
@@ -227,6 +597,30 @@ class RelaySettingsManager:
         return value[:80]
 
 
+class RateStateManager:
+    def __init__(self, orm: SimpleORM):
+        self.orm = orm
+        self.table = "relay_rate_state"
+
+    def load_all(self) -> dict[str, tuple[float, int]]:
+        return {
+            str(row["rate_key"]): (float(row["interval_seconds"]), int(row["flood_waits"]))
+            for row in self.orm.all(self.table, columns=["rate_key", "interval_seconds", "flood_waits"])
+        }
+
+    def save(self, rate_key: str, interval_seconds: float, flood_waits: int) -> None:
+        self.orm.upsert(
+            self.table,
+            {
+                "rate_key": rate_key,
+                "interval_seconds": float(interval_seconds),
+                "flood_waits": int(flood_waits),
+                "updated_at": datetime.now(),
+            },
+            update=["interval_seconds", "flood_waits", "updated_at"],
+        )
+
+
 class UserManager:
     def __init__(self, orm: SimpleORM):
         self.orm = orm
@@ -259,9 +653,9 @@ class UserManager:
         return self.orm.delete_by_id("users", user_id)
 
     def ensure_user(self, user_id: int, step: str) -> dict:
-        user = self.get_user(user_id)
-        if not user:
-            new_id = self.orm.insert(
+        # Insert-if-missing and read back on one connection; a concurrent first message can't hit a duplicate key.
+        with self.orm.transaction() as tx:
+            tx.upsert(
                 "users",
                 {
                     "id": user_id,
@@ -269,6 +663,6 @@ class UserManager:
                     "step": step,
                     "data": None,
                 },
+                update=(),
             )
-            user = self.get_user(new_id)
-        return user
+            return tx.find_by_id("users", user_id)
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, TypeVar
+
+
+T = TypeVar("T")
+
+CPU_WORKERS = max(2, min(4, os.cpu_count() or 1))
+HASH_CHUNK_SIZE = 1024 * 1024
+LOOP_LAG_CHECK_SECONDS = 0.5
+LOOP_LAG_REPORT_SECONDS = 600.0
+
+# hashlib and zlib release the GIL on large buffers, so a small thread pool is
+# enough to keep this work off the event loop without process start-up costs.
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="npvt-cpu")
+
+
+@dataclass
+class StageTiming:
+    calls: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+class StageTimings:
+    """Per-stage call count and wall time of the work sent to :data:`cpu_executor`."""
+
+    def __init__(self) -> None:
+        self._stages: dict[str, StageTiming] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            timing = self._stages.setdefault(stage, StageTiming())
+            timing.calls += 1
+            timing.total_seconds += seconds
+            timing.max_seconds = max(timing.max_seconds, seconds)
+
+    def snapshot(self) -> dict[str, StageTiming]:
+        with self._lock:
+            return {
+                stage: StageTiming(timing.calls, timing.total_seconds, timing.max_seconds)
+                for stage, timing in self._stages.items()
+            }
+
+    def summary(self) -> str:
+        parts = [
+            f"{stage}: n={timing.calls} avg={timing.total_seconds / timing.calls * 1000:.1f}ms "
+            f"max={timing.max_seconds * 1000:.1f}ms"
+            for stage, timing in sorted(self.snapshot().items())
+            if timing.calls
+        ]
+        return ", ".join(parts) or "none"
+
+
+stage_timings = StageTimings()
+
+
+async def run_cpu(stage: str, func: Callable[..., T], *args, **kwargs) -> T:
+    """Run CPU-bound ``func`` on the dedicated executor and record its duration under ``stage``."""
+    loop = asyncio.get_running_loop()
+
+    def timed() -> T:
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stage_timings.record(stage, time.perf_counter() - started)
+
+    return await loop.run_in_executor(cpu_executor, functools.partial(timed))
+
+
+def sha256_hex(data: bytes, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    digest = hashlib.sha256()
+    view = memoryview(data)
+    for offset in range(0, len(view), chunk_size):
+        digest.update(view[offset:offset + chunk_size])
+    return digest.hexdigest()
+
+
+class LoopLagMonitor:
+    """Watchdog thread that reports when the event loop stops answering for longer than a threshold.
+
+    Every ``interval`` seconds it schedules a no-op on the loop; if that does not
+    run within ``threshold_ms`` it captures the loop thread's stack, so the log
+    shows which code was blocking, then waits for the loop to catch up and logs
+    the total stall.
+    """
+
+    def __init__(
+        self,
+        log: logging.Logger,
+        threshold_ms: float,
+        interval: float = LOOP_LAG_CHECK_SECONDS,
+        report_seconds: float = LOOP_LAG_REPORT_SECONDS,
+    ) -> None:
+        self.log = log
+        self.threshold = max(0.001, float(threshold_ms) / 1000.0)
+        self.interval = interval
+        self.report_seconds = report_seconds
+        self.stalls = 0
+        self.max_lag_seconds = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        if self._thread is not None:
+            return
+        loop = loop or asyncio.get_running_loop()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(loop, threading.get_ident()),
+            name="npvt-loop-lag",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, loop: asyncio.AbstractEventLoop, loop_thread_id: int) -> None:
+        next_report = time.monotonic() + self.report_seconds
+        while not self._stop.wait(self.interval):
+            answered = threading.Event()
+            sent_at = time.perf_counter()
+            try:
+                loop.call_soon_threadsafe(answered.set)
+            except RuntimeError:
+                return
+
+            if not answered.wait(self.threshold):
+                stack = self._loop_stack(loop_thread_id)
+                while not answered.wait(1.0):
+                    if self._stop.is_set() or loop.is_closed():
+                        return
+                lag = time.perf_counter() - sent_at
+                self.stalls += 1
+                self.max_lag_seconds = max(self.max_lag_seconds, lag)
+                self.log.warning(
+                    "Event loop blocked for %.0f ms (threshold %.0f ms); loop was at:\n%s",
+                    lag * 1000,
+                    self.threshold * 1000,
+                    stack,
+                )
+
+            if time.monotonic() >= next_report:
+                next_report = time.monotonic() + self.report_seconds
+                self.log.info(
+                    "Event loop health: stalls=%s max_lag=%.0fms; CPU stages: %s",
+                    self.stalls,
+                    self.max_lag_seconds * 1000,
+                    stage_timings.summary(),
+                )
+
+    @staticmethod
+    def _loop_stack(loop_thread_id: int, limit: int = 8) -> str:
+        frame = sys._current_frames().get(loop_thread_id)
+        if frame is None:
+            return "  <unavailable>"
+        return "".join(traceback.format_stack(frame, limit=limit)).rstrip()
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from telethon import TelegramClient, utils
+from telethon.tl.types import Channel, InputPeerChannel, InputPeerChat, InputPeerUser, TypeInputPeer
+
+from src.cache import TTLCache
+
+
+ENTITY_CACHE_SIZE = 4096
+ENTITY_CACHE_TTL_SECONDS = 6 * 3600
+ENTITY_RESOLVE_CONCURRENCY = 8
+
+
+@dataclass(frozen=True)
+class CachedEntity:
+    input_peer: TypeInputPeer
+    title: str
+
+
+class EntityCache:
+    """Shared chat ID -> (InputPeer, title) cache so sends and panel renders skip resolve round trips."""
+
+    def __init__(
+        self,
+        maxsize: int = ENTITY_CACHE_SIZE,
+        ttl_seconds: float = ENTITY_CACHE_TTL_SECONDS,
+        concurrency: int = ENTITY_RESOLVE_CONCURRENCY,
+    ) -> None:
+        self._cache: TTLCache[int, CachedEntity] = TTLCache(maxsize, ttl_seconds)
+        self._inflight: dict[int, asyncio.Future] = {}
+        self._concurrency = max(1, int(concurrency))
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    async def get(self, client: TelegramClient, chat_id: int) -> CachedEntity | None:
+        chat_id = int(chat_id)
+        cached = self._cache.get(chat_id)
+        if cached is not None:
+            return cached
+
+        pending = self._inflight.get(chat_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[chat_id] = future
+        resolved: CachedEntity | None = None
+        try:
+            resolved = await self._resolve(client, chat_id)
+            if resolved is not None:
+                self._cache.set(chat_id, resolved)
+            return resolved
+        finally:
+            self._inflight.pop(chat_id, None)
+            future.set_result(resolved)
+
+    async def input_peer(self, client: TelegramClient, chat_id: int) -> TypeInputPeer | int:
+        """Return the cached input peer, or the bare ID so Telethon can still try on its own."""
+        cached = await self.get(client, chat_id)
+        return cached.input_peer if cached is not None else int(chat_id)
+
+    async def title(self, client: TelegramClient, chat_id: int) -> str:
+        cached = await self.get(client, chat_id)
+        return cached.title if cached is not None else str(chat_id)
+
+    async def titles(self, client: TelegramClient, chat_ids: Iterable[int]) -> dict[int, str]:
+        unique_ids = list(dict.fromkeys(int(chat_id) for chat_id in chat_ids))
+        values = await asyncio.gather(*(self.title(client, chat_id) for chat_id in unique_ids))
+        return dict(zip(unique_ids, values))
+
+    async def prefetch(self, client: TelegramClient, chat_ids: Iterable[int]) -> int:
+        """Resolve every ID not already cached; return how many are cached afterwards."""
+        unique_ids = list(dict.fromkeys(int(chat_id) for chat_id in chat_ids))
+        results = await asyncio.gather(*(self.get(client, chat_id) for chat_id in unique_ids))
+        return sum(1 for result in results if result is not None)
+
+    def invalidate(self, chat_id: int) -> None:
+        self._cache.pop(int(chat_id))
+
+    def export(self) -> list[list[Any]]:
+        rows: list[list[Any]] = []
+        for chat_id in self._cache:
+            cached = self._cache.get(chat_id)
+            if cached is None:
+                continue
+            peer = cached.input_peer
+            if isinstance(peer, InputPeerChannel):
+                rows.append([chat_id, "channel", peer.channel_id, peer.access_hash, cached.title])
+            elif isinstance(peer, InputPeerUser):
+                rows.append([chat_id, "user", peer.user_id, peer.access_hash, cached.title])
+            elif isinstance(peer, InputPeerChat):
+                rows.append([chat_id, "chat", peer.chat_id, 0, cached.title])
+        return rows
+
+    def restore(self, rows: list[list[Any]]) -> int:
+        restored = 0
+        for chat_id, kind, peer_id, access_hash, title in rows:
+            if kind == "channel":
+                peer = InputPeerChannel(int(peer_id), int(access_hash))
+            elif kind == "user":
+                peer = InputPeerUser(int(peer_id), int(access_hash))
+            elif kind == "chat":
+                peer = InputPeerChat(int(peer_id))
+            else:
+                continue
+            self._cache.set(int(chat_id), CachedEntity(peer, str(title)))
+            restored += 1
+        return restored
+
+    async def _resolve(self, client: TelegramClient, chat_id: int) -> CachedEntity | None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+
+        async with self._semaphore:
+            try:
+                entity = await client.get_entity(chat_id)
+            except Exception:
+                return None
+
+        try:
+            input_peer = utils.get_input_peer(entity)
+        except TypeError:
+            return None
+        return CachedEntity(input_peer=input_peer, title=_display_title(entity, chat_id))
+
+
+def channel_peer_id(entity: Any) -> int | None:
+    """The ``-100...`` peer ID of a resolved channel or supergroup, or ``None`` for anything else.
+
+    Users and basic groups have their own ID spaces; prefixing their IDs with
+    ``-100`` would name a channel that does not exist.
+    """
+    if not isinstance(entity, Channel):
+        return None
+    return utils.get_peer_id(entity)
+
+
+def _display_title(entity: Any, chat_id: int) -> str:
+    title = getattr(entity, "title", None)
+    if title:
+        return title
+
+    first_name = getattr(entity, "first_name", None)
+    last_name = getattr(entity, "last_name", None)
+    if first_name or last_name:
+        return " ".join(part for part in (first_name, last_name) if part)
+
+    return str(chat_id)
+
+
+entity_cache = EntityCache()
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime, timezone
+
+
+TEXT_FORMAT = "[%(asctime)s] %(levelname)s - %(message)s"
+
+# Attributes every LogRecord has; anything else was passed through ``extra=``.
+_RECORD_ATTRS = frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, then every ``extra`` field."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep one in N records per ``event`` name (set via ``extra={"event": ...}``); other records pass.
+
+    Counting instead of random draws keeps the output deterministic, and every
+    kept record carries ``sample_rate`` so totals can be scaled back up.
+    """
+
+    def __init__(self, rates: dict[str, int]) -> None:
+        super().__init__()
+        self.rates = {event: rate for event, rate in rates.items() if rate > 1}
+        self._counters = {event: itertools.count() for event in self.rates}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        rate = self.rates.get(event)
+        if rate is None or record.levelno > logging.INFO:
+            return True
+        if next(self._counters[event]) % rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Hand the raw record to the listener thread; message merging and formatting happen there."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def parse_levels(raw: str) -> dict[str, int]:
+    """``"userbot.relay=DEBUG,telethon=WARNING"`` -> {logger name: level}."""
+    levels: dict[str, int] = {}
+    for item in raw.split(","):
+        name, _, level = item.partition("=")
+        level_no = logging.getLevelName(level.strip().upper())
+        if name.strip() and isinstance(level_no, int):
+            levels[name.strip()] = level_no
+    return levels
+
+
+def parse_sample_rates(raw: str) -> dict[str, int]:
+    """``"queued=10,duplicate=5"`` -> {event: keep one in N}."""
+    rates: dict[str, int] = {}
+    for item in raw.split(","):
+        event, _, rate = item.partition("=")
+        if event.strip() and rate.strip().isdigit():
+            rates[event.strip()] = int(rate)
+    return rates
+
+
+def configure_logging(
+    level: str = "INFO",
+    console_format: str = "text",
+    log_file: str | None = None,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    component_levels: dict[str, int] | None = None,
+    sample_rates: dict[str, int] | None = None,
+) -> logging.handlers.QueueListener:
+    """Route every record through an in-memory queue to a background listener thread.
+
+    The calling thread only builds the record and enqueues it; console output
+    and the rotating JSON log file are written by the listener. The returned
+    listener is already started; stop it on shutdown to flush the queue.
+    """
+    console = logging.StreamHandler()
+    console.setFormatter(JsonFormatter() if console_format == "json" else logging.Formatter(TEXT_FORMAT))
+    handlers: list[logging.Handler] = [console]
+
+    if log_file:
+        directory = os.path.dirname(os.path.abspath(log_file))
+        os.makedirs(directory, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(parse_levels(f"root={level}").get("root", logging.INFO))
+    for name, component_level in (component_levels or {}).items():
+        logging.getLogger(name).setLevel(component_level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import re
+from dataclasses import dataclass, field
+
+from telethon import TelegramClient
+from telethon.errors import FloodWaitError
+
+from src.controllers import DELIVERY_MODES, DELIVERY_SINGLE, ChannelManager
+from src.entities import channel_peer_id
+
+
+IMPORT_MAX_BYTES = 2 * 1024 * 1024
+IMPORT_MAX_ROWS = 5000
+IMPORT_RESOLVE_CONCURRENCY = 4
+# Longest FloodWait an import sits out before giving up on that row.
+IMPORT_MAX_FLOOD_WAIT_SECONDS = 60
+
+_CHANNEL_ID = re.compile(r"^-100\d+$")
+_EXPORT_FIELD = re.compile(r"^(source_channel_id|destination_channel_id|delivery_mode):\s*(\S+)\s*$")
+
+
+@dataclass(frozen=True)
+class ImportRow:
+    line: int
+    source: str
+    destination: str
+    delivery_mode: str = ""
+
+
+@dataclass
+class ImportReport:
+    accepted: list[tuple[int, int, str]] = field(default_factory=list)
+    rejected: list[tuple[int, str, str]] = field(default_factory=list)
+
+    def reject(self, row: ImportRow, reason: str) -> None:
+        self.rejected.append((row.line, f"{row.source} {row.destination}".strip(), reason))
+
+    def rejected_csv(self) -> io.BytesIO:
+        buffer = io.BytesIO()
+        text = io.TextIOWrapper(buffer, encoding="utf-8", newline="")
+        writer = csv.writer(text)
+        writer.writerow(("line", "row", "reason"))
+        writer.writerows(sorted(self.rejected))
+        text.flush()
+        text.detach()
+        buffer.seek(0)
+        buffer.name = "rejected_mappings.csv"
+        return buffer
+
+
+def parse_mapping_file(data: bytes) -> list[ImportRow]:
+    """Read source/destination pairs from any of the accepted layouts.
+
+    * the panel's CSV export (header with ``source_channel_id`` and
+      ``destination_channel_id``, optional ``delivery_mode``);
+    * the panel's txt export (``source_channel_id: ...`` blocks);
+    * one ``source destination [mode]`` pair per line, separated by spaces
+      or commas, with ``#`` comments.
+    """
+    text = data.decode("utf-8-sig", errors="replace")
+    lines = text.splitlines()
+    first = next((line for line in lines if line.strip()), "")
+
+    if "source_channel_id" in first and "," in first:
+        return [
+            ImportRow(
+                line=line_no,
+                source=(record.get("source_channel_id") or "").strip(),
+                destination=(record.get("destination_channel_id") or "").strip(),
+                delivery_mode=(record.get("delivery_mode") or "").strip().lower(),
+            )
+            for line_no, record in enumerate(csv.DictReader(io.StringIO(text)), start=2)
+        ]
+
+    if any(line.startswith("source_channel_id:") for line in lines):
+        rows: list[ImportRow] = []
+        blocks: list[tuple[int, dict[str, str]]] = []
+        for line_no, line in enumerate(lines, start=1):
+            match = _EXPORT_FIELD.match(line.strip())
+            if not match:
+                continue
+            # A block runs from one source line to the next, so delivery_mode may follow the destination.
+            if match.group(1) == "source_channel_id":
+                blocks.append((line_no, {}))
+            if blocks:
+                blocks[-1][1][match.group(1)] = match.group(2)
+        for block_line, block in blocks:
+            if "destination_channel_id" in block:
+                rows.append(
+                    ImportRow(
+                        block_line,
+                        block["source_channel_id"],
+                        block["destination_channel_id"],
+                        block.get("delivery_mode", "").lower(),
+                    )
+                )
+        return rows
+
+    rows = []
+    for line_no, line in enumerate(lines, start=1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        parts = line.replace(",", " ").split()
+        rows.append(
+            ImportRow(
+                line=line_no,
+                source=parts[0],
+                destination=parts[1] if len(parts) > 1 else "",
+                delivery_mode=parts[2].lower() if len(parts) > 2 else "",
+            )
+        )
+    return rows
+
+
+class MappingImporter:
+    """Validate, resolve and insert a batch of channel mappings.
+
+    Usernames and links are resolved concurrently, at most
+    ``IMPORT_RESOLVE_CONCURRENCY`` at a time; numeric ``-100`` IDs are taken
+    as-is, like the add-channel dialogue does. Everything that survives
+    validation is inserted in one transaction.
+    """
+
+    def __init__(self, client: TelegramClient, channel_manager: ChannelManager) -> None:
+        self.client = client
+        self.channel_manager = channel_manager
+
+    async def run(self, data: bytes) -> ImportReport:
+        report = ImportReport()
+        rows = await asyncio.to_thread(parse_mapping_file, data)
+        for row in rows[IMPORT_MAX_ROWS:]:
+            report.reject(row, f"over the {IMPORT_MAX_ROWS} row limit")
+        rows = rows[:IMPORT_MAX_ROWS]
+
+        semaphore = asyncio.Semaphore(IMPORT_RESOLVE_CONCURRENCY)
+        sources = await asyncio.gather(*(self._resolve_source(row.source, semaphore) for row in rows))
+
+        candidates: list[tuple[ImportRow, tuple[int, int, str]]] = []
+        seen_sources: set[int] = set()
+        for row, source_id in zip(rows, sources):
+            if source_id is None:
+                report.reject(row, "source not resolvable to a channel or supergroup")
+            elif not _CHANNEL_ID.match(row.destination):
+                report.reject(row, "destination must be a numeric ID starting with -100")
+            elif row.delivery_mode and row.delivery_mode not in DELIVERY_MODES:
+                report.reject(row, f"unknown delivery mode {row.delivery_mode}")
+            elif source_id in seen_sources:
+                report.reject(row, "source repeated in file")
+            else:
+                seen_sources.add(source_id)
+                candidates.append((row, (source_id, int(row.destination), row.delivery_mode or DELIVERY_SINGLE)))
+
+        if candidates:
+            inserted = await asyncio.to_thread(self.channel_manager.add_channels, [mapping for _, mapping in candidates])
+            inserted_sources = {mapping[0] for mapping in inserted}
+            for row, mapping in candidates:
+                if mapping[0] in inserted_sources:
+                    report.accepted.append(mapping)
+                else:
+                    report.reject(row, "source already mapped")
+        return report
+
+    async def _resolve_source(self, source: str, semaphore: asyncio.Semaphore) -> int | None:
+        if _CHANNEL_ID.match(source):
+            return int(source)
+        if not source or source.lstrip("-").isdigit():
+            return None
+
+        async with semaphore:
+            for _ in range(2):
+                try:
+                    entity = await self.client.get_entity(source)
+                except FloodWaitError as error:
+                    if error.seconds > IMPORT_MAX_FLOOD_WAIT_SECONDS:
+                        return None
+                    await asyncio.sleep(error.seconds)
+                    continue
+                except Exception:
+                    return None
+                return channel_peer_id(entity)
+        return None
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from telethon.tl.types import DocumentAttributeFilename, InputMediaUploadedDocument, TypeInputFile
+
+from src.cache import TTLCache
+
+
+MEDIA_CACHE_SIZE = 2048
+# Uploaded-but-unsent parts are only kept by Telegram for a limited time.
+UPLOAD_CACHE_TTL_SECONDS = 30 * 60
+NPVT_MIME_TYPE = "application/octet-stream"
+
+
+@dataclass(frozen=True)
+class CachedMedia:
+    input_file: TypeInputFile
+
+    def input_media(self, file_name: str) -> InputMediaUploadedDocument:
+        """Send the uploaded parts as a document named ``file_name``; each send may pick its own name."""
+        return InputMediaUploadedDocument(
+            file=self.input_file,
+            mime_type=NPVT_MIME_TYPE,
+            attributes=[DocumentAttributeFilename(file_name)],
+            force_file=True,
+        )
+
+
+class UploadedMediaCache:
+    """Content hash -> uploaded file parts, so the same bytes are uploaded once.
+
+    Every relayed file gets its own number, so entries are keyed on the hash
+    alone and the name is set per send (see :meth:`CachedMedia.input_media`).
+    Telegram drops unsent parts after a while; a send that fails with
+    ``FILE_PART_MISSING`` should :meth:`discard` the entry and upload again.
+    """
+
+    def __init__(self, maxsize: int = MEDIA_CACHE_SIZE, ttl_seconds: float = UPLOAD_CACHE_TTL_SECONDS) -> None:
+        self._cache: TTLCache[str, CachedMedia] = TTLCache(maxsize, ttl_seconds)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def get(self, file_hash: str) -> CachedMedia | None:
+        return self._cache.get(file_hash)
+
+    def remember_upload(self, file_hash: str, input_file: TypeInputFile) -> CachedMedia:
+        media = CachedMedia(input_file=input_file)
+        self._cache.set(file_hash, media)
+        return media
+
+    def discard(self, file_hash: str) -> None:
+        self._cache.pop(file_hash)
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from telethon import TelegramClient
+from telethon.sessions import StringSession
+
+
+async def connect_media_client(user_client: TelegramClient, api_id: int, api_hash: str) -> TelegramClient:
+    """Open a second connection for the logged-in account, used only for media I/O.
+
+    The auth key is copied from ``user_client``'s session into an in-memory
+    session, so no second login or session file is needed and the SQLite
+    session is never opened twice. The connection does not ask for updates;
+    those keep arriving on ``user_client`` alone.
+    """
+    session = StringSession(StringSession.save(user_client.session))
+    media_client = TelegramClient(session, api_id, api_hash, receive_updates=False)
+    await media_client.connect()
+    if not await media_client.is_user_authorized():
+        await media_client.disconnect()
+        raise RuntimeError("Media connection was not authorized with the copied session")
+    return media_client
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Awaitable, Callable
+
+from telethon import TelegramClient, utils
+from telethon.errors import (
+    FileIdInvalidError,
+    FileMigrateError,
+    FilePartsInvalidError,
+    FileReferenceExpiredError,
+    FileReferenceInvalidError,
+    FloodWaitError,
+    LocationInvalidError,
+    RPCError,
+)
+from telethon.helpers import generate_random_long
+from telethon.tl.functions.upload import GetFileRequest, SaveBigFilePartRequest, SaveFilePartRequest
+from telethon.tl.types import InputDocumentFileLocation, InputFile, InputFileBig
+
+
+TRANSFER_WORKERS_DEFAULT = 4
+TRANSFER_WORKERS_MAX = 8
+# Files above this are sent with the "big file" part calls, as Telegram requires.
+BIG_FILE_BYTES = 10 * 1024 * 1024
+# GetFile limits must divide 1 MB and a part may not cross a 1 MB boundary; 512 KB satisfies both.
+DOWNLOAD_PART_BYTES = 512 * 1024
+PART_RETRIES = 3
+# Longest FloodWait a single part sits out before the whole transfer gives up.
+PART_MAX_FLOOD_WAIT_SECONDS = 60
+
+# Errors that concern the file rather than one part; retrying the part cannot help.
+_FATAL_PART_ERRORS = (
+    FileIdInvalidError,
+    FileMigrateError,
+    FilePartsInvalidError,
+    FileReferenceExpiredError,
+    FileReferenceInvalidError,
+    LocationInvalidError,
+)
+# Fatal for a part but not for the file: ``download_media`` follows DC
+# migrations and reads the location from the freshly fetched message.
+# FILE_ID_INVALID is the only one no download path can recover from.
+DOWNLOAD_FALLBACK_ERRORS = (
+    FileMigrateError,
+    FileReferenceExpiredError,
+    FileReferenceInvalidError,
+    LocationInvalidError,
+)
+
+
+class ChunkedTransfer:
+    """Upload and download files as parts kept in flight concurrently.
+
+    Telethon's ``upload_file`` and ``download_media`` await each part before
+    requesting the next, so a large file costs one round trip per part.
+    Here up to ``workers`` part requests are outstanding at once on the same
+    client (MTProto multiplexes them over its connection) and a part that
+    fails with a transient error is retried on its own, up to
+    ``PART_RETRIES`` times, instead of restarting the file. Part sizes follow
+    Telegram's rules: uploads use ``utils.get_appropriated_part_size`` and
+    switch to big-file parts above 10 MB; downloads use 512 KB parts.
+
+    ``download`` only reads documents stored in the client's own DC; on any
+    of :data:`DOWNLOAD_FALLBACK_ERRORS` (DC migration, stale or invalid file
+    reference or location) the caller should fall back to ``download_media``.
+    """
+
+    def __init__(self, workers: int = TRANSFER_WORKERS_DEFAULT, log: logging.Logger | None = None) -> None:
+        self.workers = workers
+        self.log = log or logging.getLogger("userbot.relay")
+        self.retried_parts = 0
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    @workers.setter
+    def workers(self, value: int) -> None:
+        self._workers = min(TRANSFER_WORKERS_MAX, max(1, int(value)))
+
+    async def upload(self, client: TelegramClient, source: bytes | str, file_name: str) -> InputFile | InputFileBig:
+        """Upload ``source`` (bytes, or a path read part by part) and return the ``InputFile`` to send."""
+        size = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+        part_size = int(utils.get_appropriated_part_size(size) * 1024)
+        part_count = max(1, (size + part_size - 1) // part_size)
+        is_big = size > BIG_FILE_BYTES
+        file_id = generate_random_long()
+
+        async def send_part(index: int) -> None:
+            if isinstance(source, bytes):
+                part = source[index * part_size:(index + 1) * part_size]
+            else:
+                part = await asyncio.to_thread(_read_range, source, index * part_size, part_size)
+            if is_big:
+                request = SaveBigFilePartRequest(file_id, index, part_count, part)
+            else:
+                request = SaveFilePartRequest(file_id, index, part)
+            if not await client(request):
+                raise RuntimeError(f"Telegram rejected upload part {index} of {file_name}")
+
+        await self._run_parts(part_count, send_part)
+        if is_big:
+            return InputFileBig(file_id, part_count, file_name)
+        # Small files are at most 10 MB, so reading a path once more for the checksum is cheap.
+        data = source if isinstance(source, bytes) else await asyncio.to_thread(_read_range, source, 0, size)
+        return InputFile(file_id, part_count, file_name, hashlib.md5(data).hexdigest())
+
+    async def download(self, client: TelegramClient, document) -> bytes:
+        location = InputDocumentFileLocation(
+            id=document.id,
+            access_hash=document.access_hash,
+            file_reference=document.file_reference,
+            thumb_size="",
+        )
+        size = int(document.size)
+        part_count = max(1, (size + DOWNLOAD_PART_BYTES - 1) // DOWNLOAD_PART_BYTES)
+        parts: list[bytes] = [b""] * part_count
+
+        async def fetch_part(index: int) -> None:
+            result = await client(GetFileRequest(location, index * DOWNLOAD_PART_BYTES, DOWNLOAD_PART_BYTES))
+            parts[index] = result.bytes
+
+        await self._run_parts(part_count, fetch_part)
+        data = b"".join(parts)
+        if len(data) != size:
+            raise RuntimeError(f"Downloaded {len(data)} of {size} bytes for document {document.id}")
+        return data
+
+    async def _run_parts(self, part_count: int, transfer_part: Callable[[int], Awaitable[None]]) -> None:
+        pending = iter(range(part_count))
+
+        async def worker() -> None:
+            # The iterator is shared, so every part index is handed out exactly once.
+            for index in pending:
+                await self._with_retries(transfer_part, index)
+
+        tasks = [asyncio.create_task(worker()) for _ in range(min(self.workers, part_count))]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def _with_retries(self, transfer_part: Callable[[int], Awaitable[None]], index: int) -> None:
+        attempt = 0
+        while True:
+            try:
+                return await transfer_part(index)
+            except _FATAL_PART_ERRORS:
+                raise
+            except FloodWaitError as error:
+                if error.seconds > PART_MAX_FLOOD_WAIT_SECONDS:
+                    raise
+                await asyncio.sleep(float(error.seconds))
+            except (RPCError, ConnectionError, asyncio.TimeoutError) as error:
+                attempt += 1
+                if attempt > PART_RETRIES:
+                    raise
+                self.retried_parts += 1
+                self.log.debug("Retrying transfer part %s after %r (attempt %s)", index, error, attempt)
+                await asyncio.sleep(0.5 * attempt)
+
+
+def _read_range(path: str, offset: int, length: int) -> bytes:
+    with open(path, "rb") as file_obj:
+        file_obj.seek(offset)
+        return file_obj.read(length)
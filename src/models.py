@@ -1,65 +1,273 @@
 """Application model configuration for the ORM."""
 
-from src.orm import Column, SimpleORM
+from __future__ import annotations
+
+import logging
+
+import pymysql
+from pymysql.cursors import Cursor
+
+from src.orm import Column, Index, Migration, SimpleORM
+
+
+log = logging.getLogger("userbot.models")
+
+CONFIGS_BACKFILL_BATCH = 5000
+
+CONFIGS_COLUMNS = [
+    Column("id", "BIGINT", primary_key=True, nullable=False, auto_increment=True),
+    Column("file_id", "VARCHAR(255)", nullable=True),
+    Column("file_hash", "BINARY(32)", nullable=True),
+    Column("name", "VARCHAR(255)", nullable=True),
+    Column("from_chat", "BIGINT", nullable=True),
+    Column("to_chat", "BIGINT", nullable=True),
+    Column("from_messsage_id", "BIGINT", nullable=True),
+    Column("to_messsage_id", "BIGINT", nullable=True),
+    Column("date", "DATETIME(3)", nullable=True),
+]
+
+# Per-transfer relay latency in whole milliseconds, added after the typed
+# columns; NULL for bundle members and rows logged before it was tracked.
+CONFIGS_LATENCY_COLUMNS = [
+    Column("latency_ingress_ms", "INT", nullable=True),
+    Column("latency_queue_ms", "INT", nullable=True),
+    Column("latency_download_ms", "INT", nullable=True),
+    Column("latency_upload_ms", "INT", nullable=True),
+    Column("latency_send_ms", "INT", nullable=True),
+    Column("latency_log_ms", "INT", nullable=True),
+    Column("latency_total_ms", "INT", nullable=True),
+]
+
+CONFIGS_INDEXES = [
+    Index("idx_configs_file_id", ("file_id",)),
+    Index("idx_configs_file_hash", ("file_hash",)),
+    Index("idx_configs_date", ("date",)),
+]
+
+# Legacy rows store every value as text with a 'not_set' sentinel; anything
+# that does not parse cleanly becomes NULL instead of failing the backfill.
+_LEGACY_INT = "IF({col} REGEXP '^-?[0-9]+$', CAST({col} AS SIGNED), NULL)"
+_CONFIGS_BACKFILL_SELECT = ", ".join(
+    [
+        "`id`",
+        "NULLIF(NULLIF(`file_id`, 'not_set'), '')",
+        "IF(`file_hash` REGEXP '^[0-9a-fA-F]{64}$', UNHEX(`file_hash`), NULL)",
+        "NULLIF(NULLIF(`name`, 'not_set'), '')",
+        _LEGACY_INT.format(col="`from_chat`"),
+        _LEGACY_INT.format(col="`to_chat`"),
+        _LEGACY_INT.format(col="`from_messsage_id`"),
+        _LEGACY_INT.format(col="`to_messsage_id`"),
+        "IF(`date` REGEXP '^[0-9]{4}-[0-9]{2}-[0-9]{2}', CAST(REPLACE(`date`, 'T', ' ') AS DATETIME(3)), NULL)",
+    ]
+)
+_CONFIGS_COLUMN_LIST = ", ".join(f"`{col.name}`" for col in CONFIGS_COLUMNS)
+
+
+USERS_COLUMNS = [
+    Column("id", "BIGINT(85)", primary_key=True, nullable=False, auto_increment=True),
+    Column("status", "VARCHAR(255)", nullable=False, default="none"),
+    Column("step", "VARCHAR(255)", nullable=False, default="none"),
+    Column("data", "LONGTEXT", nullable=True),
+]
+
+CHANNELS_COLUMNS = [
+    Column("id", "BIGINT(85)", primary_key=True, nullable=False, auto_increment=True),
+    Column("source_channel_id", "BIGINT(85)", nullable=False),
+    Column("destination_channel_id", "BIGINT(85)", nullable=False),
+    Column("created_at", "VARCHAR(255)", nullable=False, default="now()"),
+]
+
+RELAY_RATE_STATE_COLUMNS = [
+    Column("id", "BIGINT", primary_key=True, nullable=False, auto_increment=True),
+    Column("rate_key", "VARCHAR(64)", nullable=False, unique=True),
+    Column("interval_seconds", "DOUBLE", nullable=False),
+    Column("flood_waits", "INT", nullable=False, default="0"),
+    Column("updated_at", "DATETIME(3)", nullable=True),
+]
+
+RELAY_DEDUP_COLUMNS = [
+    Column("id", "BIGINT", primary_key=True, nullable=False, auto_increment=True),
+    Column("key_kind", "TINYINT", nullable=False),
+    Column("key_hash", "BINARY(32)", nullable=False),
+    Column("source_chat", "BIGINT", nullable=False, default="0"),
+    Column("destination_chat", "BIGINT", nullable=False, default="0"),
+    Column("seen_at", "DATETIME(3)", nullable=False),
+]
+
+RELAY_DEDUP_INDEXES = [
+    Index("uq_relay_dedup_key", ("key_hash", "source_chat", "destination_chat"), unique=True),
+    Index("idx_relay_dedup_seen_at", ("seen_at",)),
+]
+
+CONFIGS_ARCHIVE_RUNS_COLUMNS = [
+    Column("id", "BIGINT", primary_key=True, nullable=False, auto_increment=True),
+    Column("archived_at", "DATETIME(3)", nullable=False),
+    Column("cutoff", "DATETIME(3)", nullable=False),
+    Column("rows_archived", "BIGINT", nullable=False, default="0"),
+    Column("raw_bytes", "BIGINT", nullable=False, default="0"),
+    Column("file_bytes", "BIGINT", nullable=False, default="0"),
+    Column("path", "VARCHAR(512)", nullable=True),
+]
+
+# One configs row yields up to two dedup keys; file IDs are hashed so both
+# kinds share the fixed-width key column (see DedupManager.file_id_digest).
+_DEDUP_BACKFILL_KEYS = (
+    (2, "`file_hash`", "`file_hash` IS NOT NULL"),
+    (1, "UNHEX(SHA2(CONCAT('file_id:', `file_id`), 256))", "`file_id` IS NOT NULL AND `file_id` <> ''"),
+)
+
+RELAY_SETTINGS_COLUMNS = [
+    Column("id", "BIGINT(85)", primary_key=True, nullable=False, auto_increment=True),
+    Column("setting_key", "VARCHAR(100)", nullable=False, unique=True),
+    Column("setting_value", "VARCHAR(1024)", nullable=False),
+    Column("updated_at", "VARCHAR(255)", nullable=False, default="now()"),
+]
 
 
 def setup(orm: SimpleORM) -> None:
-    orm.create_table(
-        "users",
-        [
-            Column("id", "BIGINT(85)", primary_key=True, nullable=False, auto_increment=True),
-            Column("status", "VARCHAR(255)", nullable=False, default="none"),
-            Column("step", "VARCHAR(255)", nullable=False, default="none"),
-            Column("data", "LONGTEXT", nullable=True),
-        ],
-    )
+    applied = orm.migrate(build_migrations(orm))
+    for migration in applied:
+        log.info("Applied schema migration %s (%s)", migration.version, migration.name)
 
-    orm.create_table(
-        "configs",
-        [
-            Column("id", "BIGINT(85)", primary_key=True, nullable=False, auto_increment=True),
-            Column("file_id", "VARCHAR(255)", nullable=False, default="not_set"),
-            Column("file_hash", "VARCHAR(64)", nullable=False, default="not_set"),
-            Column("name", "VARCHAR(255)", nullable=False, default="not_set"),
-            Column("from_chat", "VARCHAR(45)", nullable=False, default="not_set"),
-            Column("to_chat", "VARCHAR(45)", nullable=False, default="not_set"),
-            Column("from_messsage_id", "VARCHAR(45)", nullable=False, default="not_set"),
-            Column("to_messsage_id", "VARCHAR(45)", nullable=False, default="not_set"),
-            Column("date", "VARCHAR(255)", nullable=False, default="not_set"),
-        ],
-    )
 
-    orm.create_table(
-        "channels",
-        [
-            Column("id", "BIGINT(85)", primary_key=True, nullable=False, auto_increment=True),
-            Column("source_channel_id", "BIGINT(85)", nullable=False),
-            Column("destination_channel_id", "BIGINT(85)", nullable=False),
-            Column("created_at", "VARCHAR(255)", nullable=False, default="now()"),
-        ],
-    )
+def build_migrations(orm: SimpleORM) -> list[Migration]:
+    """Ordered schema history. Append new steps; never edit or renumber applied ones."""
+
+    def create_base_tables(cursor: Cursor) -> None:
+        cursor.execute(orm.create_table_sql("users", USERS_COLUMNS))
+        cursor.execute(orm.create_table_sql("configs", CONFIGS_COLUMNS, CONFIGS_INDEXES))
+        cursor.execute(orm.create_table_sql("channels", CHANNELS_COLUMNS))
+        cursor.execute(orm.create_table_sql("relay_settings", RELAY_SETTINGS_COLUMNS))
+
+    def convert_utf8mb4(cursor: Cursor) -> None:
+        for table_name in ("users", "configs", "channels", "relay_settings"):
+            try:
+                cursor.execute(
+                    f"ALTER TABLE `{table_name}` CONVERT TO CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
+                )
+            except pymysql.err.MySQLError:
+                # Best effort: if DB user cannot alter charset, app can still continue.
+                pass
+
+    def add_legacy_file_hash(cursor: Cursor) -> None:
+        if _column_type(cursor, "configs", "file_hash") is None:
+            legacy_column = Column("file_hash", "VARCHAR(64)", nullable=False, default="not_set")
+            cursor.execute(f"ALTER TABLE `configs` ADD COLUMN {legacy_column.to_sql()}")
+
+    def configs_native_types(cursor: Cursor) -> None:
+        migrate_configs_native_types(orm, cursor)
+
+    def create_relay_rate_state(cursor: Cursor) -> None:
+        cursor.execute(orm.create_table_sql("relay_rate_state", RELAY_RATE_STATE_COLUMNS))
+
+    def add_channel_delivery_mode(cursor: Cursor) -> None:
+        if _column_type(cursor, "channels", "delivery_mode") is None:
+            column = Column("delivery_mode", "VARCHAR(16)", nullable=False, default="single")
+            cursor.execute(f"ALTER TABLE `channels` ADD COLUMN {column.to_sql()}")
+
+    def create_relay_dedup(cursor: Cursor) -> None:
+        cursor.execute(orm.create_table_sql("relay_dedup", RELAY_DEDUP_COLUMNS, RELAY_DEDUP_INDEXES))
+        _backfill_dedup(cursor, CONFIGS_BACKFILL_BATCH)
+
+    def create_configs_archive_runs(cursor: Cursor) -> None:
+        cursor.execute(orm.create_table_sql("configs_archive_runs", CONFIGS_ARCHIVE_RUNS_COLUMNS))
+
+    def add_configs_latency(cursor: Cursor) -> None:
+        # One statement, so a large table is altered (or rebuilt) once rather than per column.
+        missing = [column for column in CONFIGS_LATENCY_COLUMNS if _column_type(cursor, "configs", column.name) is None]
+        if missing:
+            cursor.execute(f"ALTER TABLE `configs` {', '.join(f'ADD COLUMN {column.to_sql()}' for column in missing)}")
+
+    return [
+        Migration(1, "create_base_tables", create_base_tables),
+        Migration(2, "convert_utf8mb4", convert_utf8mb4),
+        Migration(3, "configs_file_hash_column", add_legacy_file_hash),
+        Migration(4, "configs_native_types", configs_native_types),
+        Migration(5, "create_relay_rate_state", create_relay_rate_state),
+        Migration(6, "channels_delivery_mode", add_channel_delivery_mode),
+        Migration(7, "create_relay_dedup", create_relay_dedup),
+        Migration(8, "create_configs_archive_runs", create_configs_archive_runs),
+        Migration(9, "configs_latency_columns", add_configs_latency),
+    ]
 
-    orm.create_table(
-        "relay_settings",
-        [
-            Column("id", "BIGINT(85)", primary_key=True, nullable=False, auto_increment=True),
-            Column("setting_key", "VARCHAR(100)", nullable=False, unique=True),
-            Column("setting_value", "VARCHAR(1024)", nullable=False),
-            Column("updated_at", "VARCHAR(255)", nullable=False, default="now()"),
-        ],
+
+def migrate_configs_native_types(orm: SimpleORM, cursor: Cursor, batch_size: int = CONFIGS_BACKFILL_BATCH) -> None:
+    """Move a legacy text-typed ``configs`` table to native column types.
+
+    Rows are copied into ``configs_typed`` in short keyset batches, each
+    committed on its own so the live table stays writable, then the two tables
+    are swapped with one atomic ``RENAME TABLE``. Rows written between the last
+    batch and the swap land in ``configs_legacy`` and are copied over right
+    after it. An interrupted run resumes from the highest id already copied,
+    on either side of the swap: if ``configs`` is already typed but
+    ``configs_legacy`` is still there, the catch-up is run again before the
+    step is recorded. Migrations finish before the relay starts writing, so
+    nothing newer than the legacy tail can be in ``configs`` at that point.
+    ``configs_legacy`` is kept for rollback and can be dropped by hand once the
+    new table is verified.
+    """
+    if _column_type(cursor, "configs", "from_chat") != "varchar":
+        if _column_type(cursor, "configs_legacy", "from_chat") == "varchar":
+            copied = _backfill_configs(cursor, "configs_legacy", batch_size, target="configs")
+            log.info("Resumed configs migration after the swap: %s rows caught up from configs_legacy", copied)
+        return
+
+    log.info("Migrating configs to native column types (batch=%s)", batch_size)
+    cursor.execute(orm.create_table_sql("configs_typed", CONFIGS_COLUMNS, CONFIGS_INDEXES))
+
+    copied = _backfill_configs(cursor, "configs", batch_size)
+    cursor.execute("RENAME TABLE `configs` TO `configs_legacy`, `configs_typed` TO `configs`")
+    copied += _backfill_configs(cursor, "configs_legacy", batch_size, target="configs")
+
+    log.info("Configs migration finished: %s rows copied, old table kept as configs_legacy", copied)
+
+
+def _column_type(cursor: Cursor, table: str, column: str) -> str | None:
+    cursor.execute(
+        "SELECT DATA_TYPE AS data_type FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        [table, column],
     )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return str(row["data_type"]).lower()
+
 
-    for table_name in ("users", "configs", "channels", "relay_settings"):
-        try:
-            orm.ensure_table_utf8mb4(table_name)
-        except Exception:
-            # Best effort: if DB user cannot alter charset, app can still continue.
-            pass
-
-    try:
-        orm.ensure_column_exists(
-            "configs",
-            Column("file_hash", "VARCHAR(64)", nullable=False, default="not_set"),
+def _backfill_configs(cursor: Cursor, source: str, batch_size: int, target: str = "configs_typed") -> int:
+    copied = 0
+    while True:
+        cursor.execute(f"SELECT COALESCE(MAX(`id`), 0) AS max_id FROM `{target}`")
+        last_id = int(cursor.fetchone()["max_id"])
+        cursor.execute(
+            f"INSERT INTO `{target}` ({_CONFIGS_COLUMN_LIST}) "
+            f"SELECT {_CONFIGS_BACKFILL_SELECT} FROM `{source}` "
+            "WHERE `id` > %s ORDER BY `id` LIMIT %s",
+            [last_id, batch_size],
         )
-    except Exception:
-        pass
+        inserted = int(cursor.rowcount)
+        cursor.connection.commit()
+        copied += inserted
+        if inserted < batch_size:
+            return copied
+
+
+def _backfill_dedup(cursor: Cursor, batch_size: int) -> int:
+    """Seed ``relay_dedup`` from ``configs`` in id ranges, committing after each range."""
+    cursor.execute("SELECT COALESCE(MIN(`id`), 0) AS min_id, COALESCE(MAX(`id`), 0) AS max_id FROM `configs`")
+    bounds = cursor.fetchone()
+    copied = 0
+    for low in range(int(bounds["min_id"]) - 1, int(bounds["max_id"]), batch_size):
+        for kind, key_sql, present in _DEDUP_BACKFILL_KEYS:
+            cursor.execute(
+                "INSERT INTO `relay_dedup` (`key_kind`, `key_hash`, `source_chat`, `destination_chat`, `seen_at`) "
+                f"SELECT {kind}, {key_sql}, COALESCE(`from_chat`, 0), COALESCE(`to_chat`, 0), COALESCE(`date`, NOW(3)) "
+                f"FROM `configs` WHERE `id` > %s AND `id` <= %s AND {present} "
+                "ON DUPLICATE KEY UPDATE `seen_at` = GREATEST(`seen_at`, VALUES(`seen_at`))",
+                [low, low + batch_size],
+            )
+            copied += int(cursor.rowcount)
+        cursor.connection.commit()
+    if copied:
+        log.info("Seeded relay_dedup from configs (%s rows affected)", copied)
+    return copied
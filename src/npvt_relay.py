@@ -1,17 +1,54 @@
 from __future__ import annotations
 
 import asyncio
-import hashlib
+import base64
 import logging
 import random
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 
 from telethon import TelegramClient, events
-from telethon.errors import FloodWaitError
+from telethon.errors import FilePartMissingError, FloodWaitError
 
-from src.controllers import ChannelManager, ConfigManager, RelaySettingsManager
+from src.archive import TransferArchiver
+from src.bundles import BundleMember, BundleStore, OpenBundle, SealedBundle
+from src.cache import TTLCache
+from src.config import RELAY_BUNDLES_DIR, RELAY_MEDIA_CONCURRENCY, RELAY_SNAPSHOT_PATH
+from src.cpu import run_cpu, sha256_hex
+from src.controllers import (
+    DELIVERY_ALBUM,
+    DELIVERY_BUNDLE,
+    DELIVERY_SINGLE,
+    DEDUP_SCOPE_DESTINATION,
+    DEDUP_KIND_FILE_ID,
+    DEDUP_SCOPE_GLOBAL,
+    DEDUP_SCOPE_SOURCE,
+    LATENCY_STAGES,
+    ChannelManager,
+    ConfigManager,
+    DedupManager,
+    RateStateManager,
+    RelaySettingsManager,
+)
+from src.entities import EntityCache, entity_cache
+from src.media_cache import CachedMedia, UploadedMediaCache
+from src.media_transfer import DOWNLOAD_FALLBACK_ERRORS, ChunkedTransfer
 from src.orm import SimpleORM
+from src.rate_control import ACCOUNT_KEY, AdaptiveRateController, destination_key
+from src.snapshot import StateSnapshot
+
+
+DEDUP_CACHE_SIZE = 50_000
+PIPELINE_DEPTH = 3
+PREPARE_BATCH_SIZE = 20
+ALBUM_MAX_ITEMS = 10
+LOG_QUEUE_SIZE = 100
+SNAPSHOT_INTERVAL_SECONDS = 60.0
+RATE_STATE_FLUSH_SECONDS = 30.0
+BUNDLE_CHECK_SECONDS = 5.0
+DEDUP_EXPIRY_SECONDS = 3600.0
+ARCHIVE_CHECK_SECONDS = 6 * 3600.0
 
 
 @dataclass(frozen=True)
@@ -19,6 +56,76 @@ class RelayJob:
     source_chat_id: int
     destination_chat_id: int
     message_id: int
+    # Wall-clock epoch seconds the source message was posted and the relay saw it;
+    # not part of the job's identity, so a requeued job still matches itself.
+    source_date: float | None = field(default=None, compare=False)
+    ingress_at: float | None = field(default=None, compare=False)
+
+    def log_fields(self) -> dict:
+        """Structured ``extra`` fields identifying the job in log records."""
+        return {
+            "job_id": f"{self.source_chat_id}:{self.message_id}",
+            "source": self.source_chat_id,
+            "destination": self.destination_chat_id,
+            "message_id": self.message_id,
+        }
+
+
+@dataclass
+class RelayTransfer:
+    """A job moving through the relay pipeline, filled in stage by stage."""
+
+    job: RelayJob
+    file_id: str | None = None
+    file_hash: str | None = None
+    # Scoped dedup keys this transfer holds in flight (see NPVTRelayService._dedup_key).
+    file_id_key: str | None = None
+    hash_key: str | None = None
+    file_bytes: bytes | None = None
+    file_name: str | None = None
+    index: int | None = None
+    media: CachedMedia | None = None
+    sent_message: object | None = None
+    # Set for a sealed bundle archive; it stands in for every member file.
+    bundle: SealedBundle | None = None
+    # Milliseconds spent per stage, e.g. {"prepare_ms": 412.0}, for the structured "sent" log record.
+    timings: dict[str, float] = field(default_factory=dict)
+    # Wall-clock epoch seconds the transfer reached each pipeline point:
+    # "dequeued", "downloaded", "uploaded", "sent" and "logged".
+    marks: dict[str, float] = field(default_factory=dict)
+
+    def latency_ms(self) -> dict[str, int | None]:
+        """Whole milliseconds between consecutive pipeline points, keyed by :data:`LATENCY_STAGES`.
+
+        Each stage ends at its own point and starts at the previous one, so
+        "upload" and "send" include the wait in front of them (and "send"
+        the pacing delay); "total" runs from the source post to the log
+        write. The source date has one-second resolution, so "ingress" is
+        approximate. Missing points leave their stages ``None``.
+        """
+        points = [
+            self.job.source_date,
+            self.job.ingress_at,
+            *(self.marks.get(mark) for mark in ("dequeued", "downloaded", "uploaded", "sent", "logged")),
+        ]
+        latency: dict[str, int | None] = {}
+        for stage, start, end in zip(LATENCY_STAGES, points, points[1:]):
+            latency[stage] = _elapsed_ms(start, end)
+        latency["total"] = _elapsed_ms(points[0], points[-1])
+        return latency
+
+
+def _elapsed_ms(start: float | None, end: float | None) -> int | None:
+    if start is None or end is None:
+        return None
+    # Clock skew against Telegram's timestamps must not produce negative latencies.
+    return max(0, round((end - start) * 1000))
+
+
+@dataclass
+class AlbumBuffer:
+    deadline: float
+    transfers: list[RelayTransfer] = field(default_factory=list)
 
 
 class NPVTRelayService:
@@ -27,12 +134,25 @@ class NPVTRelayService:
         client: TelegramClient,
         orm: SimpleORM,
         log: logging.Logger,
+        snapshot_path: str | None = RELAY_SNAPSHOT_PATH,
+        entities: EntityCache | None = None,
+        bundles_dir: str = RELAY_BUNDLES_DIR,
+        media_concurrency: int = RELAY_MEDIA_CONCURRENCY,
     ) -> None:
         self.client = client
+        # Downloads, uploads and sends go through media_client; see use_media_client.
+        self.media_client = client
+        self._media_slots = asyncio.Semaphore(max(1, int(media_concurrency)))
+        self.chunked = ChunkedTransfer(RelaySettingsManager.DEFAULT_TRANSFER_WORKERS, log)
         self.log = log
+        self.entities = entities or entity_cache
+        self.media_cache = UploadedMediaCache()
         self.channel_manager = ChannelManager(orm)
         self.config_manager = ConfigManager(orm)
+        self.dedup_manager = DedupManager(orm)
+        self.archiver = TransferArchiver(orm)
         self.settings_manager = RelaySettingsManager(orm)
+        self.rate_state_manager = RateStateManager(orm)
 
         self.caption = RelaySettingsManager.DEFAULT_CAPTION
         self.send_interval_seconds = RelaySettingsManager.DEFAULT_SEND_INTERVAL_SECONDS
@@ -40,43 +160,459 @@ class NPVTRelayService:
         self.file_prefix = RelaySettingsManager.DEFAULT_FILENAME_PREFIX
         self.relay_enabled = RelaySettingsManager.DEFAULT_RELAY_ENABLED
         self.dedup_enabled = RelaySettingsManager.DEFAULT_DEDUP_ENABLED
+        self.dedup_window_days = RelaySettingsManager.DEFAULT_DEDUP_WINDOW_DAYS
+        self.dedup_scope = RelaySettingsManager.DEFAULT_DEDUP_SCOPE
+        self.retention_days = RelaySettingsManager.DEFAULT_RETENTION_DAYS
+        self.parallel_transfers = RelaySettingsManager.DEFAULT_PARALLEL_TRANSFERS
+        self.album_window_seconds = RelaySettingsManager.DEFAULT_ALBUM_WINDOW_SECONDS
+        self.bundle_interval_seconds = RelaySettingsManager.DEFAULT_BUNDLE_INTERVAL_SECONDS
+        self.bundle_max_bytes = RelaySettingsManager.DEFAULT_BUNDLE_MAX_BYTES
 
         self._queue: asyncio.Queue[RelayJob] = asyncio.Queue()
         self._source_map: dict[int, int] = {}
+        self._destination_modes: dict[int, str] = {}
+        self._albums: dict[int, AlbumBuffer] = {}
+        self.bundle_store = BundleStore(bundles_dir)
+        self._bundles: dict[int, OpenBundle] = {}
+        self._bundle_lock = asyncio.Lock()
         self._map_updated_at = 0.0
         self._map_lock = asyncio.Lock()
         self._settings_lock = asyncio.Lock()
         self._settings_last_refresh = 0.0
         self._settings_refresh_seconds = 15.0
-        self._worker_task: asyncio.Task | None = None
+        self._worker_tasks: list[asyncio.Task] = []
+        # Bounded hand-off queues keep at most a few prepared/uploaded files ahead of the send pacing.
+        self._upload_queue: asyncio.Queue[RelayTransfer] = asyncio.Queue(maxsize=PIPELINE_DEPTH)
+        self._send_queue: asyncio.Queue[RelayTransfer] = asyncio.Queue(maxsize=PIPELINE_DEPTH)
+        self._log_queue: asyncio.Queue[RelayTransfer] = asyncio.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.rate_controller = AdaptiveRateController(
+            initial_interval=RelaySettingsManager.DEFAULT_SEND_INTERVAL_SECONDS,
+            min_interval=RelaySettingsManager.DEFAULT_SEND_INTERVAL_MIN_SECONDS,
+            max_interval=RelaySettingsManager.DEFAULT_SEND_INTERVAL_MAX_SECONDS,
+        )
+        self._inflight_file_ids: set[str] = set()
+        self._inflight_hashes: set[str] = set()
+        self._ready = asyncio.Event()
+
+        # Positive-only caches: a hit means "already relayed", a miss falls back to MySQL.
+        # Keys are scoped digests; with a dedup window each entry expires when its DB row would.
+        self._seen_file_ids: TTLCache[str, bool] = TTLCache(DEDUP_CACHE_SIZE)
+        self._seen_file_hashes: TTLCache[str, bool] = TTLCache(DEDUP_CACHE_SIZE)
+        self._next_index: int | None = None
+
+        self._snapshot = StateSnapshot(snapshot_path, log) if snapshot_path else None
+        self._snapshot_fingerprint: tuple | None = None
+        self._background_tasks: set[asyncio.Task] = set()
+
+    async def warm_up(self) -> None:
+        """Open the gate for jobs as early as possible.
+
+        With a usable snapshot the relay becomes ready once file numbering
+        has been checked against MySQL, and the rest of the database
+        reconcile runs in the background; otherwise the caches are
+        loaded from MySQL first. Bundles left on disk by the previous run are
+        picked up before any job is let through.
+        """
+        await self._restore_bundles()
+        if await self._restore_snapshot():
+            # Files logged after the last snapshot hold numbers above its counter; reconcile
+            # numbering (one COUNT and one SUM) before any upload can reuse one of them.
+            await self._warm_next_index()
+            self._ready.set()
+            self.log.info(
+                "NPVT relay ready from snapshot (sources=%s, dedup_ids=%s, dedup_hashes=%s, next_index=%s)",
+                len(self._source_map),
+                len(self._seen_file_ids),
+                len(self._seen_file_hashes),
+                self._next_index,
+            )
+            self._spawn(self._warm_from_db(), "npvt-relay-reconcile")
+        else:
+            await self._warm_from_db()
+
+        if self._snapshot is not None:
+            self._spawn(self._run_snapshots(), "npvt-relay-snapshots")
+        self._spawn(self._run_rate_state_flush(), "npvt-relay-rate-state")
+        self._spawn(self._run_bundle_timer(), "npvt-relay-bundles")
+        self._spawn(self._run_dedup_expiry(), "npvt-relay-dedup-expiry")
+        self._spawn(self._run_archiver(), "npvt-relay-archiver")
+
+    def use_media_client(self, media_client: TelegramClient) -> None:
+        """Move media I/O to a dedicated connection; updates, message fetches and lookups stay on ``client``."""
+        self.media_client = media_client
+
+    async def _media_call(self, method: str, *args, **kwargs):
+        """Call a media-heavy client method on the media connection, with bounded concurrency."""
+        async with self._media_slots:
+            return await getattr(self.media_client, method)(*args, **kwargs)
+
+    async def _download(self, message) -> bytes | None:
+        document = getattr(message, "document", None)
+        if self.parallel_transfers and document is not None:
+            try:
+                async with self._media_slots:
+                    return await self.chunked.download(self.media_client, document)
+            except DOWNLOAD_FALLBACK_ERRORS:
+                # Another DC, or a stale/invalid reference or location: retry on Telethon's own path.
+                pass
+        return await self._media_call("download_media", message, file=bytes)
+
+    async def _upload_file(self, source: bytes | str, file_name: str):
+        if self.parallel_transfers:
+            async with self._media_slots:
+                return await self.chunked.upload(self.media_client, source, file_name)
+        return await self._media_call("upload_file", source, file_name=file_name)
+
+    async def save_snapshot(self, force: bool = False) -> None:
+        if self._snapshot is None:
+            return
+
+        fingerprint = self._state_fingerprint()
+        if not force and fingerprint == self._snapshot_fingerprint:
+            return
+
+        state = self._export_state()
+        size = await run_cpu("snapshot", self._snapshot.save, state)
+        self._snapshot_fingerprint = fingerprint
+        self.log.debug("NPVT relay state snapshot written (%s bytes)", size)
+
+    def _spawn(self, coro, name: str) -> None:
+        task = asyncio.create_task(coro, name=name)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _run_snapshots(self) -> None:
+        while True:
+            await asyncio.sleep(SNAPSHOT_INTERVAL_SECONDS)
+            try:
+                await self.save_snapshot()
+            except Exception:
+                self.log.exception("Failed to write NPVT relay state snapshot")
+
+    def _state_fingerprint(self) -> tuple:
+        return (
+            self.caption,
+            self.file_prefix,
+            self.send_interval_seconds,
+            self.source_cache_seconds,
+            self.relay_enabled,
+            self.dedup_enabled,
+            self.dedup_window_days,
+            self.dedup_scope,
+            hash(frozenset(self._source_map.items())),
+            hash(frozenset(self._destination_modes.items())),
+            len(self._seen_file_ids),
+            len(self._seen_file_hashes),
+            self._next_index,
+            len(self.entities),
+        )
+
+    def _export_state(self) -> dict:
+        # Cached keys carry no expiry in the snapshot, so only a keep-forever global policy exports them.
+        exportable = not self.dedup_window_days and self.dedup_scope == DEDUP_SCOPE_GLOBAL
+        packed_ids = b"".join(bytes.fromhex(key) for key in self._seen_file_ids) if exportable else b""
+        packed_hashes = b"".join(bytes.fromhex(key) for key in self._seen_file_hashes) if exportable else b""
+        return {
+            "saved_at": time.time(),
+            "settings": {
+                "caption": self.caption,
+                "filename_prefix": self.file_prefix,
+                "send_interval_seconds": self.send_interval_seconds,
+                "send_interval_min_seconds": self.rate_controller.min_interval,
+                "send_interval_max_seconds": self.rate_controller.max_interval,
+                "source_cache_seconds": self.source_cache_seconds,
+                "album_window_seconds": self.album_window_seconds,
+                "bundle_interval_seconds": self.bundle_interval_seconds,
+                "bundle_max_bytes": self.bundle_max_bytes,
+                "relay_enabled": self.relay_enabled,
+                "dedup_enabled": self.dedup_enabled,
+                "dedup_window_days": self.dedup_window_days,
+                "dedup_scope": self.dedup_scope,
+                "parallel_transfers": self.parallel_transfers,
+                "transfer_workers": self.chunked.workers,
+            },
+            "source_map": [[source_id, destination_id] for source_id, destination_id in self._source_map.items()],
+            "destination_modes": [[destination_id, mode] for destination_id, mode in self._destination_modes.items()],
+            "dedup_file_id_digests": base64.b64encode(packed_ids).decode("ascii"),
+            "dedup_file_hashes": base64.b64encode(packed_hashes).decode("ascii"),
+            "next_index": self._next_index,
+            "entities": self.entities.export(),
+        }
+
+    async def _restore_snapshot(self) -> bool:
+        if self._snapshot is None:
+            return False
+
+        state = await asyncio.to_thread(self._snapshot.load)
+        if state is None:
+            return False
+
+        try:
+            settings = state["settings"]
+            source_map = {int(source_id): int(destination_id) for source_id, destination_id in state["source_map"]}
+            destination_modes = {
+                int(destination_id): str(mode) for destination_id, mode in state.get("destination_modes") or []
+            }
+            packed_hashes = base64.b64decode(state["dedup_file_hashes"])
+            file_hashes = [packed_hashes[offset:offset + 32].hex() for offset in range(0, len(packed_hashes), 32)]
+            # Older snapshots kept raw file IDs; those are dropped and refilled by the reconcile.
+            packed_ids = base64.b64decode(state.get("dedup_file_id_digests") or "")
+            file_ids = [packed_ids[offset:offset + 32].hex() for offset in range(0, len(packed_ids), 32)]
+            next_index = state.get("next_index")
+            entities = list(state.get("entities") or [])
+            runtime = (
+                str(settings["caption"]),
+                str(settings["filename_prefix"]),
+                max(1.0, float(settings["send_interval_seconds"])),
+                max(5, int(settings["source_cache_seconds"])),
+                bool(settings["relay_enabled"]),
+                bool(settings["dedup_enabled"]),
+            )
+            album_window = float(settings.get("album_window_seconds", RelaySettingsManager.DEFAULT_ALBUM_WINDOW_SECONDS))
+            dedup_policy = (
+                float(settings.get("dedup_window_days", RelaySettingsManager.DEFAULT_DEDUP_WINDOW_DAYS)),
+                str(settings.get("dedup_scope", RelaySettingsManager.DEFAULT_DEDUP_SCOPE)),
+            )
+            transfer_engine = (
+                bool(settings.get("parallel_transfers", RelaySettingsManager.DEFAULT_PARALLEL_TRANSFERS)),
+                int(settings.get("transfer_workers", RelaySettingsManager.DEFAULT_TRANSFER_WORKERS)),
+            )
+            bundle_thresholds = (
+                float(settings.get("bundle_interval_seconds", RelaySettingsManager.DEFAULT_BUNDLE_INTERVAL_SECONDS)),
+                int(settings.get("bundle_max_bytes", RelaySettingsManager.DEFAULT_BUNDLE_MAX_BYTES)),
+            )
+            rate_bounds = (
+                float(settings.get("send_interval_min_seconds", RelaySettingsManager.DEFAULT_SEND_INTERVAL_MIN_SECONDS)),
+                float(settings.get("send_interval_max_seconds", RelaySettingsManager.DEFAULT_SEND_INTERVAL_MAX_SECONDS)),
+            )
+        except (KeyError, TypeError, ValueError):
+            self.log.warning("Ignoring NPVT relay snapshot with unexpected layout")
+            return False
+
+        (
+            self.caption,
+            self.file_prefix,
+            self.send_interval_seconds,
+            self.source_cache_seconds,
+            self.relay_enabled,
+            self.dedup_enabled,
+        ) = runtime
+        self.album_window_seconds = album_window
+        self.dedup_window_days, self.dedup_scope = dedup_policy
+        self.parallel_transfers, self.chunked.workers = transfer_engine
+        self.bundle_interval_seconds, self.bundle_max_bytes = bundle_thresholds
+        self.rate_controller.configure(self.send_interval_seconds, *rate_bounds)
+        now = time.monotonic()
+        self._settings_last_refresh = now
+        self._source_map = source_map
+        self._destination_modes = destination_modes
+        self._map_updated_at = now
+        for file_id in file_ids:
+            self._seen_file_ids.set(file_id, True)
+        for file_hash in file_hashes:
+            self._seen_file_hashes.set(file_hash, True)
+        if next_index is not None:
+            # Open bundles may already hold reserved numbers past the snapshot's counter.
+            self._next_index = max(int(next_index), self._next_index or 0)
+        try:
+            self.entities.restore(entities)
+        except (TypeError, ValueError):
+            self.log.warning("Ignoring unreadable entity entries in NPVT relay snapshot")
+        self._snapshot_fingerprint = self._state_fingerprint()
+        return True
+
+    async def _warm_from_db(self) -> None:
+        try:
+            await self._refresh_runtime_settings_if_needed(force=True)
+            await self._refresh_source_map(force=True)
+            results = await asyncio.gather(
+                self._warm_dedup_cache(),
+                self._warm_next_index(),
+                self._warm_rate_state(),
+                self._warm_entities(),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    self.log.warning("NPVT relay warm-up step failed: %r", result)
+        except Exception:
+            self.log.exception("NPVT relay warm-up failed; continuing with cold caches")
+        finally:
+            self._ready.set()
+
+        self.log.info(
+            "NPVT relay caches loaded from MySQL (sources=%s, dedup_ids=%s, dedup_hashes=%s, next_index=%s)",
+            len(self._source_map),
+            len(self._seen_file_ids),
+            len(self._seen_file_hashes),
+            self._next_index,
+        )
+
+    def invalidate_transfer_caches(self) -> None:
+        """Forget cached dedup keys and numbering, e.g. after the configs table was reset."""
+        self._seen_file_ids.clear()
+        self._seen_file_hashes.clear()
+        self._next_index = None
+        self._snapshot_fingerprint = None
+
+    async def _warm_dedup_cache(self) -> None:
+        entries = await asyncio.to_thread(self.dedup_manager.recent, DEDUP_CACHE_SIZE, self._dedup_since())
+        for kind, digest, source_chat_id, destination_chat_id, seen_at in reversed(entries):
+            cache = self._seen_file_ids if kind == DEDUP_KIND_FILE_ID else self._seen_file_hashes
+            cache.set(self._dedup_key(digest.hex(), source_chat_id, destination_chat_id), True, self._dedup_ttl(seen_at))
+
+    def _dedup_key(self, digest_hex: str, source_chat_id: int, destination_chat_id: int) -> str:
+        """In-memory dedup key: the digest alone, or prefixed with the chat the scope compares within."""
+        if self.dedup_scope == DEDUP_SCOPE_SOURCE:
+            return f"{source_chat_id}:{digest_hex}"
+        if self.dedup_scope == DEDUP_SCOPE_DESTINATION:
+            return f"{destination_chat_id}:{digest_hex}"
+        return digest_hex
+
+    def _transfer_keys(
+        self, file_id: str | None, file_hash: str | None, source_chat_id: int, destination_chat_id: int
+    ) -> tuple[str | None, str | None]:
+        file_id_key = None
+        if file_id is not None:
+            file_id_key = self._dedup_key(DedupManager.file_id_digest(file_id).hex(), source_chat_id, destination_chat_id)
+        hash_key = None if file_hash is None else self._dedup_key(file_hash, source_chat_id, destination_chat_id)
+        return file_id_key, hash_key
+
+    def _dedup_since(self) -> datetime | None:
+        if not self.dedup_window_days:
+            return None
+        return datetime.now() - timedelta(days=self.dedup_window_days)
+
+    def _dedup_ttl(self, seen_at: datetime | None = None) -> float | None:
+        """Seconds a cached key stays valid: the rest of its window, or ``None`` to keep it until evicted."""
+        if not self.dedup_window_days:
+            return None
+        window = self.dedup_window_days * 86400.0
+        if seen_at is None:
+            return window
+        # A zero TTL would mean "never expires" to TTLCache.
+        return max(1.0, window - (datetime.now() - seen_at).total_seconds())
+
+    async def expire_dedup(self) -> int:
+        """Drop dedup entries older than the window from MySQL; a no-op when keys are kept forever."""
+        since = self._dedup_since()
+        if since is None:
+            return 0
+        removed = await asyncio.to_thread(self.dedup_manager.expire, since)
+        if removed:
+            self.log.info("Expired %s dedup entries older than %s days", removed, self.dedup_window_days)
+        return removed
+
+    async def archive_transfers(self) -> int:
+        """Move ``configs`` rows older than the retention period to archive files; a no-op when retention is off."""
+        if not self.retention_days:
+            return 0
+        cutoff = datetime.now() - timedelta(days=self.retention_days)
+        result = await asyncio.to_thread(self.archiver.archive_before, cutoff)
+        if result.rows:
+            self.log.info(
+                "Archived %s transfer rows older than %s days to %s (%s -> %s bytes)",
+                result.rows,
+                self.retention_days,
+                result.path,
+                result.raw_bytes,
+                result.file_bytes,
+                extra={"event": "archive", "rows": result.rows},
+            )
+        return result.rows
+
+    async def _run_archiver(self) -> None:
+        await self._ready.wait()
+        while True:
+            try:
+                await self._refresh_runtime_settings_if_needed()
+                await self.archive_transfers()
+            except Exception:
+                self.log.exception("Failed to archive old transfer rows")
+            await asyncio.sleep(ARCHIVE_CHECK_SECONDS)
+
+    async def _run_dedup_expiry(self) -> None:
+        await self._ready.wait()
+        while True:
+            try:
+                await self.expire_dedup()
+            except Exception:
+                self.log.exception("Failed to expire old dedup entries")
+            await asyncio.sleep(DEDUP_EXPIRY_SECONDS)
+
+    async def _warm_next_index(self) -> None:
+        next_index = await asyncio.to_thread(self.config_manager.next_npvt_index)
+        # Sends may have advanced the counter while the count query was in flight.
+        self._next_index = next_index if self._next_index is None else max(self._next_index, next_index)
+
+    async def _warm_rate_state(self) -> None:
+        learned = await asyncio.to_thread(self.rate_state_manager.load_all)
+        self.rate_controller.restore(learned)
+
+    async def flush_rate_state(self) -> None:
+        """Persist the send intervals learned since the last flush."""
+        for rate_key, state in self.rate_controller.drain_dirty().items():
+            await asyncio.to_thread(self.rate_state_manager.save, rate_key, state.interval, state.flood_waits)
+
+    async def _run_rate_state_flush(self) -> None:
+        while True:
+            await asyncio.sleep(RATE_STATE_FLUSH_SECONDS)
+            try:
+                await self.flush_rate_state()
+            except Exception:
+                self.log.exception("Failed to persist adaptive send rates")
+
+    def effective_rates(self) -> dict[int, tuple[float, int]]:
+        """Destination chat ID -> (current send interval, FloodWaits seen), for the panel."""
+        rates: dict[int, tuple[float, int]] = {}
+        account_interval = self.rate_controller.interval_for(ACCOUNT_KEY)
+        for rate_key, state in self.rate_controller.snapshot().items():
+            if rate_key.startswith("dest:"):
+                rates[int(rate_key[5:])] = (max(state.interval, account_interval), state.flood_waits)
+        return rates
+
+    async def _warm_entities(self) -> None:
+        chat_ids = list(self._source_map.keys()) + list(self._source_map.values())
+        resolved = await self.entities.prefetch(self.client, chat_ids)
+        self.log.info("Entity cache warm: %s/%s mapped chats resolved", resolved, len(set(chat_ids)))
 
     def start(self) -> None:
-        if self._worker_task is None:
-            self._worker_task = asyncio.create_task(self._run_worker(), name="npvt-relay-worker")
-            self._worker_task.add_done_callback(self._on_worker_done)
+        if not self._worker_tasks:
+            for name, stage in (
+                ("prepare", self._run_prepare_stage),
+                ("upload", self._run_upload_stage),
+                ("send", self._run_send_stage),
+                ("log", self._run_log_stage),
+            ):
+                task = asyncio.create_task(stage(), name=f"npvt-relay-{name}")
+                task.add_done_callback(self._on_worker_done)
+                self._worker_tasks.append(task)
 
         self.client.add_event_handler(self._on_new_message, events.NewMessage(incoming=True))
         self.log.info(
-            "NPVT relay enabled (caption=%s, rate_limit=%.1fs, file_prefix=%s, relay_enabled=%s, dedup_enabled=%s, queue=unbounded)",
+            "NPVT relay enabled (caption=%s, rate_limit=%.1fs, file_prefix=%s, relay_enabled=%s, dedup_enabled=%s, pipeline_depth=%s)",
             self.caption,
             self.send_interval_seconds,
             self.file_prefix,
             self.relay_enabled,
             self.dedup_enabled,
+            PIPELINE_DEPTH,
         )
 
     def _on_worker_done(self, task: asyncio.Task) -> None:
         try:
             task.result()
         except asyncio.CancelledError:
-            self.log.info("NPVT relay worker stopped")
+            self.log.info("NPVT relay stage %s stopped", task.get_name())
         except Exception:
-            self.log.exception("NPVT relay worker crashed")
+            self.log.exception("NPVT relay stage %s crashed", task.get_name())
 
     async def _on_new_message(self, event: events.NewMessage.Event) -> None:
         if event.chat_id is None or event.message is None:
             return
+        ingress_at = time.time()
 
+        await self._ready.wait()
         await self._refresh_runtime_settings_if_needed()
         if not self.relay_enabled:
             return
@@ -96,6 +632,8 @@ class NPVTRelayService:
             source_chat_id=source_chat_id,
             destination_chat_id=destination_chat_id,
             message_id=event.message.id,
+            source_date=event.message.date.timestamp() if event.message.date else None,
+            ingress_at=ingress_at,
         )
 
         await self._queue.put(job)
@@ -106,6 +644,7 @@ class NPVTRelayService:
             destination_chat_id,
             event.message.id,
             self._queue.qsize(),
+            extra={"event": "queued", "queue_size": self._queue.qsize(), **job.log_fields()},
         )
 
     async def _refresh_runtime_settings_if_needed(self, force: bool = False) -> None:
@@ -126,6 +665,23 @@ class NPVTRelayService:
             self.source_cache_seconds = max(5, int(settings["source_cache_seconds"]))
             self.relay_enabled = bool(settings["relay_enabled"])
             self.dedup_enabled = bool(settings["dedup_enabled"])
+            dedup_policy = (float(settings["dedup_window_days"]), str(settings["dedup_scope"]))
+            if dedup_policy != (self.dedup_window_days, self.dedup_scope):
+                # Cached keys were built and timed for the old policy; MySQL answers until they refill.
+                self.dedup_window_days, self.dedup_scope = dedup_policy
+                self._seen_file_ids.clear()
+                self._seen_file_hashes.clear()
+            self.retention_days = int(settings["retention_days"])
+            self.parallel_transfers = bool(settings["parallel_transfers"])
+            self.chunked.workers = int(settings["transfer_workers"])
+            self.album_window_seconds = float(settings["album_window_seconds"])
+            self.bundle_interval_seconds = float(settings["bundle_interval_seconds"])
+            self.bundle_max_bytes = int(settings["bundle_max_bytes"])
+            self.rate_controller.configure(
+                self.send_interval_seconds,
+                float(settings["send_interval_min_seconds"]),
+                float(settings["send_interval_max_seconds"]),
+            )
             self._settings_last_refresh = time.monotonic()
 
     async def _resolve_destination(self, source_chat_id: int) -> int | None:
@@ -134,132 +690,645 @@ class NPVTRelayService:
             await self._refresh_source_map()
         return self._source_map.get(source_chat_id)
 
-    async def _refresh_source_map(self) -> None:
+    async def _refresh_source_map(self, force: bool = False) -> None:
         async with self._map_lock:
             now = time.monotonic()
-            if self._source_map and now - self._map_updated_at < self.source_cache_seconds:
+            if not force and self._source_map and now - self._map_updated_at < self.source_cache_seconds:
                 return
 
-            rows = await asyncio.to_thread(self.channel_manager.get_all_channels)
-            source_map: dict[int, int] = {}
+            source_map, destination_modes = await asyncio.to_thread(self._load_source_map)
+            self._source_map = source_map
+            self._destination_modes = destination_modes
+            self._map_updated_at = time.monotonic()
 
-            for row in rows:
-                try:
-                    source_id = int(row["source_channel_id"])
-                    destination_id = int(row["destination_channel_id"])
-                except (KeyError, TypeError, ValueError):
-                    continue
+    def _load_source_map(self) -> tuple[dict[int, int], dict[int, str]]:
+        """Build the source and delivery-mode maps from a streamed read of ``channels`` (runs in a thread)."""
+        source_map: dict[int, int] = {}
+        destination_modes: dict[int, str] = {}
 
-                if str(source_id).startswith("-100") and str(destination_id).startswith("-100"):
-                    source_map[source_id] = destination_id
+        for _, source_value, destination_value, delivery_mode in self.channel_manager.iter_mappings():
+            try:
+                source_id = int(source_value)
+                destination_id = int(destination_value)
+            except (TypeError, ValueError):
+                continue
 
-            self._source_map = source_map
-            self._map_updated_at = time.monotonic()
+            if str(source_id).startswith("-100") and str(destination_id).startswith("-100"):
+                source_map[source_id] = destination_id
+                # Grouping happens per destination: one grouped mapping is enough to group it.
+                mode = str(delivery_mode or DELIVERY_SINGLE)
+                if destination_modes.get(destination_id, DELIVERY_SINGLE) == DELIVERY_SINGLE:
+                    destination_modes[destination_id] = mode
+        return source_map, destination_modes
 
-    async def _run_worker(self) -> None:
-        await self._refresh_runtime_settings_if_needed(force=True)
-        while True:
-            job = await self._queue.get()
-            should_requeue = False
+    async def _duplicate_keys(self, seen: TTLCache[str, bool], inflight: set[str], keys: dict[str, bytes]) -> set[str]:
+        """Return which scoped ``keys`` (key -> digest) were relayed within the window or are in flight.
 
+        Cache misses cost one query; rows from other sources or destinations
+        come back too and are simply cached under their own scoped keys.
+        """
+        duplicates = {key for key in keys if key in seen or key in inflight}
+        unknown = {digest for key, digest in keys.items() if key not in duplicates}
+        if unknown:
+            matches = await asyncio.to_thread(self.dedup_manager.matches, list(unknown), self._dedup_since())
+            for digest, source_chat_id, destination_chat_id, seen_at in matches:
+                key = self._dedup_key(digest.hex(), source_chat_id, destination_chat_id)
+                seen.set(key, True, self._dedup_ttl(seen_at))
+                if key in keys:
+                    duplicates.add(key)
+        return duplicates
+
+    async def _reserve_npvt_index(self) -> int:
+        """Hand out the next file number; numbers are reserved at upload time so later stages can overlap."""
+        if self._next_index is None:
+            await self._warm_next_index()
+        index = int(self._next_index)
+        self._next_index = index + 1
+        return index
+
+    def _release(self, transfer: RelayTransfer, delivered: bool) -> None:
+        transfer.file_bytes = None
+        if transfer.bundle is not None:
+            for member in transfer.bundle.members:
+                keys = self._transfer_keys(member.file_id, member.file_hash, member.source_chat_id, member.destination_chat_id)
+                self._release_keys(*keys, delivered)
+            return
+        self._release_keys(transfer.file_id_key, transfer.hash_key, delivered)
+
+    def _release_keys(self, file_id_key: str | None, hash_key: str | None, delivered: bool) -> None:
+        if file_id_key is not None:
+            self._inflight_file_ids.discard(file_id_key)
+            if delivered:
+                self._seen_file_ids.set(file_id_key, True, self._dedup_ttl())
+        if hash_key is not None:
+            self._inflight_hashes.discard(hash_key)
+            if delivered:
+                self._seen_file_hashes.set(hash_key, True, self._dedup_ttl())
+
+    async def _wait_until_enabled(self) -> None:
+        await self._refresh_runtime_settings_if_needed()
+        while not self.relay_enabled:
+            await asyncio.sleep(2.0)
+            await self._refresh_runtime_settings_if_needed()
+
+    async def _run_prepare_stage(self) -> None:
+        """Ingress -> fetch, dedup by file_id, download, hash, dedup by hash.
+
+        Jobs that are already waiting are taken together (up to
+        ``PREPARE_BATCH_SIZE``), so a burst costs one message fetch per source
+        and one dedup query per key type instead of one per job.
+        """
+        await self._ready.wait()
+        while True:
+            jobs = [await self._queue.get()]
+            while len(jobs) < PREPARE_BATCH_SIZE and not self._queue.empty():
+                jobs.append(self._queue.get_nowait())
+            dequeued_at = time.time()
             try:
-                await self._refresh_runtime_settings_if_needed()
-                if not self.relay_enabled:
+                await self._wait_until_enabled()
+                started = time.perf_counter()
+                transfers = await self._prepare_batch(jobs)
+                prepare_ms = round((time.perf_counter() - started) * 1000, 1)
+                for transfer in transfers:
+                    transfer.timings["prepare_ms"] = prepare_ms
+                    transfer.marks["dequeued"] = dequeued_at
+                    await self._upload_queue.put(transfer)
+            except FloodWaitError as error:
+                self.log.warning(
+                    "FloodWait %ss while fetching from source %s. Requeueing %s message(s) starting with %s",
+                    error.seconds,
+                    jobs[0].source_chat_id,
+                    len(jobs),
+                    jobs[0].message_id,
+                )
+                await asyncio.sleep(float(error.seconds))
+                for job in jobs:
                     await self._queue.put(job)
-                    await asyncio.sleep(2.0)
-                    continue
-                message = await self.client.get_messages(job.source_chat_id, ids=job.message_id)
-                if not message or not self._is_npvt_file(message):
-                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.log.exception(
+                    "Failed to relay %s NPVT message(s) starting with %s from source %s",
+                    len(jobs),
+                    jobs[0].message_id,
+                    jobs[0].source_chat_id,
+                )
+            finally:
+                for _ in jobs:
+                    self._queue.task_done()
 
-                source_file_id = "not_set"
-                if message.file is not None and getattr(message.file, "id", None) is not None:
-                    source_file_id = str(message.file.id)
+    async def _fetch_messages(self, jobs: list[RelayJob]) -> dict[RelayJob, object]:
+        """Fetch the jobs' messages with one ``get_messages`` call per source chat."""
+        by_source: dict[int, list[RelayJob]] = {}
+        for job in jobs:
+            by_source.setdefault(job.source_chat_id, []).append(job)
 
-                if self.dedup_enabled and source_file_id != "not_set":
-                    exists_by_id = await asyncio.to_thread(self.config_manager.exists_file_id, source_file_id)
-                    if exists_by_id:
+        messages: dict[RelayJob, object] = {}
+        for source_chat_id, source_jobs in by_source.items():
+            source_peer = await self.entities.input_peer(self.client, source_chat_id)
+            fetched = await self.client.get_messages(source_peer, ids=[job.message_id for job in source_jobs])
+            for job, message in zip(source_jobs, fetched):
+                if message is not None:
+                    messages[job] = message
+        return messages
+
+    async def _prepare_batch(self, jobs: list[RelayJob]) -> list[RelayTransfer]:
+        messages = await self._fetch_messages(jobs)
+        candidates: list[tuple[RelayTransfer, object]] = []
+        for job in jobs:
+            message = messages.get(job)
+            if not message or not self._is_npvt_file(message):
+                continue
+            transfer = RelayTransfer(job=job)
+            if message.file is not None and getattr(message.file, "id", None) is not None:
+                transfer.file_id = str(message.file.id)
+                transfer.file_id_key, _ = self._transfer_keys(
+                    transfer.file_id, None, job.source_chat_id, job.destination_chat_id
+                )
+            candidates.append((transfer, message))
+
+        if self.dedup_enabled:
+            duplicates = await self._duplicate_keys(
+                self._seen_file_ids,
+                self._inflight_file_ids,
+                {
+                    transfer.file_id_key: DedupManager.file_id_digest(transfer.file_id)
+                    for transfer, _ in candidates
+                    if transfer.file_id_key is not None
+                },
+            )
+            kept: list[tuple[RelayTransfer, object]] = []
+            for transfer, message in candidates:
+                if transfer.file_id_key is not None:
+                    # The in-flight check also catches the same file twice within this batch.
+                    if transfer.file_id_key in duplicates or transfer.file_id_key in self._inflight_file_ids:
+                        job = transfer.job
                         self.log.info(
                             "Duplicate skipped by file_id: source=%s message=%s file_id=%s",
                             job.source_chat_id,
                             job.message_id,
-                            source_file_id,
+                            transfer.file_id,
+                            extra={"event": "duplicate", "dedup_key": "file_id", **job.log_fields()},
                         )
                         continue
+                    self._inflight_file_ids.add(transfer.file_id_key)
+                kept.append((transfer, message))
+            candidates = kept
+        else:
+            for transfer, _ in candidates:
+                transfer.file_id_key = None
 
-                file_bytes = await message.download_media(file=bytes)
+        downloaded: list[tuple[RelayTransfer, bytes, str, str]] = []
+        try:
+            for transfer, message in candidates:
+                job = transfer.job
+                try:
+                    file_bytes = await self._download(message)
+                except (FloodWaitError, asyncio.CancelledError):
+                    raise
+                except Exception:
+                    self.log.exception("Failed to download .npvt message %s from %s", job.message_id, job.source_chat_id)
+                    self._release(transfer, delivered=False)
+                    continue
                 if file_bytes is None:
                     self.log.warning("Could not download .npvt message %s from %s", job.message_id, job.source_chat_id)
+                    self._release(transfer, delivered=False)
                     continue
+                transfer.marks["downloaded"] = time.time()
+                file_hash = await run_cpu("hash", sha256_hex, file_bytes)
+                _, hash_key = self._transfer_keys(None, file_hash, job.source_chat_id, job.destination_chat_id)
+                downloaded.append((transfer, file_bytes, file_hash, hash_key))
 
-                file_hash = hashlib.sha256(file_bytes).hexdigest()
-                if self.dedup_enabled:
-                    exists_by_hash = await asyncio.to_thread(self.config_manager.exists_file_hash, file_hash)
-                    if exists_by_hash:
-                        self.log.info(
-                            "Duplicate skipped by file_hash: source=%s message=%s hash=%s",
-                            job.source_chat_id,
-                            job.message_id,
-                            file_hash[:12],
-                        )
-                        continue
+            duplicates: set[str] = set()
+            if self.dedup_enabled:
+                duplicates = await self._duplicate_keys(
+                    self._seen_file_hashes,
+                    self._inflight_hashes,
+                    {hash_key: bytes.fromhex(file_hash) for _, _, file_hash, hash_key in downloaded},
+                )
+        except BaseException:
+            for transfer, _ in candidates:
+                self._release(transfer, delivered=False)
+            raise
 
-                next_index = await asyncio.to_thread(self.config_manager.next_npvt_index)
-                file_name = f"{self.file_prefix} ({next_index}).npvt"
-                uploaded = await self.client.upload_file(file_bytes, file_name=file_name)
+        transfers: list[RelayTransfer] = []
+        for transfer, file_bytes, file_hash, hash_key in downloaded:
+            if self.dedup_enabled and (hash_key in duplicates or hash_key in self._inflight_hashes):
+                job = transfer.job
+                self.log.info(
+                    "Duplicate skipped by file_hash: source=%s message=%s hash=%s",
+                    job.source_chat_id,
+                    job.message_id,
+                    file_hash[:12],
+                    extra={"event": "duplicate", "dedup_key": "file_hash", "hash": file_hash[:12], **job.log_fields()},
+                )
+                self._release(transfer, delivered=False)
+                continue
+            transfer.file_bytes = file_bytes
+            transfer.file_hash = file_hash
+            transfer.hash_key = hash_key
+            self._inflight_hashes.add(hash_key)
+            transfers.append(transfer)
+        return transfers
 
-                sent_message = await self.client.send_file(
-                    job.destination_chat_id,
-                    uploaded,
-                    caption=self.caption,
-                    force_document=True,
+    async def _run_upload_stage(self) -> None:
+        """Number the file and upload it while the send stage is still pacing earlier transfers.
+
+        Files for bundle-mode destinations are written into the destination's
+        open archive instead; only a sealed archive moves on to the send stage.
+        """
+        while True:
+            transfer = await self._upload_queue.get()
+            try:
+                if transfer.bundle is None:
+                    if transfer.file_name is None:
+                        transfer.index = await self._reserve_npvt_index()
+                        transfer.file_name = f"{self.file_prefix} ({transfer.index}).npvt"
+                    if self._destination_modes.get(transfer.job.destination_chat_id) == DELIVERY_BUNDLE:
+                        sealed = await self._add_to_bundle(transfer)
+                        if sealed is None:
+                            continue
+                        transfer = self._bundle_transfer(sealed)
+                started = time.perf_counter()
+                await self._retry_on_flood_wait("uploading", transfer, lambda: self._upload(transfer))
+                transfer.timings["upload_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                transfer.marks["uploaded"] = time.time()
+                await self._send_queue.put(transfer)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._release(transfer, delivered=False)
+                self.log.exception(
+                    "Failed to upload NPVT message %s from source %s",
+                    transfer.job.message_id,
+                    transfer.job.source_chat_id,
                 )
+            finally:
+                self._upload_queue.task_done()
+
+    async def _upload(self, transfer: RelayTransfer) -> None:
+        if transfer.bundle is not None:
+            uploaded = await self._upload_file(transfer.bundle.path, transfer.file_name)
+            transfer.media = CachedMedia(input_file=uploaded)
+            return
+
+        cached = self.media_cache.get(transfer.file_hash)
+        if cached is None:
+            uploaded = await self._upload_file(transfer.file_bytes, transfer.file_name)
+            cached = self.media_cache.remember_upload(transfer.file_hash, uploaded)
+        else:
+            self.log.info("NPVT upload skipped (media cache hit): hash=%s", transfer.file_hash[:12])
+        transfer.media = cached
 
+    async def _restore_bundles(self) -> None:
+        """Resume open bundles and queue sealed ones that were never posted, keeping their files deduped."""
+        open_bundles = await asyncio.to_thread(self.bundle_store.open_bundles)
+        sealed_bundles = await asyncio.to_thread(self.bundle_store.sealed)
+        members = [member for bundle in open_bundles.values() for member in bundle.members]
+        members += [member for bundle in sealed_bundles for member in bundle.members]
+        if not members:
+            return
+
+        for member in members:
+            file_id_key, hash_key = self._transfer_keys(
+                member.file_id, member.file_hash, member.source_chat_id, member.destination_chat_id
+            )
+            if file_id_key is not None:
+                self._inflight_file_ids.add(file_id_key)
+            self._inflight_hashes.add(hash_key)
+        next_index = max(member.index for member in members) + 1
+        self._next_index = next_index if self._next_index is None else max(self._next_index, next_index)
+        self._bundles.update(open_bundles)
+        if sealed_bundles:
+            self._spawn(self._requeue_sealed_bundles(sealed_bundles), "npvt-relay-bundle-resume")
+        self.log.info(
+            "NPVT bundles resumed from disk (open=%s, sealed=%s, files=%s)",
+            len(open_bundles),
+            len(sealed_bundles),
+            len(members),
+        )
+
+    async def _requeue_sealed_bundles(self, sealed_bundles: list[SealedBundle]) -> None:
+        await self._ready.wait()
+        for sealed in sealed_bundles:
+            await self._upload_queue.put(self._bundle_transfer(sealed))
+
+    async def _add_to_bundle(self, transfer: RelayTransfer) -> SealedBundle | None:
+        """Write the file into its destination's open archive; return the archive once it is big enough to post."""
+        job = transfer.job
+        member = BundleMember(
+            source_chat_id=job.source_chat_id,
+            destination_chat_id=job.destination_chat_id,
+            message_id=job.message_id,
+            file_id=transfer.file_id,
+            file_hash=transfer.file_hash,
+            file_name=transfer.file_name,
+            index=transfer.index,
+        )
+        async with self._bundle_lock:
+            bundle = self._bundles.get(job.destination_chat_id)
+            if bundle is None:
+                bundle = OpenBundle(destination_chat_id=job.destination_chat_id, opened_at=time.time())
+                self._bundles[job.destination_chat_id] = bundle
+            size = await run_cpu("bundle", self.bundle_store.append, bundle, member, transfer.file_bytes)
+            transfer.file_bytes = None
+            self.log.info(
+                "NPVT bundled: source=%s destination=%s message=%s as %s (bundle: %s files, %s bytes)",
+                job.source_chat_id,
+                job.destination_chat_id,
+                job.message_id,
+                transfer.file_name,
+                len(bundle.members),
+                size,
+                extra={
+                    "event": "bundled",
+                    "file_name": transfer.file_name,
+                    "hash": transfer.file_hash[:12],
+                    "bundle_files": len(bundle.members),
+                    "bundle_bytes": size,
+                    **job.log_fields(),
+                },
+            )
+            if size < self.bundle_max_bytes:
+                return None
+            return await self._seal_bundle(job.destination_chat_id)
+
+    async def _seal_bundle(self, destination_chat_id: int) -> SealedBundle | None:
+        """Close the destination's open archive; the caller must hold ``_bundle_lock``."""
+        bundle = self._bundles.pop(destination_chat_id, None)
+        if bundle is None:
+            return None
+        return await asyncio.to_thread(self.bundle_store.seal, bundle)
+
+    def _bundle_transfer(self, sealed: SealedBundle) -> RelayTransfer:
+        first = sealed.members[0]
+        low = min(member.index for member in sealed.members)
+        high = max(member.index for member in sealed.members)
+        span = str(low) if low == high else f"{low}-{high}"
+        return RelayTransfer(
+            job=RelayJob(first.source_chat_id, sealed.destination_chat_id, first.message_id),
+            file_name=f"{self.file_prefix} ({span}).zip",
+            bundle=sealed,
+        )
+
+    async def _run_bundle_timer(self) -> None:
+        """Seal bundles that have been open for longer than the bundle interval."""
+        while True:
+            await asyncio.sleep(BUNDLE_CHECK_SECONDS)
+            try:
+                now = time.time()
+                due = [
+                    destination_id
+                    for destination_id, bundle in self._bundles.items()
+                    if now - bundle.opened_at >= self.bundle_interval_seconds
+                ]
+                for destination_id in due:
+                    async with self._bundle_lock:
+                        sealed = await self._seal_bundle(destination_id)
+                    if sealed is not None:
+                        await self._upload_queue.put(self._bundle_transfer(sealed))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.log.exception("Failed to seal NPVT bundles")
+
+    async def _run_send_stage(self) -> None:
+        """Send uploaded transfers as soon as pacing allows, grouping album-mode destinations."""
+        while True:
+            timeout = self._next_album_deadline()
+            transfer: RelayTransfer | None = None
+            try:
+                if timeout is None:
+                    transfer = await self._send_queue.get()
+                else:
+                    transfer = await asyncio.wait_for(self._send_queue.get(), max(0.0, timeout - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+
+            if transfer is not None:
+                self._send_queue.task_done()
+                destination_id = transfer.job.destination_chat_id
+                if self._destination_modes.get(destination_id) == DELIVERY_ALBUM:
+                    album = self._albums.setdefault(destination_id, AlbumBuffer(time.monotonic() + self.album_window_seconds))
+                    album.transfers.append(transfer)
+                    if len(album.transfers) >= ALBUM_MAX_ITEMS:
+                        await self._deliver(self._albums.pop(destination_id).transfers)
+                else:
+                    await self._deliver([transfer])
+
+            now = time.monotonic()
+            for destination_id in [key for key, album in self._albums.items() if album.deadline <= now]:
+                await self._deliver(self._albums.pop(destination_id).transfers)
+
+    def _next_album_deadline(self) -> float | None:
+        if not self._albums:
+            return None
+        return min(album.deadline for album in self._albums.values())
+
+    async def _deliver(self, transfers: list[RelayTransfer]) -> None:
+        """Send one file, or several to the same destination as one album, in a single pacing slot."""
+        first = transfers[0]
+        try:
+            await self._wait_until_enabled()
+            rate_keys = (ACCOUNT_KEY, destination_key(first.job.destination_chat_id))
+            delay = self.rate_controller.delay(rate_keys)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            started = time.perf_counter()
+
+            destination_peer = await self.entities.input_peer(self.client, first.job.destination_chat_id)
+            if len(transfers) == 1:
+                first.sent_message = await self._retry_on_flood_wait(
+                    "sending",
+                    first,
+                    lambda: self._send(destination_peer, first),
+                    rate_keys=rate_keys,
+                )
+            else:
+                sent_messages = await self._retry_on_flood_wait(
+                    f"sending album of {len(transfers)}",
+                    first,
+                    lambda: self._send_album(destination_peer, transfers),
+                    rate_keys=rate_keys,
+                )
+                for transfer, sent_message in zip(transfers, sent_messages):
+                    transfer.sent_message = sent_message
+            self.rate_controller.on_success(rate_keys, extra_delay=random.uniform(0.4, 1.2))
+            send_ms = round((time.perf_counter() - started) * 1000, 1)
+            sent_at = time.time()
+            for transfer in transfers:
+                transfer.marks["sent"] = sent_at
+                transfer.timings["pacing_ms"] = round(delay * 1000, 1)
+                transfer.timings["send_ms"] = send_ms
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            for transfer in transfers:
+                self._release(transfer, delivered=False)
+            self.log.exception(
+                "Failed to relay %s NPVT message(s) starting with %s from source %s",
+                len(transfers),
+                first.job.message_id,
+                first.job.source_chat_id,
+            )
+            return
+
+        for transfer in transfers:
+            await self._log_queue.put(transfer)
+
+    async def _retry_on_flood_wait(
+        self,
+        action: str,
+        transfer: RelayTransfer,
+        operation,
+        rate_keys: tuple[str, ...] = (),
+    ):
+        """Retry ``operation`` in place after each FloodWait so the transfer keeps its slot and order.
+
+        With ``rate_keys`` the wait is fed back to the adaptive rate controller,
+        which slows those keys down and decides when the retry may go out.
+        """
+        while True:
+            try:
+                return await operation()
+            except FloodWaitError as error:
+                if rate_keys:
+                    self.rate_controller.on_flood_wait(rate_keys, float(error.seconds))
+                    wait_seconds = self.rate_controller.delay(rate_keys)
+                else:
+                    wait_seconds = max(float(error.seconds), self.send_interval_seconds)
+                self.log.warning(
+                    "FloodWait %ss while %s from source %s. Retrying message %s",
+                    error.seconds,
+                    action,
+                    transfer.job.source_chat_id,
+                    transfer.job.message_id,
+                )
+                await asyncio.sleep(wait_seconds)
+
+    async def _send(self, destination_peer, transfer: RelayTransfer):
+        try:
+            return await self._media_call(
+                "send_file",
+                destination_peer,
+                transfer.media.input_media(transfer.file_name),
+                caption=self.caption,
+                force_document=True,
+            )
+        except FilePartMissingError:
+            # The uploaded parts expired on Telegram's side; upload once more and send.
+            if transfer.file_hash is not None:
+                self.media_cache.discard(transfer.file_hash)
+            await self._upload(transfer)
+            return await self._media_call(
+                "send_file",
+                destination_peer,
+                transfer.media.input_media(transfer.file_name),
+                caption=self.caption,
+                force_document=True,
+            )
+
+    async def _send_album(self, destination_peer, transfers: list[RelayTransfer]) -> list:
+        """Send the files as one grouped-document message; only the first item carries the caption."""
+        captions = [self.caption] + [""] * (len(transfers) - 1)
+        try:
+            sent_messages = await self._media_call(
+                "send_file",
+                destination_peer,
+                [transfer.media.input_media(transfer.file_name) for transfer in transfers],
+                caption=captions,
+                force_document=True,
+            )
+        except FilePartMissingError:
+            # Some cached uploads expired; upload every item fresh and try once more.
+            for transfer in transfers:
+                self.media_cache.discard(transfer.file_hash)
+                await self._upload(transfer)
+            sent_messages = await self._media_call(
+                "send_file",
+                destination_peer,
+                [transfer.media.input_media(transfer.file_name) for transfer in transfers],
+                caption=captions,
+                force_document=True,
+            )
+        return list(sent_messages)
+
+    async def _run_log_stage(self) -> None:
+        while True:
+            transfer = await self._log_queue.get()
+            job = transfer.job
+            try:
+                if transfer.bundle is not None:
+                    await self._log_bundle(transfer)
+                    continue
+                transfer.marks["logged"] = time.time()
+                latency = transfer.latency_ms()
                 await asyncio.to_thread(
                     self.config_manager.log_transfer,
-                    file_id=source_file_id,
-                    file_hash=file_hash,
-                    name=file_name,
-                    from_chat=str(job.source_chat_id),
-                    to_chat=str(job.destination_chat_id),
-                    from_message_id=str(job.message_id),
-                    to_message_id=str(sent_message.id),
+                    file_id=transfer.file_id,
+                    file_hash=transfer.file_hash,
+                    name=transfer.file_name,
+                    from_chat=job.source_chat_id,
+                    to_chat=job.destination_chat_id,
+                    from_message_id=job.message_id,
+                    to_message_id=transfer.sent_message.id,
+                    latency=latency,
                 )
-
                 self.log.info(
                     "NPVT sent: source=%s destination=%s message=%s as %s",
                     job.source_chat_id,
                     job.destination_chat_id,
                     job.message_id,
-                    file_name,
-                )
-            except FloodWaitError as error:
-                should_requeue = True
-                wait_seconds = max(float(error.seconds), self.send_interval_seconds)
-                self.log.warning(
-                    "FloodWait %ss while sending from source %s. Requeueing message %s",
-                    error.seconds,
-                    job.source_chat_id,
-                    job.message_id,
+                    transfer.file_name,
+                    extra={
+                        "event": "sent",
+                        "file_name": transfer.file_name,
+                        "hash": transfer.file_hash[:12],
+                        **transfer.timings,
+                        **{f"latency_{stage}_ms": ms for stage, ms in latency.items() if ms is not None},
+                        **job.log_fields(),
+                    },
                 )
-                await asyncio.sleep(wait_seconds)
             except asyncio.CancelledError:
                 raise
             except Exception:
-                self.log.exception(
-                    "Failed to relay NPVT message %s from source %s",
-                    job.message_id,
-                    job.source_chat_id,
-                )
+                self.log.exception("Failed to log NPVT transfer of message %s from %s", job.message_id, job.source_chat_id)
             finally:
-                self._queue.task_done()
-
-            if should_requeue:
-                await self._queue.put(job)
-                continue
+                # The file is in the destination either way, so it counts as delivered for dedup.
+                self._release(transfer, delivered=True)
+                self._log_queue.task_done()
 
-            pause_seconds = self.send_interval_seconds + random.uniform(0.4, 1.2)
-            await asyncio.sleep(pause_seconds)
+    async def _log_bundle(self, transfer: RelayTransfer) -> None:
+        """Record every member of a posted bundle against the bundle message, then drop the archive."""
+        bundle = transfer.bundle
+        try:
+            for member in bundle.members:
+                await asyncio.to_thread(
+                    self.config_manager.log_transfer,
+                    file_id=member.file_id,
+                    file_hash=member.file_hash,
+                    name=member.file_name,
+                    from_chat=member.source_chat_id,
+                    to_chat=member.destination_chat_id,
+                    from_message_id=member.message_id,
+                    to_message_id=transfer.sent_message.id,
+                )
+        finally:
+            # The archive is in the destination either way; keeping it would post it twice.
+            await asyncio.to_thread(self.bundle_store.discard, bundle)
+        self.log.info(
+            "NPVT bundle sent: destination=%s files=%s as %s",
+            bundle.destination_chat_id,
+            len(bundle.members),
+            transfer.file_name,
+            extra={
+                "event": "bundle_sent",
+                "destination": bundle.destination_chat_id,
+                "file_name": transfer.file_name,
+                "bundle_files": len(bundle.members),
+                **transfer.timings,
+            },
+        )
 
     @staticmethod
     def _is_npvt_file(message) -> bool:
@@ -274,6 +1343,7 @@ class NPVTRelayService:
 
 
 def start_npvt_relay(client: TelegramClient, orm: SimpleORM, log: logging.Logger) -> NPVTRelayService:
+    """Start accepting events right away; jobs are held until :meth:`NPVTRelayService.warm_up` finishes."""
     relay = NPVTRelayService(client=client, orm=orm, log=log)
     relay.start()
     return relay
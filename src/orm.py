@@ -1,18 +1,24 @@
 from __future__ import annotations
 
+import copy
 import re
 from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Any, Generator
+from typing import Any, Callable, Generator, Iterable, Iterator, Sequence
 
 import pymysql
 from pymysql.connections import Connection
-from pymysql.cursors import DictCursor
+from pymysql.cursors import Cursor, DictCursor, SSCursor, SSDictCursor
 
 from src.config import MySQLSettings
 
 
 _IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_ER_NO_SUCH_TABLE = 1146
+# Keeps each IN (...) list well below max_allowed_packet and the optimizer's range limits.
+IN_CHUNK_SIZE = 500
+STREAM_BATCH_SIZE = 1000
+STATEMENT_CACHE_SIZE = 512
 
 
 @dataclass(frozen=True)
@@ -41,13 +47,61 @@ class Column:
         return " ".join(parts)
 
 
+@dataclass(frozen=True)
+class Index:
+    name: str
+    columns: tuple[str, ...]
+    unique: bool = False
+
+    def to_sql(self) -> str:
+        kind = "UNIQUE INDEX" if self.unique else "INDEX"
+        columns_sql = ", ".join(f"`{column}`" for column in self.columns)
+        return f"{kind} `{self.name}` ({columns_sql})"
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    apply: Callable[[Cursor], None]
+
+
+class _TransactionConnection:
+    """The transaction's connection as ORM methods see it: their commits wait for the end of the block."""
+
+    def __init__(self, conn: Connection, cursorclass: type[Cursor]) -> None:
+        self._conn = conn
+        self._cursorclass = cursorclass
+
+    def cursor(self) -> Cursor:
+        return self._conn.cursor(self._cursorclass)
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        self._conn.rollback()
+
+
 class SimpleORM:
+    """Thin PyMySQL wrapper with one short-lived connection per call.
+
+    Generated SQL is cached per (operation, table, column set), so identifiers
+    are validated and quoted once per shape instead of on every call.
+    PyMySQL has no server-side prepared statements (it interpolates
+    parameters client-side and sends COM_QUERY), so the cache stores the
+    finished statement text only.
+    """
+
+    statement_cache_size = STATEMENT_CACHE_SIZE
+
     def __init__(self, host: str, port: int, user: str, password: str, database: str) -> None:
         self.host = host
         self.port = port
         self.user = user
         self.password = password
         self.database = database
+        self._statements: dict[tuple, str] = {}
 
     @classmethod
     def from_settings(cls, settings: MySQLSettings) -> "SimpleORM":
@@ -60,14 +114,14 @@ class SimpleORM:
         )
 
     @contextmanager
-    def _connect(self) -> Generator[Connection, None, None]:
+    def _connect(self, cursorclass: type[Cursor] = DictCursor) -> Generator[Connection, None, None]:
         conn = pymysql.connect(
             host=self.host,
             port=self.port,
             user=self.user,
             password=self.password,
             database=self.database,
-            cursorclass=DictCursor,
+            cursorclass=cursorclass,
             autocommit=False,
             charset="utf8mb4",
             use_unicode=True,
@@ -77,6 +131,33 @@ class SimpleORM:
         finally:
             conn.close()
 
+    @contextmanager
+    def transaction(self) -> Generator["SimpleORM", None, None]:
+        """Run several ORM calls on one connection and commit them together.
+
+        The yielded object has the full ``SimpleORM`` API bound to that
+        connection; an exception rolls every statement back. DDL such as
+        ``TRUNCATE`` still commits implicitly in MySQL.
+
+            with orm.transaction() as tx:
+                tx.upsert("users", {"id": 1, "step": "none"}, update=())
+                user = tx.find_by_id("users", 1)
+        """
+        with self._connect() as conn:
+            session = copy.copy(self)
+
+            @contextmanager
+            def connect(cursorclass: type[Cursor] = DictCursor) -> Generator[_TransactionConnection, None, None]:
+                yield _TransactionConnection(conn, cursorclass)
+
+            session._connect = connect
+            try:
+                yield session
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
     def _validate_identifier(self, name: str) -> None:
         if not _IDENTIFIER.match(name):
             raise ValueError(f"Invalid SQL identifier: {name}")
@@ -85,17 +166,40 @@ class SimpleORM:
         self._validate_identifier(name)
         return f"`{name}`"
 
-    def create_table(self, table: str, columns: list[Column]) -> None:
+    def _statement(self, key: tuple, build: Callable[[], str]) -> str:
+        sql = self._statements.get(key)
+        if sql is None:
+            sql = build()
+            if len(self._statements) < self.statement_cache_size:
+                self._statements[key] = sql
+        return sql
+
+    def _select_list(self, columns: Sequence[str] | None) -> str:
+        if not columns:
+            return "*"
+        return ", ".join(self._quote_identifier(column) for column in columns)
+
+    def _where_sql(self, filters: dict[str, Any]) -> str:
+        return " AND ".join(f"{self._quote_identifier(key)} = %s" for key in filters.keys())
+
+    def create_table_sql(self, table: str, columns: list[Column], indexes: list[Index] | None = None) -> str:
         table_name = self._quote_identifier(table)
         for col in columns:
             self._validate_identifier(col.name)
+        for index in indexes or []:
+            self._validate_identifier(index.name)
+            for column_name in index.columns:
+                self._validate_identifier(column_name)
 
-        column_sql = ", ".join(col.to_sql() for col in columns)
-        sql = (
+        column_sql = ", ".join([col.to_sql() for col in columns] + [index.to_sql() for index in indexes or []])
+        return (
             f"CREATE TABLE IF NOT EXISTS {table_name} ({column_sql}) "
             "DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
         )
 
+    def create_table(self, table: str, columns: list[Column], indexes: list[Index] | None = None) -> None:
+        sql = self.create_table_sql(table, columns, indexes)
+
         with self._connect() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(sql)
@@ -127,15 +231,84 @@ class SimpleORM:
                     cursor.execute(add_sql)
             conn.commit()
 
-    def insert(self, table: str, values: dict[str, Any]) -> int:
-        table_name = self._quote_identifier(table)
-        keys = list(values.keys())
-        for key in keys:
-            self._validate_identifier(key)
+    def execute(self, sql: str, params: list[Any] | None = None) -> int:
+        """Run a trusted statement built by the caller and return the affected row count."""
+        with self._connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params or [])
+                affected = int(cursor.rowcount)
+            conn.commit()
+        return affected
+
+    def migrate(self, migrations: list[Migration], lock_timeout: int = 120) -> list[Migration]:
+        """Apply pending migrations in version order and return the ones applied.
+
+        Everything runs on one connection. A warm start, where the recorded
+        version is already the latest, costs a single ``SELECT``. Otherwise a
+        named ``GET_LOCK`` serialises concurrent starts, and the version is
+        re-read under the lock so each step runs exactly once.
+        """
+        if not migrations:
+            return []
+        pending = sorted(migrations, key=lambda migration: migration.version)
+        latest = pending[-1].version
+        lock_name = f"{self.database}.schema_migrations"
+        applied: list[Migration] = []
 
-        placeholders = ", ".join("%s" for _ in keys)
-        columns_sql = ", ".join(self._quote_identifier(key) for key in keys)
-        sql = f"INSERT INTO {table_name} ({columns_sql}) VALUES ({placeholders})"
+        with self._connect() as conn:
+            with conn.cursor() as cursor:
+                if self._schema_version(cursor) >= latest:
+                    return []
+
+                cursor.execute("SELECT GET_LOCK(%s, %s) AS acquired", [lock_name, lock_timeout])
+                row = cursor.fetchone() or {"acquired": 0}
+                if row["acquired"] != 1:
+                    raise RuntimeError(f"Timed out waiting for migration lock {lock_name}")
+
+                try:
+                    cursor.execute(
+                        "CREATE TABLE IF NOT EXISTS `schema_version` ("
+                        "`version` INT NOT NULL PRIMARY KEY, "
+                        "`name` VARCHAR(255) NOT NULL, "
+                        "`applied_at` DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3)"
+                        ") DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
+                    )
+                    current = self._schema_version(cursor)
+                    for migration in pending:
+                        if migration.version <= current:
+                            continue
+                        migration.apply(cursor)
+                        cursor.execute(
+                            "INSERT INTO `schema_version` (`version`, `name`) VALUES (%s, %s)",
+                            [migration.version, migration.name],
+                        )
+                        conn.commit()
+                        applied.append(migration)
+                finally:
+                    cursor.execute("DO RELEASE_LOCK(%s)", [lock_name])
+        return applied
+
+    @staticmethod
+    def _schema_version(cursor: Cursor) -> int:
+        try:
+            cursor.execute("SELECT COALESCE(MAX(`version`), 0) AS version FROM `schema_version`")
+        except pymysql.err.ProgrammingError as error:
+            if error.args and error.args[0] == _ER_NO_SUCH_TABLE:
+                return 0
+            raise
+        row = cursor.fetchone() or {"version": 0}
+        return int(row["version"])
+
+    def insert(self, table: str, values: dict[str, Any]) -> int:
+        keys = tuple(values.keys())
+        sql = self._statement(
+            ("insert", table, keys),
+            lambda: (
+                f"INSERT INTO {self._quote_identifier(table)} "
+                f"({', '.join(self._quote_identifier(key) for key in keys)}) "
+                f"VALUES ({', '.join('%s' for _ in keys)})"
+            ),
+        )
 
         with self._connect() as conn:
             with conn.cursor() as cursor:
@@ -144,12 +317,77 @@ class SimpleORM:
             conn.commit()
         return new_id
 
-    def all(self, table: str, order_by: str | None = "id") -> list[dict[str, Any]]:
-        table_name = self._quote_identifier(table)
-        if order_by is None:
-            sql = f"SELECT * FROM {table_name}"
-        else:
-            sql = f"SELECT * FROM {table_name} ORDER BY {self._quote_identifier(order_by)}"
+    def insert_many(self, table: str, rows: Sequence[dict[str, Any]]) -> int:
+        """Insert rows sharing one column set with a single ``executemany``; return the affected-row count.
+
+        PyMySQL folds ``executemany`` on an ``INSERT ... VALUES`` into multi-row
+        statements, so this is a handful of round trips instead of one per row.
+        """
+        if not rows:
+            return 0
+        keys = tuple(rows[0].keys())
+        sql = self._statement(
+            ("insert", table, keys),
+            lambda: (
+                f"INSERT INTO {self._quote_identifier(table)} "
+                f"({', '.join(self._quote_identifier(key) for key in keys)}) "
+                f"VALUES ({', '.join('%s' for _ in keys)})"
+            ),
+        )
+
+        with self._connect() as conn:
+            with conn.cursor() as cursor:
+                affected = int(cursor.executemany(sql, [[row[key] for key in keys] for row in rows]) or 0)
+            conn.commit()
+        return affected
+
+    def upsert(self, table: str, values: dict[str, Any], update: Sequence[str] | None = None) -> int:
+        """``INSERT ... ON DUPLICATE KEY UPDATE`` in one round trip.
+
+        ``update`` names the columns to overwrite from ``values`` when a unique
+        key already exists (default: all of them); an empty sequence keeps the
+        existing row untouched. Returns MySQL's affected-row count: 1 for an
+        insert, 2 for an update, 0 when nothing changed.
+        """
+        keys = tuple(values.keys())
+        update_keys = keys if update is None else tuple(update)
+
+        def build() -> str:
+            columns_sql = ", ".join(self._quote_identifier(key) for key in keys)
+            if update_keys:
+                update_sql = ", ".join(
+                    f"{self._quote_identifier(key)} = VALUES({self._quote_identifier(key)})" for key in update_keys
+                )
+            else:
+                first = self._quote_identifier(keys[0])
+                update_sql = f"{first} = {first}"
+            return (
+                f"INSERT INTO {self._quote_identifier(table)} ({columns_sql}) "
+                f"VALUES ({', '.join('%s' for _ in keys)}) ON DUPLICATE KEY UPDATE {update_sql}"
+            )
+
+        sql = self._statement(("upsert", table, keys, update_keys), build)
+
+        with self._connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, [values[key] for key in keys])
+                affected = int(cursor.rowcount)
+            conn.commit()
+        return affected
+
+    def all(
+        self,
+        table: str,
+        order_by: str | None = "id",
+        columns: Sequence[str] | None = None,
+    ) -> list[dict[str, Any]]:
+        def build() -> str:
+            sql = f"SELECT {self._select_list(columns)} FROM {self._quote_identifier(table)}"
+            if order_by is not None:
+                sql += f" ORDER BY {self._quote_identifier(order_by)}"
+            return sql
+
+        sql = self._statement(("all", table, tuple(columns or ()), order_by), build)
 
         with self._connect() as conn:
             with conn.cursor() as cursor:
@@ -157,9 +395,161 @@ class SimpleORM:
                 rows = cursor.fetchall()
         return list(rows)
 
+    def iter_rows(
+        self,
+        table: str,
+        columns: Sequence[str] | None = None,
+        order_by: str | None = "id",
+        descending: bool = False,
+        limit: int | None = None,
+        as_tuples: bool = False,
+        batch_size: int = STREAM_BATCH_SIZE,
+    ) -> Iterator[dict[str, Any] | tuple]:
+        """Stream rows through an unbuffered server-side cursor so memory stays flat on big tables.
+
+        The connection stays open until the generator is exhausted or closed,
+        so consume it promptly (typically inside ``asyncio.to_thread``) and do
+        not run other queries on the same thread in between. ``as_tuples``
+        yields plain tuples in ``columns`` order instead of one dict per row.
+        """
+        def build() -> str:
+            sql = f"SELECT {self._select_list(columns)} FROM {self._quote_identifier(table)}"
+            if order_by is not None:
+                sql += f" ORDER BY {self._quote_identifier(order_by)}{' DESC' if descending else ''}"
+            if limit is not None:
+                sql += " LIMIT %s"
+            return sql
+
+        sql = self._statement(("iter_rows", table, tuple(columns or ()), order_by, descending, limit is not None), build)
+        params: list[Any] = [int(limit)] if limit is not None else []
+
+        with self._connect(SSCursor if as_tuples else SSDictCursor) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield from rows
+
+    def iter_since(
+        self,
+        table: str,
+        column: str,
+        since: Any,
+        columns: Sequence[str] | None = None,
+        descending: bool | None = None,
+        limit: int | None = None,
+        as_tuples: bool = False,
+        batch_size: int = STREAM_BATCH_SIZE,
+    ) -> Iterator[dict[str, Any] | tuple]:
+        """Stream rows with ``column >= since`` (an index range scan) like :meth:`iter_rows`.
+
+        Rows come in no particular order unless ``descending`` is given, which
+        orders them by ``column`` itself.
+        """
+        def build() -> str:
+            sql = (
+                f"SELECT {self._select_list(columns)} FROM {self._quote_identifier(table)} "
+                f"WHERE {self._quote_identifier(column)} >= %s"
+            )
+            if descending is not None:
+                sql += f" ORDER BY {self._quote_identifier(column)}{' DESC' if descending else ''}"
+            if limit is not None:
+                sql += " LIMIT %s"
+            return sql
+
+        sql = self._statement(("iter_since", table, column, tuple(columns or ()), descending, limit is not None), build)
+        params: list[Any] = [since] + ([int(limit)] if limit is not None else [])
+
+        with self._connect(SSCursor if as_tuples else SSDictCursor) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield from rows
+
+    def page_after(
+        self,
+        table: str,
+        after_id: int | None,
+        limit: int,
+        columns: Sequence[str] | None = None,
+        as_tuples: bool = False,
+    ) -> list[dict[str, Any] | tuple]:
+        """One keyset page: rows with ``id > after_id`` in ``id`` order.
+
+        Unlike ``LIMIT ... OFFSET`` every page is an index range scan, so the
+        last page costs the same as the first.
+        """
+        def build() -> str:
+            sql = f"SELECT {self._select_list(columns)} FROM {self._quote_identifier(table)}"
+            if after_id is not None:
+                sql += " WHERE `id` > %s"
+            return sql + " ORDER BY `id` LIMIT %s"
+
+        sql = self._statement(("page_after", table, tuple(columns or ()), after_id is not None), build)
+        params: list[Any] = [int(after_id)] if after_id is not None else []
+        params.append(int(limit))
+
+        with self._connect(Cursor if as_tuples else DictCursor) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+        return list(rows)
+
+    def page_before(
+        self,
+        table: str,
+        before_id: int,
+        limit: int,
+        columns: Sequence[str] | None = None,
+        as_tuples: bool = False,
+    ) -> list[dict[str, Any] | tuple]:
+        """The keyset page that ends just before ``before_id``, still in ascending ``id`` order."""
+        def build() -> str:
+            return (
+                f"SELECT {self._select_list(columns)} FROM {self._quote_identifier(table)} "
+                "WHERE `id` < %s ORDER BY `id` DESC LIMIT %s"
+            )
+
+        sql = self._statement(("page_before", table, tuple(columns or ())), build)
+
+        with self._connect(Cursor if as_tuples else DictCursor) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, [int(before_id), int(limit)])
+                rows = cursor.fetchall()
+        return list(reversed(rows))
+
+    def iter_pages(
+        self,
+        table: str,
+        page_size: int = STREAM_BATCH_SIZE,
+        columns: Sequence[str] | None = None,
+        as_tuples: bool = False,
+    ) -> Iterator[list[dict[str, Any] | tuple]]:
+        """Walk the whole table in keyset pages, one short query (and connection) per page."""
+        if columns is not None and "id" not in columns:
+            columns = ["id", *columns]
+        # SELECT * tuples follow table order, where every table here starts with ``id``.
+        id_position = list(columns).index("id") if columns is not None else 0
+        after_id: int | None = None
+        while True:
+            page = self.page_after(table, after_id, page_size, columns=columns, as_tuples=as_tuples)
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            after_id = int(page[-1][id_position] if as_tuples else page[-1]["id"])
+
     def find_by_id(self, table: str, row_id: int) -> dict[str, Any] | None:
-        table_name = self._quote_identifier(table)
-        sql = f"SELECT * FROM {table_name} WHERE id = %s"
+        sql = self._statement(
+            ("find_by_id", table),
+            lambda: f"SELECT * FROM {self._quote_identifier(table)} WHERE id = %s",
+        )
 
         with self._connect() as conn:
             with conn.cursor() as cursor:
@@ -167,17 +557,22 @@ class SimpleORM:
                 row = cursor.fetchone()
         return row
 
-    def find_one_by(self, table: str, filters: dict[str, Any]) -> dict[str, Any] | None:
-        table_name = self._quote_identifier(table)
-
+    def find_one_by(
+        self,
+        table: str,
+        filters: dict[str, Any],
+        columns: Sequence[str] | None = None,
+    ) -> dict[str, Any] | None:
         if not filters:
             return None
 
-        for key in filters.keys():
-            self._validate_identifier(key)
-
-        where_sql = " AND ".join(f"{self._quote_identifier(k)} = %s" for k in filters.keys())
-        sql = f"SELECT * FROM {table_name} WHERE {where_sql} LIMIT 1"
+        sql = self._statement(
+            ("find_one_by", table, tuple(filters.keys()), tuple(columns or ())),
+            lambda: (
+                f"SELECT {self._select_list(columns)} FROM {self._quote_identifier(table)} "
+                f"WHERE {self._where_sql(filters)} LIMIT 1"
+            ),
+        )
 
         with self._connect() as conn:
             with conn.cursor() as cursor:
@@ -186,18 +581,73 @@ class SimpleORM:
 
         return row
 
+    def exists(self, table: str, filters: dict[str, Any]) -> bool:
+        """Check for a matching row without reading it (``SELECT 1 ... LIMIT 1``)."""
+        if not filters:
+            return False
+
+        sql = self._statement(
+            ("exists", table, tuple(filters.keys())),
+            lambda: f"SELECT 1 AS found FROM {self._quote_identifier(table)} WHERE {self._where_sql(filters)} LIMIT 1",
+        )
+
+        with self._connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, list(filters.values()))
+                row = cursor.fetchone()
+        return row is not None
+
+    def find_many_by(
+        self,
+        table: str,
+        column: str,
+        values: Iterable[Any],
+        columns: Sequence[str] | None = None,
+        chunk_size: int = IN_CHUNK_SIZE,
+        since: tuple[str, Any] | None = None,
+    ) -> list[dict[str, Any]]:
+        """Fetch rows whose ``column`` is in ``values``, issuing one ``IN (...)`` query per chunk on one connection.
+
+        ``since=(other_column, value)`` also requires ``other_column >= value``.
+        """
+        unique_values = list(dict.fromkeys(values))
+        if not unique_values:
+            return []
+        since_column = since[0] if since is not None else None
+
+        def statement(size: int) -> str:
+            def build() -> str:
+                sql = (
+                    f"SELECT {self._select_list(columns)} FROM {self._quote_identifier(table)} "
+                    f"WHERE {self._quote_identifier(column)} IN ({', '.join('%s' for _ in range(size))})"
+                )
+                if since_column is not None:
+                    sql += f" AND {self._quote_identifier(since_column)} >= %s"
+                return sql
+
+            return self._statement(("find_many_by", table, column, tuple(columns or ()), size, since_column), build)
+
+        rows: list[dict[str, Any]] = []
+        with self._connect() as conn:
+            with conn.cursor() as cursor:
+                for offset in range(0, len(unique_values), chunk_size):
+                    chunk = unique_values[offset:offset + chunk_size]
+                    params = chunk + [since[1]] if since is not None else chunk
+                    cursor.execute(statement(len(chunk)), params)
+                    rows.extend(cursor.fetchall())
+        return rows
+
     def count(self, table: str, filters: dict[str, Any] | None = None) -> int:
-        table_name = self._quote_identifier(table)
-        params: list[Any] = []
+        filters = filters or {}
+
+        def build() -> str:
+            sql = f"SELECT COUNT(*) AS count_value FROM {self._quote_identifier(table)}"
+            if filters:
+                sql += f" WHERE {self._where_sql(filters)}"
+            return sql
 
-        if filters:
-            for key in filters.keys():
-                self._validate_identifier(key)
-            where_sql = " AND ".join(f"{self._quote_identifier(k)} = %s" for k in filters.keys())
-            sql = f"SELECT COUNT(*) AS count_value FROM {table_name} WHERE {where_sql}"
-            params = list(filters.values())
-        else:
-            sql = f"SELECT COUNT(*) AS count_value FROM {table_name}"
+        sql = self._statement(("count", table, tuple(filters.keys())), build)
+        params = list(filters.values())
 
         with self._connect() as conn:
             with conn.cursor() as cursor:
@@ -206,14 +656,15 @@ class SimpleORM:
         return int(row["count_value"])
 
     def count_distinct(self, table: str, column: str, ignore_value: Any | None = None) -> int:
-        table_name = self._quote_identifier(table)
-        column_name = self._quote_identifier(column)
-        params: list[Any] = []
+        def build() -> str:
+            column_name = self._quote_identifier(column)
+            sql = f"SELECT COUNT(DISTINCT {column_name}) AS count_value FROM {self._quote_identifier(table)}"
+            if ignore_value is not None:
+                sql += f" WHERE {column_name} <> %s"
+            return sql
 
-        sql = f"SELECT COUNT(DISTINCT {column_name}) AS count_value FROM {table_name}"
-        if ignore_value is not None:
-            sql += f" WHERE {column_name} <> %s"
-            params.append(ignore_value)
+        sql = self._statement(("count_distinct", table, column, ignore_value is not None), build)
+        params: list[Any] = [ignore_value] if ignore_value is not None else []
 
         with self._connect() as conn:
             with conn.cursor() as cursor:
@@ -221,10 +672,27 @@ class SimpleORM:
                 row = cursor.fetchone() or {"count_value": 0}
         return int(row["count_value"])
 
+    def sums(self, table: str, columns: Sequence[str]) -> dict[str, int]:
+        """``SUM`` of each of ``columns`` over the whole table, 0 when it is empty."""
+        def build() -> str:
+            parts = ", ".join(
+                f"COALESCE(SUM({self._quote_identifier(column)}), 0) AS {self._quote_identifier(column)}"
+                for column in columns
+            )
+            return f"SELECT {parts} FROM {self._quote_identifier(table)}"
+
+        sql = self._statement(("sums", table, tuple(columns)), build)
+        with self._connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+                row = cursor.fetchone()
+        return {column: int(row[column]) for column in columns}
+
     def latest(self, table: str, order_by: str = "id") -> dict[str, Any] | None:
-        table_name = self._quote_identifier(table)
-        order_by_name = self._quote_identifier(order_by)
-        sql = f"SELECT * FROM {table_name} ORDER BY {order_by_name} DESC LIMIT 1"
+        sql = self._statement(
+            ("latest", table, order_by),
+            lambda: f"SELECT * FROM {self._quote_identifier(table)} ORDER BY {self._quote_identifier(order_by)} DESC LIMIT 1",
+        )
 
         with self._connect() as conn:
             with conn.cursor() as cursor:
@@ -232,6 +700,27 @@ class SimpleORM:
                 row = cursor.fetchone()
         return row
 
+    def recent(
+        self,
+        table: str,
+        limit: int,
+        order_by: str = "id",
+        columns: Sequence[str] | None = None,
+    ) -> list[dict[str, Any]]:
+        sql = self._statement(
+            ("recent", table, order_by, tuple(columns or ())),
+            lambda: (
+                f"SELECT {self._select_list(columns)} FROM {self._quote_identifier(table)} "
+                f"ORDER BY {self._quote_identifier(order_by)} DESC LIMIT %s"
+            ),
+        )
+
+        with self._connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, [int(limit)])
+                rows = cursor.fetchall()
+        return list(rows)
+
     def truncate_table(self, table: str) -> None:
         table_name = self._quote_identifier(table)
         sql = f"TRUNCATE TABLE {table_name}"
@@ -245,13 +734,15 @@ class SimpleORM:
         if not values:
             return False
 
-        table_name = self._quote_identifier(table)
-        for key in values.keys():
-            self._validate_identifier(key)
-
-        set_sql = ", ".join(f"{self._quote_identifier(key)} = %s" for key in values.keys())
-        sql = f"UPDATE {table_name} SET {set_sql} WHERE id = %s"
-        params = [values[key] for key in values.keys()] + [row_id]
+        keys = tuple(values.keys())
+        sql = self._statement(
+            ("update_by_id", table, keys),
+            lambda: (
+                f"UPDATE {self._quote_identifier(table)} "
+                f"SET {', '.join(f'{self._quote_identifier(key)} = %s' for key in keys)} WHERE id = %s"
+            ),
+        )
+        params = [values[key] for key in keys] + [row_id]
 
         with self._connect() as conn:
             with conn.cursor() as cursor:
@@ -260,9 +751,46 @@ class SimpleORM:
             conn.commit()
         return changed
 
+    def delete_id_range(self, table: str, first_id: int, last_id: int) -> int:
+        """Delete rows with ``first_id <= id <= last_id`` (a primary-key range scan) and return how many went."""
+        sql = self._statement(
+            ("delete_id_range", table),
+            lambda: f"DELETE FROM {self._quote_identifier(table)} WHERE `id` BETWEEN %s AND %s",
+        )
+
+        with self._connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, [int(first_id), int(last_id)])
+                deleted = int(cursor.rowcount)
+            conn.commit()
+        return deleted
+
+    def delete_before(self, table: str, column: str, cutoff: Any, limit: int) -> int:
+        """Delete at most ``limit`` rows with ``column < cutoff``, oldest first; return how many went.
+
+        Callers loop until it returns less than ``limit``, so each statement
+        commits quickly and holds its locks only briefly.
+        """
+        sql = self._statement(
+            ("delete_before", table, column),
+            lambda: (
+                f"DELETE FROM {self._quote_identifier(table)} WHERE {self._quote_identifier(column)} < %s "
+                f"ORDER BY {self._quote_identifier(column)} LIMIT %s"
+            ),
+        )
+
+        with self._connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, [cutoff, int(limit)])
+                deleted = int(cursor.rowcount)
+            conn.commit()
+        return deleted
+
     def delete_by_id(self, table: str, row_id: int) -> bool:
-        table_name = self._quote_identifier(table)
-        sql = f"DELETE FROM {table_name} WHERE id = %s"
+        sql = self._statement(
+            ("delete_by_id", table),
+            lambda: f"DELETE FROM {self._quote_identifier(table)} WHERE id = %s",
+        )
 
         with self._connect() as conn:
             with conn.cursor() as cursor:
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from src.cpu import StageTimings
+
+
+PANEL_SLOW_MS = 1000.0
+
+PanelHandler = Callable[..., Awaitable[Any]]
+
+
+class PanelRouter:
+    """Dispatch helper-bot callbacks by action and owner messages by panel step.
+
+    Handlers register with :meth:`action` or :meth:`step` instead of growing an
+    ``if/elif`` chain. Every callback is answered before its handler runs, so
+    the client stops spinning at once, whatever the handler goes on to do.
+    Every dispatch is timed under ``callback:<action>`` or ``step:<step>``.
+    """
+
+    def __init__(self, log: logging.Logger | None = None, slow_ms: float = PANEL_SLOW_MS) -> None:
+        self.log = log or logging.getLogger("userbot.panel")
+        self.slow_seconds = max(0.0, float(slow_ms)) / 1000.0
+        self.timings = StageTimings()
+        self._actions: dict[str, PanelHandler] = {}
+        self._steps: dict[str, PanelHandler] = {}
+
+    def action(self, *names: str) -> Callable[[PanelHandler], PanelHandler]:
+        def register(handler: PanelHandler) -> PanelHandler:
+            for name in names:
+                self._actions[name] = handler
+            return handler
+
+        return register
+
+    def step(self, *names: str) -> Callable[[PanelHandler], PanelHandler]:
+        def register(handler: PanelHandler) -> PanelHandler:
+            for name in names:
+                self._steps[name] = handler
+            return handler
+
+        return register
+
+    async def dispatch_callback(self, event, data: str, *args: Any) -> bool:
+        """Route ``action`` or ``action:payload``; the payload, when present, is the handler's last argument."""
+        action, _, payload = data.partition(":")
+        handler = self._actions.get(action)
+        await event.answer()
+        if handler is None:
+            return False
+
+        if payload:
+            args = (*args, payload)
+        await self._run(f"callback:{action}", handler, event, *args)
+        return True
+
+    async def dispatch_step(self, event, step: str, *args: Any) -> bool:
+        handler = self._steps.get(step)
+        if handler is None:
+            return False
+        await self._run(f"step:{step}", handler, event, *args)
+        return True
+
+    async def _run(self, name: str, handler: PanelHandler, *args: Any) -> None:
+        started = time.perf_counter()
+        try:
+            await handler(*args)
+        except Exception:
+            self.log.exception("Panel handler %s failed", name, extra={"event": "panel_error", "route": name})
+        finally:
+            elapsed = time.perf_counter() - started
+            self.timings.record(name, elapsed)
+            if elapsed >= self.slow_seconds:
+                self.log.warning(
+                    "Slow panel handler %s: %.0f ms",
+                    name,
+                    elapsed * 1000,
+                    extra={"event": "panel_slow", "route": name, "duration_ms": round(elapsed * 1000, 1)},
+                )
+
+    def slowest(self, limit: int = 3) -> list[tuple[str, float, float]]:
+        """``(route, avg_ms, max_ms)`` for the routes with the highest average latency."""
+        rows = [
+            (name, timing.total_seconds / timing.calls * 1000, timing.max_seconds * 1000)
+            for name, timing in self.timings.snapshot().items()
+            if timing.calls
+        ]
+        return sorted(rows, key=lambda row: -row[1])[:limit]
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Any
+
+from src.controllers import UserManager
+
+
+@dataclass
+class PanelState:
+    step: str = "none"
+    status: str = "none"
+    data: dict[str, Any] = field(default_factory=dict)
+
+
+class PanelStateCache:
+    """Write-through cache of the owner's ``users`` row (panel step and its JSON data).
+
+    The first read loads the row once; after that reads are served from memory
+    and ``set`` only reaches MySQL when the step or data actually changes. The
+    bot is the only writer of these rows, so nothing else can make the cache
+    stale while it runs.
+    """
+
+    def __init__(self, user_manager: UserManager) -> None:
+        self.user_manager = user_manager
+        self._states: dict[int, PanelState] = {}
+
+    def get(self, user_id: int) -> PanelState:
+        user_id = int(user_id)
+        state = self._states.get(user_id)
+        if state is None:
+            row = self.user_manager.ensure_user(user_id, "none") or {}
+            state = PanelState(
+                step=str(row.get("step") or "none"),
+                status=str(row.get("status") or "none"),
+                data=self._parse(row.get("data")),
+            )
+            self._states[user_id] = state
+        return state
+
+    def set(self, user_id: int, step: str, data: dict[str, Any] | None = None) -> bool:
+        """Move to ``step``, replacing data when given; return False when nothing had to be written."""
+        state = self.get(user_id)
+        values: dict[str, str] = {}
+        if step != state.step:
+            values["step"] = step
+        if data is not None and data != state.data:
+            values["data"] = json.dumps(data)
+        if not values:
+            return False
+
+        self.user_manager.update_user(int(user_id), **values)
+        state.step = step
+        if data is not None:
+            state.data = dict(data)
+        return True
+
+    def reset(self, user_id: int) -> bool:
+        return self.set(user_id, "none", {})
+
+    def invalidate(self, user_id: int | None = None) -> None:
+        if user_id is None:
+            self._states.clear()
+        else:
+            self._states.pop(int(user_id), None)
+
+    @staticmethod
+    def _parse(raw: Any) -> dict[str, Any]:
+        if not raw:
+            return {}
+        try:
+            parsed = json.loads(raw)
+        except (TypeError, ValueError):
+            return {}
+        return parsed if isinstance(parsed, dict) else {}
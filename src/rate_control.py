@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Iterable
+
+
+ACCOUNT_KEY = "account"
+
+
+def destination_key(chat_id: int) -> str:
+    return f"dest:{int(chat_id)}"
+
+
+@dataclass
+class RateState:
+    interval: float
+    next_send_at: float = 0.0
+    successes: int = 0
+    flood_waits: int = 0
+
+
+class AdaptiveRateController:
+    """AIMD send pacing per key (one account-wide key plus one per destination).
+
+    Every successful send raises the key's rate by ``additive_step`` sends per
+    second; a FloodWait multiplies it by ``backoff`` and blocks the key for the
+    wait Telegram asked for. Intervals always stay within ``[min, max]``. A send
+    has to wait until every key it touches allows it.
+    """
+
+    def __init__(
+        self,
+        initial_interval: float,
+        min_interval: float,
+        max_interval: float,
+        additive_step: float = 0.01,
+        backoff: float = 0.5,
+    ) -> None:
+        self.additive_step = additive_step
+        self.backoff = backoff
+        self.initial_interval = initial_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._states: dict[str, RateState] = {}
+        self._dirty: set[str] = set()
+
+    def configure(self, initial_interval: float, min_interval: float, max_interval: float) -> None:
+        """Apply bounds from ``relay_settings``; a new base interval restarts learning from it."""
+        min_interval = max(0.1, float(min_interval))
+        max_interval = max(min_interval, float(max_interval))
+        initial_interval = self._clamp(float(initial_interval), min_interval, max_interval)
+        base_changed = initial_interval != self.initial_interval
+
+        self.initial_interval = initial_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+        for key, state in self._states.items():
+            interval = initial_interval if base_changed else state.interval
+            new_interval = self._clamp(interval, min_interval, max_interval)
+            if new_interval != state.interval:
+                state.interval = new_interval
+                self._dirty.add(key)
+
+    def interval_for(self, key: str) -> float:
+        return self._state(key).interval
+
+    def delay(self, keys: Iterable[str]) -> float:
+        now = time.monotonic()
+        return max(0.0, max((self._state(key).next_send_at - now for key in keys), default=0.0))
+
+    def on_success(self, keys: Iterable[str], extra_delay: float = 0.0) -> None:
+        now = time.monotonic()
+        for key in keys:
+            state = self._state(key)
+            rate = 1.0 / state.interval + self.additive_step
+            state.interval = self._clamp(1.0 / rate, self.min_interval, self.max_interval)
+            state.next_send_at = now + state.interval + extra_delay
+            state.successes += 1
+            self._dirty.add(key)
+
+    def on_flood_wait(self, keys: Iterable[str], wait_seconds: float) -> None:
+        now = time.monotonic()
+        for key in keys:
+            state = self._state(key)
+            rate = (1.0 / state.interval) * self.backoff
+            state.interval = self._clamp(1.0 / rate, self.min_interval, self.max_interval)
+            state.next_send_at = now + max(float(wait_seconds), state.interval)
+            state.flood_waits += 1
+            self._dirty.add(key)
+
+    def snapshot(self) -> dict[str, RateState]:
+        return {
+            key: RateState(state.interval, state.next_send_at, state.successes, state.flood_waits)
+            for key, state in self._states.items()
+        }
+
+    def restore(self, intervals: dict[str, tuple[float, int]]) -> None:
+        for key, (interval, flood_waits) in intervals.items():
+            state = self._state(key)
+            state.interval = self._clamp(float(interval), self.min_interval, self.max_interval)
+            state.flood_waits = int(flood_waits)
+
+    def drain_dirty(self) -> dict[str, RateState]:
+        states = self.snapshot()
+        dirty = {key: states[key] for key in self._dirty if key in states}
+        self._dirty.clear()
+        return dirty
+
+    def _state(self, key: str) -> RateState:
+        state = self._states.get(key)
+        if state is None:
+            state = RateState(interval=self.initial_interval)
+            self._states[key] = state
+        return state
+
+    @staticmethod
+    def _clamp(value: float, low: float, high: float) -> float:
+        return min(high, max(low, value))
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+import zlib
+from typing import Any
+
+
+SNAPSHOT_MAGIC = b"NPVTSNAP"
+SNAPSHOT_FORMAT_VERSION = 1
+
+# magic, format version, payload length, SHA-256 of the compressed payload
+_HEADER = struct.Struct(">8sHI32s")
+
+
+class StateSnapshot:
+    """Versioned, checksummed, zlib-compressed JSON state file.
+
+    Writes go to a temp file in the same directory followed by ``os.replace``,
+    so readers only ever see a complete previous or complete new snapshot.
+    Any unreadable, truncated or foreign file is treated as "no snapshot".
+    """
+
+    def __init__(self, path: str, log: logging.Logger | None = None) -> None:
+        self.path = path
+        self.log = log or logging.getLogger(__name__)
+
+    def save(self, state: dict[str, Any]) -> int:
+        body = json.dumps(state, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        payload = zlib.compress(body, 6)
+        header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, len(payload), hashlib.sha256(payload).digest())
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".snapshot-", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as file_obj:
+                file_obj.write(header)
+                file_obj.write(payload)
+                file_obj.flush()
+                os.fsync(file_obj.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return _HEADER.size + len(payload)
+
+    def load(self) -> dict[str, Any] | None:
+        try:
+            with open(self.path, "rb") as file_obj:
+                raw = file_obj.read()
+        except FileNotFoundError:
+            return None
+        except OSError:
+            self.log.warning("Could not read state snapshot %s", self.path)
+            return None
+
+        if len(raw) < _HEADER.size:
+            self.log.warning("Ignoring truncated state snapshot %s", self.path)
+            return None
+
+        magic, version, length, checksum = _HEADER.unpack_from(raw)
+        payload = raw[_HEADER.size:]
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT_VERSION:
+            self.log.info("Ignoring state snapshot %s with format %r/%s", self.path, magic, version)
+            return None
+        if len(payload) != length or hashlib.sha256(payload).digest() != checksum:
+            self.log.warning("Ignoring state snapshot %s with bad checksum", self.path)
+            return None
+
+        try:
+            state = json.loads(zlib.decompress(payload).decode("utf-8"))
+        except (zlib.error, UnicodeDecodeError, ValueError):
+            self.log.warning("Ignoring undecodable state snapshot %s", self.path)
+            return None
+        return state if isinstance(state, dict) else None
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, TypeVar
+
+
+T = TypeVar("T")
+
+
+class StartupOrchestrator:
+    """Run independent startup stages concurrently and log how long each took."""
+
+    def __init__(self, log: logging.Logger) -> None:
+        self.log = log
+        self._started_at = time.perf_counter()
+        self._timings: dict[str, float] = {}
+
+    def stage(self, name: str, awaitable: Awaitable[T]) -> asyncio.Task[T]:
+        return asyncio.create_task(self._timed(name, awaitable), name=f"startup-{name}")
+
+    async def _timed(self, name: str, awaitable: Awaitable[T]) -> T:
+        started = time.perf_counter()
+        try:
+            result = await awaitable
+        except Exception:
+            self.log.exception("Startup stage %s failed after %.3fs", name, time.perf_counter() - started)
+            raise
+        elapsed = time.perf_counter() - started
+        self._timings[name] = elapsed
+        self.log.info("Startup stage %s done in %.3fs", name, elapsed)
+        return result
+
+    def log_summary(self) -> None:
+        stages = ", ".join(f"{name}={elapsed:.3f}s" for name, elapsed in self._timings.items())
+        self.log.info("Startup finished in %.3fs (%s)", time.perf_counter() - self._started_at, stages)